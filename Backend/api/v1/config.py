@@ -1,49 +1,347 @@
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, MultiFernet
+from dataclasses import dataclass
 from dotenv import load_dotenv
+from typing import List, Optional
 import base64
+import hashlib
 import os
+import tempfile
 
+# Benchmarks and other harnesses pass a complete environment and must not
+# have it overridden by a developer's local .env
+if not os.getenv("SKIP_DOTENV"):
+    load_dotenv(override=True)
+
+
+class ConfigError(RuntimeError):
+    """Raised at startup when required settings are missing or invalid."""
+
+
+def _env(name: str, default: Optional[str] = None) -> Optional[str]:
+    value = os.getenv(name)
+    return value if value not in (None, "") else default
+
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    value = _env(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes")
+
+
+def _env_int(name: str, default: int) -> int:
+    value = _env(name)
+    try:
+        return int(value) if value is not None else default
+    except ValueError:
+        raise ConfigError(f"{name} must be an integer, got {value!r}")
+
+
+def _env_float(name: str, default: float) -> float:
+    value = _env(name)
+    try:
+        return float(value) if value is not None else default
+    except ValueError:
+        raise ConfigError(f"{name} must be a number, got {value!r}")
+
+
+def _require(*names: str) -> None:
+    missing = [name for name in names if _env(name) is None]
+    if missing:
+        raise ConfigError(f"Missing required environment variables: {', '.join(missing)}")
+
+
+def _require_url(name: str) -> str:
+    value = _env(name)
+    if not value.startswith(("http://", "https://")):
+        raise ConfigError(f"{name} must be an http(s) URL, got {value!r}")
+    return value
+
+
+def build_fernet(raw_keys: str) -> MultiFernet:
+    """
+    Build a MultiFernet from a comma-separated list of keys, newest first.
+    New tokens are encrypted with the first key; all keys can decrypt, so a
+    new key can be prepended and old tokens re-encrypted in the background.
+    """
+    keys: List[Fernet] = []
+    for raw_key in raw_keys.split(","):
+        raw_key = raw_key.strip()
+        if raw_key:
+            padded_key = base64.urlsafe_b64encode(raw_key.encode().ljust(32)[:32])
+            keys.append(Fernet(padded_key))
+    if not keys:
+        raise ConfigError("FERNET_KEY must contain at least one key")
+    return MultiFernet(keys)
+
+
+@dataclass(frozen=True)
 class AuthConfig:
-    def __init__(self):
-        load_dotenv(override=True)
-
-    @property
-    def GOOGLE_CLIENT_ID(self):
-        return os.getenv("GOOGLE_CLIENT_ID")
-
-    @property
-    def GOOGLE_CLIENT_SECRET(self):
-        return os.getenv("GOOGLE_CLIENT_SECRET")
-
-    @property
-    def GOOGLE_REDIRECT_URI(self):
-        return os.getenv("GOOGLE_REDIRECT_URI")
-    
-    @property
-    def FERNET_KEY(self):
-        raw_key = os.getenv("FERNET_KEY")
-        padded_key = base64.urlsafe_b64encode(raw_key.encode().ljust(32)[:32])
-        return Fernet(padded_key)
-    
-    @property
-    def JWT_SECRET_KEY(self):
-        return os.getenv("JWT_SECRET_KEY")
-    
-    @property
-    def FRONTEND_URL(self):
-        return os.getenv("FRONTEND_URL")
+    GOOGLE_CLIENT_ID: str
+    GOOGLE_CLIENT_SECRET: str
+    GOOGLE_REDIRECT_URI: str
+    FERNET_KEY: MultiFernet
+    # Fingerprint of the primary key, so a rotation to it runs only once
+    FERNET_PRIMARY_KEY_ID: str
+    FERNET_ROTATE_ON_STARTUP: bool
+    JWT_SECRET_KEY: str
+    FRONTEND_URL: str
+
+    @classmethod
+    def from_env(cls) -> "AuthConfig":
+        _require(
+            "GOOGLE_CLIENT_ID",
+            "GOOGLE_CLIENT_SECRET",
+            "GOOGLE_REDIRECT_URI",
+            "FERNET_KEY",
+            "JWT_SECRET_KEY",
+            "FRONTEND_URL",
+        )
+        return cls(
+            GOOGLE_CLIENT_ID=_env("GOOGLE_CLIENT_ID"),
+            GOOGLE_CLIENT_SECRET=_env("GOOGLE_CLIENT_SECRET"),
+            GOOGLE_REDIRECT_URI=_require_url("GOOGLE_REDIRECT_URI"),
+            FERNET_KEY=build_fernet(_env("FERNET_KEY")),
+            FERNET_PRIMARY_KEY_ID=hashlib.sha256(_env("FERNET_KEY").split(",")[0].strip().encode()).hexdigest()[:16],
+            FERNET_ROTATE_ON_STARTUP=_env_bool("FERNET_ROTATE_ON_STARTUP"),
+            JWT_SECRET_KEY=_env("JWT_SECRET_KEY"),
+            FRONTEND_URL=_require_url("FRONTEND_URL"),
+        )
+
 
+@dataclass(frozen=True)
 class DBConfig:
-    def __init__(self):
-        load_dotenv(override=True)
-
-    @property
-    def MONGO_URI(self):
-        return os.getenv("MONGO_URI")
-
-    @property
-    def MONGO_DB_NAME(self):
-        return os.getenv("MONGO_DB_NAME")
-    
-auth_config = AuthConfig()
-db_config = DBConfig()
+    MONGO_URI: str
+    MONGO_DB_NAME: str
+    MONGO_VERIFY_QUERY_PLANS: bool
+    # BulkWriter: operations per bulk_write, max seconds an operation waits in
+    # the buffer, and buffered operations at which writers start to block
+    BULK_WRITE_BATCH_SIZE: int
+    BULK_WRITE_FLUSH_INTERVAL: float
+    BULK_WRITE_MAX_PENDING: int
+
+    @classmethod
+    def from_env(cls) -> "DBConfig":
+        _require("MONGO_URI", "MONGO_DB_NAME")
+        return cls(
+            MONGO_URI=_env("MONGO_URI"),
+            MONGO_DB_NAME=_env("MONGO_DB_NAME"),
+            MONGO_VERIFY_QUERY_PLANS=_env_bool("MONGO_VERIFY_QUERY_PLANS"),
+            BULK_WRITE_BATCH_SIZE=_env_int("BULK_WRITE_BATCH_SIZE", 500),
+            BULK_WRITE_FLUSH_INTERVAL=_env_float("BULK_WRITE_FLUSH_INTERVAL", 0.25),
+            BULK_WRITE_MAX_PENDING=_env_int("BULK_WRITE_MAX_PENDING", 5000),
+        )
+
+
+@dataclass(frozen=True)
+class GmailConfig:
+    GMAIL_HEDGING_ENABLED: bool
+    # Overridable so benchmarks can point the app at a local fake server
+    GOOGLE_API_ROOT: str
+    GOOGLE_OAUTH_ROOT: str
+    # How messages are fetched by id: "batch" (multipart batch endpoint),
+    # "multiplex" (concurrent messages.get over one HTTP/2 connection) or
+    # "auto" (multiplex for up to GMAIL_MULTIPLEX_MAX_MESSAGES, else batch)
+    GMAIL_FETCH_STRATEGY: str
+    GMAIL_MULTIPLEX_MAX_MESSAGES: int
+    GMAIL_MULTIPLEX_CONCURRENCY: int
+
+    @classmethod
+    def from_env(cls) -> "GmailConfig":
+        strategy = _env("GMAIL_FETCH_STRATEGY", "batch").lower()
+        if strategy not in ("batch", "multiplex", "auto"):
+            raise ConfigError(f"GMAIL_FETCH_STRATEGY must be 'batch', 'multiplex' or 'auto', got {strategy!r}")
+        return cls(
+            GMAIL_HEDGING_ENABLED=_env_bool("GMAIL_HEDGING_ENABLED"),
+            GOOGLE_API_ROOT=_env("GOOGLE_API_ROOT", "https://www.googleapis.com").rstrip("/"),
+            GOOGLE_OAUTH_ROOT=_env("GOOGLE_OAUTH_ROOT", "https://oauth2.googleapis.com").rstrip("/"),
+            GMAIL_FETCH_STRATEGY=strategy,
+            GMAIL_MULTIPLEX_MAX_MESSAGES=_env_int("GMAIL_MULTIPLEX_MAX_MESSAGES", 10),
+            GMAIL_MULTIPLEX_CONCURRENCY=_env_int("GMAIL_MULTIPLEX_CONCURRENCY", 10),
+        )
+
+
+@dataclass(frozen=True)
+class DiagnosticsConfig:
+    LOOP_DIAGNOSTICS_ENABLED: bool
+    LOOP_STALL_THRESHOLD: float
+    DEBUG_TOKEN: Optional[str]
+
+    @classmethod
+    def from_env(cls) -> "DiagnosticsConfig":
+        threshold = _env_float("LOOP_STALL_THRESHOLD", 0.1)
+        if threshold <= 0:
+            raise ConfigError("LOOP_STALL_THRESHOLD must be positive")
+        return cls(
+            LOOP_DIAGNOSTICS_ENABLED=_env_bool("LOOP_DIAGNOSTICS_ENABLED"),
+            LOOP_STALL_THRESHOLD=threshold,
+            DEBUG_TOKEN=_env("DEBUG_TOKEN"),
+        )
+
+
+@dataclass(frozen=True)
+class ServerConfig:
+    PORT: int
+    # Worker processes; each runs its own event loop. Send SIGHUP to the
+    # uvicorn supervisor to restart workers one at a time.
+    WEB_CONCURRENCY: int
+    GRACEFUL_SHUTDOWN_TIMEOUT: int
+
+    @classmethod
+    def from_env(cls) -> "ServerConfig":
+        workers = _env_int("WEB_CONCURRENCY", 1)
+        if workers < 1:
+            raise ConfigError("WEB_CONCURRENCY must be at least 1")
+        return cls(
+            PORT=_env_int("PORT", 8000),
+            WEB_CONCURRENCY=workers,
+            GRACEFUL_SHUTDOWN_TIMEOUT=_env_int("GRACEFUL_SHUTDOWN_TIMEOUT", 30),
+        )
+
+
+@dataclass(frozen=True)
+class CacheConfig:
+    # "memory": per-process LRU. "mongo": LRU in front of a Mongo TTL
+    # collection shared by every worker.
+    CACHE_BACKEND: str
+    CACHE_MAX_ENTRIES: int
+    CACHE_LOCAL_TTL: float
+    CACHE_USER_TTL: float
+    CACHE_MESSAGE_TTL: float
+    CACHE_COUNTERS_TTL: float
+    # Seconds an inbox page is reused after identical concurrent fetches
+    # finish; 0 only coalesces calls that overlap
+    CACHE_FETCH_TTL: float
+
+    @classmethod
+    def from_env(cls) -> "CacheConfig":
+        backend = _env("CACHE_BACKEND", "memory").lower()
+        if backend not in ("memory", "mongo"):
+            raise ConfigError(f"CACHE_BACKEND must be 'memory' or 'mongo', got {backend!r}")
+        return cls(
+            CACHE_BACKEND=backend,
+            CACHE_MAX_ENTRIES=_env_int("CACHE_MAX_ENTRIES", 10000),
+            CACHE_LOCAL_TTL=_env_float("CACHE_LOCAL_TTL", 5),
+            CACHE_USER_TTL=_env_float("CACHE_USER_TTL", 60),
+            CACHE_MESSAGE_TTL=_env_float("CACHE_MESSAGE_TTL", 120),
+            CACHE_COUNTERS_TTL=_env_float("CACHE_COUNTERS_TTL", 300),
+            CACHE_FETCH_TTL=_env_float("CACHE_FETCH_TTL", 0),
+        )
+
+
+@dataclass(frozen=True)
+class SyncConfig:
+    SYNC_ENABLED: bool
+    SYNC_WORKERS: int
+    SYNC_LEASE_SECONDS: float
+    SYNC_POLL_INTERVAL: float
+    SYNC_MAX_ATTEMPTS: int
+    # Seconds between incremental history syncs per user
+    SYNC_HISTORY_INTERVAL: float
+    # Backfill: ids per messages.list page, ids per batch request, batch
+    # requests in flight, and Gmail quota units per second spent per user
+    BACKFILL_PAGE_SIZE: int
+    BACKFILL_BATCH_SIZE: int
+    BACKFILL_CONCURRENCY: int
+    BACKFILL_QUOTA_PER_SECOND: float
+
+    @classmethod
+    def from_env(cls) -> "SyncConfig":
+        workers = _env_int("SYNC_WORKERS", 2)
+        if workers < 1:
+            raise ConfigError("SYNC_WORKERS must be at least 1")
+        return cls(
+            SYNC_ENABLED=_env_bool("SYNC_ENABLED"),
+            SYNC_WORKERS=workers,
+            SYNC_LEASE_SECONDS=_env_float("SYNC_LEASE_SECONDS", 60),
+            SYNC_POLL_INTERVAL=_env_float("SYNC_POLL_INTERVAL", 1),
+            SYNC_MAX_ATTEMPTS=_env_int("SYNC_MAX_ATTEMPTS", 5),
+            SYNC_HISTORY_INTERVAL=_env_float("SYNC_HISTORY_INTERVAL", 60),
+            BACKFILL_PAGE_SIZE=min(_env_int("BACKFILL_PAGE_SIZE", 500), 500),
+            BACKFILL_BATCH_SIZE=min(_env_int("BACKFILL_BATCH_SIZE", 50), 100),
+            BACKFILL_CONCURRENCY=_env_int("BACKFILL_CONCURRENCY", 4),
+            BACKFILL_QUOTA_PER_SECOND=_env_float("BACKFILL_QUOTA_PER_SECOND", 200),
+        )
+
+
+@dataclass(frozen=True)
+class RenderConfig:
+    # Processes sanitizing HTML bodies; 0 renders in a thread instead
+    RENDER_WORKERS: int
+    RENDER_CACHE_TTL: float
+    # Absolute base for proxied image URLs embedded in rendered HTML
+    PUBLIC_API_URL: str
+    IMAGE_PROXY_SECRET: str
+    IMAGE_PROXY_MAX_BYTES: int
+    # Resized inline images and attachment thumbnails, kept on local disk
+    IMAGE_CACHE_DIR: str
+    IMAGE_CACHE_MAX_BYTES: int
+
+    @classmethod
+    def from_env(cls) -> "RenderConfig":
+        # Rendered HTML is shown on the frontend's origin, so proxied image
+        # URLs must be absolute
+        _require("PUBLIC_API_URL", "IMAGE_PROXY_SECRET")
+        if _env("IMAGE_PROXY_SECRET") == _env("JWT_SECRET_KEY"):
+            raise ConfigError("IMAGE_PROXY_SECRET must differ from JWT_SECRET_KEY")
+        return cls(
+            RENDER_WORKERS=_env_int("RENDER_WORKERS", 2),
+            RENDER_CACHE_TTL=_env_float("RENDER_CACHE_TTL", 24 * 3600),
+            PUBLIC_API_URL=_require_url("PUBLIC_API_URL").rstrip("/"),
+            IMAGE_PROXY_SECRET=_env("IMAGE_PROXY_SECRET"),
+            IMAGE_PROXY_MAX_BYTES=_env_int("IMAGE_PROXY_MAX_BYTES", 5 * 1024 * 1024),
+            IMAGE_CACHE_DIR=_env("IMAGE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "maileyo-images")),
+            IMAGE_CACHE_MAX_BYTES=_env_int("IMAGE_CACHE_MAX_BYTES", 256 * 1024 * 1024),
+        )
+
+
+@dataclass(frozen=True)
+class AdmissionConfig:
+    ADMISSION_ENABLED: bool
+    # Estimated bytes that heavy requests (sends, attachment downloads) may
+    # hold in memory at once, per worker
+    ADMISSION_MEMORY_BUDGET: int
+    # Estimate for a heavy request whose size isn't known up front, and the
+    # least an attachment download is charged
+    ADMISSION_DEFAULT_REQUEST_BYTES: int
+    # Concurrent cheap reads (inbox pages, counters), kept apart from uploads
+    ADMISSION_READ_CONCURRENCY: int
+    # Concurrent image previews. Most are disk-cache hits; a miss also charges
+    # its original's size to the memory budget while it downloads and resizes
+    ADMISSION_IMAGE_CONCURRENCY: int
+    # Requests waiting per lane beyond which new ones are shed immediately,
+    # and how long a queued request waits before it is shed
+    ADMISSION_MAX_QUEUE: int
+    ADMISSION_QUEUE_TIMEOUT: float
+    ADMISSION_RETRY_AFTER: int
+
+    @classmethod
+    def from_env(cls) -> "AdmissionConfig":
+        budget = _env_int("ADMISSION_MEMORY_BUDGET", 256 * 1024 * 1024)
+        concurrency = _env_int("ADMISSION_READ_CONCURRENCY", 100)
+        images = _env_int("ADMISSION_IMAGE_CONCURRENCY", 32)
+        if budget < 1 or concurrency < 1 or images < 1:
+            raise ConfigError(
+                "ADMISSION_MEMORY_BUDGET, ADMISSION_READ_CONCURRENCY and ADMISSION_IMAGE_CONCURRENCY must be positive"
+            )
+        return cls(
+            ADMISSION_ENABLED=_env_bool("ADMISSION_ENABLED", True),
+            ADMISSION_MEMORY_BUDGET=budget,
+            ADMISSION_DEFAULT_REQUEST_BYTES=_env_int("ADMISSION_DEFAULT_REQUEST_BYTES", 10 * 1024 * 1024),
+            ADMISSION_READ_CONCURRENCY=concurrency,
+            ADMISSION_IMAGE_CONCURRENCY=images,
+            ADMISSION_MAX_QUEUE=_env_int("ADMISSION_MAX_QUEUE", 50),
+            ADMISSION_QUEUE_TIMEOUT=_env_float("ADMISSION_QUEUE_TIMEOUT", 10),
+            ADMISSION_RETRY_AFTER=_env_int("ADMISSION_RETRY_AFTER", 5),
+        )
+
+
+auth_config = AuthConfig.from_env()
+db_config = DBConfig.from_env()
+gmail_config = GmailConfig.from_env()
+diagnostics_config = DiagnosticsConfig.from_env()
+server_config = ServerConfig.from_env()
+cache_config = CacheConfig.from_env()
+sync_config = SyncConfig.from_env()
+render_config = RenderConfig.from_env()
+admission_config = AdmissionConfig.from_env()
@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError
+
+from api.v1.config import db_config
+from api.v1.db.session import DatabaseSession
+from api.v1.utils.metrics import BULK_WRITE_BATCH_SIZE, BULK_WRITE_DURATION, BULK_WRITE_PENDING
+
+logger = logging.getLogger(__name__)
+
+
+class BulkWriteFailed(RuntimeError):
+    """Raised by `flush()` when a write buffered in the caller's scope failed."""
+
+
+class WriteScope:
+    """The failed writes of one producer, e.g. one sync job run."""
+
+    def __init__(self):
+        self.failures: List[Exception] = []
+
+
+_current_scope: ContextVar[Optional[WriteScope]] = ContextVar("bulk_write_scope", default=None)
+
+
+class BulkWriter:
+    """
+    Buffers pymongo write operations (UpdateOne, DeleteOne, ...) per collection
+    and writes them as unordered `bulk_write` batches, when a buffer reaches
+    `batch_size` or `flush_interval` seconds after the first buffered write.
+
+    Backpressure: `add()` blocks while `max_pending` operations are buffered,
+    and a caller that fills a batch waits for it to be written, so producers
+    slow down to the pace Mongo sustains instead of growing the buffer.
+
+    Operations must be idempotent (upserts, $set, $addToSet, $pull): after a
+    failure the caller retries its unit of work. Producers run inside
+    `scope()`, and call `flush()` before recording progress that depends on
+    the writes being durable; it raises only for failures of writes buffered
+    in that same scope, since batches mix operations from every producer.
+    Failures outside any scope are only logged.
+    """
+
+    def __init__(self, batch_size: int = 500, flush_interval: float = 0.25, max_pending: int = 5000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        # (operation, scope that buffered it)
+        self._buffers: Dict[str, List[Tuple[object, Optional[WriteScope]]]] = defaultdict(list)
+        self._locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._pending = 0
+        self._space = asyncio.Condition()
+        self._timer: Optional[asyncio.Task] = None
+
+    @contextmanager
+    def scope(self) -> Iterator[WriteScope]:
+        """Collect failures of the writes added in this context (and tasks it starts) for its `flush()`."""
+        token = _current_scope.set(WriteScope())
+        try:
+            yield _current_scope.get()
+        finally:
+            _current_scope.reset(token)
+
+    async def add(self, collection: str, *operations) -> None:
+        if not operations:
+            return
+        scope = _current_scope.get()
+        async with self._space:
+            await self._space.wait_for(lambda: self._pending < self.max_pending)
+            self._buffers[collection].extend((operation, scope) for operation in operations)
+            self._pending += len(operations)
+            BULK_WRITE_PENDING.inc(len(operations))
+
+        if len(self._buffers[collection]) >= self.batch_size:
+            await self._flush_collection(collection)
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        for collection in list(self._buffers):
+            await self._flush_collection(collection)
+
+    async def _flush_collection(self, collection: str) -> None:
+        async with self._locks[collection]:
+            buffer = self._buffers[collection]
+            while buffer:
+                batch = buffer[:self.batch_size]
+                del buffer[:self.batch_size]
+                await self._write(collection, batch)
+                async with self._space:
+                    self._pending -= len(batch)
+                    BULK_WRITE_PENDING.dec(len(batch))
+                    self._space.notify_all()
+
+    @staticmethod
+    def _record_failure(scopes: Iterable[Optional[WriteScope]], error: Exception) -> None:
+        for scope in set(scopes):
+            if scope is not None:
+                scope.failures.append(error)
+
+    async def _write(self, collection: str, batch: List[Tuple[object, Optional[WriteScope]]]) -> None:
+        outcome = "ok"
+        start = time.perf_counter()
+        try:
+            await DatabaseSession.get_db()[collection].bulk_write(
+                [operation for operation, _ in batch], ordered=False
+            )
+        except BulkWriteError as e:
+            # Unordered: everything except the failed operations was applied
+            outcome = "partial"
+            errors = e.details.get("writeErrors", [])
+            logger.error(f"Bulk write to '{collection}': {len(errors)} of {len(batch)} operations failed")
+            self._record_failure((batch[error["index"]][1] for error in errors), e)
+        except Exception as e:
+            outcome = "error"
+            logger.error(f"Bulk write of {len(batch)} operations to '{collection}' failed: {e}")
+            self._record_failure((scope for _, scope in batch), e)
+        finally:
+            BULK_WRITE_DURATION.labels(collection=collection, status=outcome).observe(time.perf_counter() - start)
+            BULK_WRITE_BATCH_SIZE.labels(collection=collection).observe(len(batch))
+
+    async def flush(self) -> None:
+        """
+        Write everything buffered; raise BulkWriteFailed if a write buffered
+        in the current scope failed since that scope's last flush.
+        """
+        for collection in list(self._buffers):
+            await self._flush_collection(collection)
+        scope = _current_scope.get()
+        if scope is not None and scope.failures:
+            failures, scope.failures = scope.failures, []
+            raise BulkWriteFailed(f"{len(failures)} bulk writes failed, first: {failures[0]}")
+
+    async def close(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        # Failures are logged by _write; nobody is left to retry them
+        await self.flush()
+
+
+bulk_writer = BulkWriter(
+    batch_size=db_config.BULK_WRITE_BATCH_SIZE,
+    flush_interval=db_config.BULK_WRITE_FLUSH_INTERVAL,
+    max_pending=db_config.BULK_WRITE_MAX_PENDING,
+)
@@ -0,0 +1,112 @@
+import logging
+from typing import Any, Dict, List, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Indexes every collection needs, keyed by collection name. Names are explicit
+# so that re-running `create_indexes` is a no-op and changes are easy to spot.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        # get_current_user and the login upsert are both equality lookups
+        # on google_id
+        IndexModel([("google_id", ASCENDING)], name="google_id_unique", unique=True),
+    ],
+    "credentials": [
+        # get_oauth_tokens, token refresh writes and the login upsert
+        IndexModel(
+            [("google_id", ASCENDING), ("service", ASCENDING)],
+            name="google_id_service_unique",
+            unique=True,
+        ),
+    ],
+    "sync_jobs": [
+        # SyncScheduler._claim: due queued jobs in (priority, seq) order
+        IndexModel(
+            [("status", ASCENDING), ("priority", ASCENDING), ("seq", ASCENDING)],
+            name="status_priority_seq",
+        ),
+        # SyncScheduler._claim: running jobs whose lease lapsed
+        IndexModel([("status", ASCENDING), ("lease_expires_at", ASCENDING)], name="status_lease"),
+        # At most one pending job per dedupe key
+        IndexModel(
+            [("dedupe_key", ASCENDING)],
+            name="dedupe_key_active_unique",
+            unique=True,
+            partialFilterExpression={"active": True, "dedupe_key": {"$exists": True}},
+        ),
+        IndexModel([("google_id", ASCENDING), ("created_at", DESCENDING)], name="google_id_created_at"),
+        # Finished jobs are kept for a week for inspection
+        IndexModel([("finished_at", ASCENDING)], name="finished_at_ttl", expireAfterSeconds=7 * 24 * 3600),
+    ],
+    "messages": [
+        # Backfill / sync upserts
+        IndexModel(
+            [("google_id", ASCENDING), ("message_id", ASCENDING)],
+            name="google_id_message_id_unique",
+            unique=True,
+        ),
+        # Newest-first listing of the local copy, optionally by label
+        IndexModel([("google_id", ASCENDING), ("internal_date", DESCENDING)], name="google_id_internal_date"),
+        IndexModel(
+            [("google_id", ASCENDING), ("label_ids", ASCENDING), ("internal_date", DESCENDING)],
+            name="google_id_label_internal_date",
+        ),
+    ],
+    "cache": [
+        # MongoTTLCache entries are removed once `expires_at` has passed
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+# Hot query shapes as (collection, filter, projection). Used to check that none
+# of them is answered with a collection scan.
+QUERY_SHAPES: List[Tuple[str, Dict[str, Any], Dict[str, Any]]] = [
+    ("users", {"google_id": "shape"}, {"_id": 0, "email": 1, "name": 1, "picture": 1, "google_id": 1, "linked_accounts": 1}),
+    ("credentials", {"google_id": "shape", "service": "google"}, {"_id": 0}),
+]
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase) -> None:
+    """Idempotently build the declared indexes. Failures are logged, not raised."""
+    for collection, indexes in INDEXES.items():
+        try:
+            created = await db[collection].create_indexes(indexes)
+            logger.info(f"Indexes ensured on '{collection}': {', '.join(created)}")
+        except OperationFailure as e:
+            # e.g. duplicate data blocking a unique index, or an existing index
+            # with the same keys but different options
+            logger.error(f"Failed to build indexes on '{collection}': {e}")
+
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    stages = [plan.get("stage")]
+    for child_key in ("inputStage", "queryPlan"):
+        if child_key in plan:
+            stages.extend(_plan_stages(plan[child_key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    return [stage for stage in stages if stage]
+
+
+async def verify_query_plans(db: AsyncIOMotorDatabase) -> List[str]:
+    """
+    Explain every declared query shape and return a description of each one
+    whose winning plan contains a collection scan.
+    """
+    offenders: List[str] = []
+    for collection, query_filter, projection in QUERY_SHAPES:
+        command = {"find": collection, "filter": query_filter}
+        if projection:
+            command["projection"] = projection
+        explain = await db.command("explain", command, verbosity="queryPlanner")
+        stages = _plan_stages(explain["queryPlanner"]["winningPlan"])
+        if "COLLSCAN" in stages:
+            offenders.append(f"{collection} {query_filter}: {' <- '.join(stages)}")
+
+    for offender in offenders:
+        logger.warning(f"Query shape uses a collection scan: {offender}")
+    return offenders
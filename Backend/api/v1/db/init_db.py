@@ -1,4 +1,5 @@
 from .session import DatabaseSession
+from .indexes import ensure_indexes, verify_query_plans
 from api.v1.config import db_config
 
 async def init_db():
@@ -6,7 +7,11 @@ async def init_db():
         uri=db_config.MONGO_URI,
         db_name=db_config.MONGO_DB_NAME
     )
+    db = DatabaseSession.get_db()
+    await ensure_indexes(db)
+    if db_config.MONGO_VERIFY_QUERY_PLANS:
+        await verify_query_plans(db)
 
 async def close_db():
     await DatabaseSession.close()
-    
\ No newline at end of file
+    
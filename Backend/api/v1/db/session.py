@@ -1,5 +1,6 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from typing import Optional
+from api.v1.utils.metrics import MongoCommandListener
 
 class DatabaseSession:
     client: Optional[AsyncIOMotorClient] = None
@@ -17,7 +18,8 @@ class DatabaseSession:
         cls.client = AsyncIOMotorClient(
             uri,
             maxPoolSize=100,
-            minPoolSize=10
+            minPoolSize=10,
+            event_listeners=[MongoCommandListener()]
         )
         cls.db = cls.client[db_name]
         print("Database connected")
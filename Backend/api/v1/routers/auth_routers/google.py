@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Request, Response, status, HTTPException
+from fastapi import APIRouter, Depends, Request, Response, status, HTTPException
 from fastapi.responses import RedirectResponse, JSONResponse
 from api.v1.services.auth_services.google import GoogleAuthService
 from api.v1.utils.tokens import get_current_user
 from api.v1.schemas.users import UserResponse
 from api.v1.config import auth_config
+from typing import List
 import secrets
 
 
@@ -27,18 +28,52 @@ async def login_google():
     )
     return response
 
+@router.get("/login/google/link")
+async def link_google_account(request: Request):
+    """Start the OAuth flow for another Gmail account to link to the signed-in user."""
+    await get_current_user(request)
+    response = await login_google()
+    response.set_cookie(
+        key="oauth_link",
+        value="1",
+        httponly=True,
+        secure=True,
+        samesite="lax",
+        domain=".maileyo.in",
+        max_age=200
+    )
+    return response
+
 @router.get("/auth/google/callback")
 async def auth_google_callback(
     code: str,
     state: str,
     request: Request,
-    response: Response,
 ):
+    response = await _complete_google_login(code, state, request)
+    # The link flag is single use, whatever the outcome
+    response.delete_cookie(key="oauth_link", domain=".maileyo.in", secure=True, samesite="lax")
+    return response
+
+async def _complete_google_login(code: str, state: str, request: Request) -> Response:
     try:
+        # Linking keeps the current session; the new account is added to it.
+        # Without a valid session any more, this is an ordinary login.
+        linking_user = None
+        if request.cookies.get("oauth_link"):
+            try:
+                linking_user = await get_current_user(request)
+            except HTTPException:
+                linking_user = None
+
         result = await google_auth_service.handle_google_callback(code, state, request)
         frontend_url = auth_config.FRONTEND_URL
         response = RedirectResponse(url=frontend_url)
 
+        if linking_user is not None:
+            await google_auth_service.link_account(linking_user["google_id"], result["user"]["user_id"])
+            return response
+
         # Set JWT token in HTTP-only cookie for user identification
         response.set_cookie(
             key="token",
@@ -108,6 +143,15 @@ async def get_user(request: Request):
             }
         )
 
+@router.get("/auth/google/accounts", response_model=List[UserResponse])
+async def list_linked_accounts(current_user: dict = Depends(get_current_user)):
+    return await google_auth_service.list_linked_accounts(current_user)
+
+@router.delete("/auth/google/accounts/{google_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def unlink_account(google_id: str, current_user: dict = Depends(get_current_user)):
+    await google_auth_service.unlink_account(current_user["google_id"], google_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
 @router.post("/auth/logout")
 async def logout():
     response = Response(content="Logged out successfully")
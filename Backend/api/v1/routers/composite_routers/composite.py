@@ -0,0 +1,29 @@
+from fastapi import APIRouter, BackgroundTasks, Depends
+import logging
+
+from api.v1.schemas.composite import CompositeRequest, CompositeResponse
+from api.v1.services.email_services.composite_service import composite_service
+from api.v1.utils.tokens import get_current_user
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["composite"])
+
+
+@router.post("/composite", response_model=CompositeResponse)
+async def composite(
+    composite_request: CompositeRequest,
+    background_tasks: BackgroundTasks,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Run several operations in one round trip, authenticating once. Each
+    operation is `{"id", "op", "params"}`, where `op` is one of `user`,
+    `fetch_folder` (params of `/emails/fetch`), `fetch_by_contact` (body of
+    `/emails/fetch-by-contact`), `mark_read` (`message_ids`, optional
+    `account`), `counters` or `sync_status`. Results are keyed by `id`, each
+    with its own `status` and either `body` or `error`; the request itself
+    succeeds even when some operations fail.
+    """
+    results = await composite_service.run(current_user, composite_request.operations, background_tasks)
+    return CompositeResponse(results=results)
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Header, HTTPException, status
+from typing import Optional
+import secrets
+
+from api.v1.config import diagnostics_config
+from api.v1.utils.loop_diagnostics import loop_stall_detector
+
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+
+def verify_debug_token(x_debug_token: Optional[str]) -> None:
+    # Hidden unless diagnostics are enabled and a token is configured
+    if not diagnostics_config.LOOP_DIAGNOSTICS_ENABLED or not diagnostics_config.DEBUG_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_debug_token or not secrets.compare_digest(x_debug_token, diagnostics_config.DEBUG_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid debug token")
+
+
+@router.get("/loop-stalls", include_in_schema=False)
+async def loop_stalls(x_debug_token: Optional[str] = Header(None)):
+    """
+    Recent event-loop stalls (with the blocked stack) and slow callbacks.
+    Requires LOOP_DIAGNOSTICS_ENABLED and an `X-Debug-Token` header matching DEBUG_TOKEN.
+    """
+    verify_debug_token(x_debug_token)
+    return {
+        "threshold": loop_stall_detector.threshold,
+        "reports": loop_stall_detector.reports(),
+    }
@@ -1,23 +1,28 @@
-from fastapi import APIRouter, HTTPException, status, Request, Depends, BackgroundTasks
-from typing import Optional
+from fastapi import APIRouter, HTTPException, status, Request, Depends, BackgroundTasks, Response
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Optional
+import json
 import logging
 from datetime import datetime
 
 from api.v1.schemas.emails import (
     FetchEmailsResponse, FetchEmailsByContactRequest,
     SendEmailRequest, SendEmailResponse, EmailFolder,
-    DownloadAttachmentResponse
+    DownloadAttachmentResponse, FolderCountersResponse, RenderedEmailResponse
 )
-from api.v1.services.email_services.gmail_service import GmailService
-from api.v1.utils.tokens import get_current_user
+from api.v1.config import render_config
+from api.v1.services.email_services.gmail_service import gmail_service
+from api.v1.services.email_services.image_proxy import image_proxy
+from api.v1.services.email_services.image_service import message_image_service
+from api.v1.services.email_services.images import FORMATS, MAX_DIMENSION
+from api.v1.services.email_services.render_service import message_renderer
+from api.v1.utils.url_signing import verify
+from api.v1.utils.tokens import account_ids, get_account_id, get_current_user
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/emails", tags=["emails"])
 
-# Initialize Gmail service
-gmail_service = GmailService()
-
 
 @router.get("/fetch", response_model=FetchEmailsResponse)
 async def fetch_emails(
@@ -26,8 +31,14 @@ async def fetch_emails(
     max_results: int = 10,
     page_token: Optional[str] = None,
     query: Optional[str] = None,
+    unified: bool = False,
     current_user: dict = Depends(get_current_user)
 ):
+    """
+    With `unified=true`, one page merged newest-first across the user's own
+    and linked accounts; each email then carries an `account` field to pass
+    back to message-level endpoints.
+    """
     try:
         if max_results < 1 or max_results > 100:    
             raise HTTPException(
@@ -35,13 +46,22 @@ async def fetch_emails(
                 detail="max_results must be between 1 and 100"
             )
         
-        result = await gmail_service.fetch_messages(
-            user_id=current_user["google_id"],
-            folder=folder,
-            max_results=max_results,
-            page_token=page_token,
-            query=query
-        )
+        if unified:
+            result = await gmail_service.fetch_unified_messages(
+                accounts=account_ids(current_user),
+                folder=folder,
+                max_results=max_results,
+                page_token=page_token,
+                query=query
+            )
+        else:
+            result = await gmail_service.fetch_messages(
+                user_id=current_user["google_id"],
+                folder=folder,
+                max_results=max_results,
+                page_token=page_token,
+                query=query
+            )
         
         return FetchEmailsResponse(
             emails=result["emails"],
@@ -60,6 +80,183 @@ async def fetch_emails(
         )
 
 
+@router.get("/fetch/stream")
+async def fetch_emails_stream(
+    folder: EmailFolder = EmailFolder.INBOX_PRIMARY,
+    max_results: int = 10,
+    page_token: Optional[str] = None,
+    query: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Streaming variant of `/fetch` as newline-delimited JSON. The first line is
+    `{"type": "meta", ...}` with the page metadata, then one
+    `{"type": "message", "index": i, "message": {...}}` line per message as
+    soon as it is parsed (in arrival order; `index` is its position in the
+    page), and finally `{"type": "done", "count": n}` or `{"type": "error", ...}`.
+    """
+    if max_results < 1 or max_results > 100:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="max_results must be between 1 and 100"
+        )
+
+    user_id = current_user["google_id"]
+    # Resolved before the response starts so errors still get a real status code
+    try:
+        ids_response = await gmail_service.fetch_message_ids(
+            user_id=user_id, folder=folder, max_results=max_results, page_token=page_token, query=query
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error listing emails for stream: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch emails"
+        )
+    message_ids = [m["id"] for m in ids_response.get("messages", [])]
+
+    async def frames() -> AsyncIterator[str]:
+        yield json.dumps({
+            "type": "meta",
+            "next_page_token": ids_response.get("nextPageToken"),
+            "result_size_estimate": ids_response.get("resultSizeEstimate", len(message_ids)),
+            "total_count": len(message_ids),
+        }) + "\n"
+        count = 0
+        try:
+            async for index, message in gmail_service.stream_messages(user_id, message_ids):
+                count += 1
+                yield json.dumps({"type": "message", "index": index, "message": message}) + "\n"
+        except Exception as e:
+            logger.error(f"Error streaming emails: {str(e)}")
+            detail = e.detail if isinstance(e, HTTPException) else "Failed to fetch emails"
+            yield json.dumps({"type": "error", "detail": detail}) + "\n"
+            return
+        yield json.dumps({"type": "done", "count": count}) + "\n"
+
+    return StreamingResponse(
+        frames(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/messages/{message_id}/render", response_model=RenderedEmailResponse)
+async def render_email(
+    message_id: str,
+    account_id: str = Depends(get_account_id)
+):
+    """
+    Sanitized HTML body (remote images rewritten to `/emails/image-proxy`)
+    and a plain-text preview, cached per message version.
+    """
+    try:
+        rendered = await message_renderer.render(account_id, message_id)
+        return RenderedEmailResponse(**rendered)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error rendering email {message_id}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to render email"
+        )
+
+
+@router.get("/messages/{message_id}/images/{ref}")
+async def message_image(
+    message_id: str,
+    ref: str,
+    w: Optional[int] = None,
+    h: Optional[int] = None,
+    format: str = "webp",
+    account_id: str = Depends(get_account_id)
+):
+    """
+    An inline image (`ref` = `cid:<content-id>`) or image attachment (`ref` =
+    attachment id), resized to fit `w` x `h` and re-encoded as `format`
+    (webp, jpeg or png). Served as raw bytes, cacheable by the browser.
+    """
+    if format not in FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"format must be one of {sorted(FORMATS)}"
+        )
+    for size in (w, h):
+        if size is not None and not 16 <= size <= MAX_DIMENSION:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"w and h must be between 16 and {MAX_DIMENSION}"
+            )
+
+    try:
+        content, media_type = await message_image_service.get(
+            account_id, message_id, ref, width=w, height=h, fmt=format
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error producing image {ref} of {message_id}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to load image"
+        )
+
+    # Message content never changes for a given id, so the variant is immutable
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={"Cache-Control": "private, max-age=604800, immutable"},
+    )
+
+
+@router.get("/image-proxy", include_in_schema=False)
+async def proxy_image(url: str, sig: str):
+    """Remote image referenced by a rendered email. Only URLs signed by the renderer are served."""
+    if not verify(url, sig, render_config.IMAGE_PROXY_SECRET):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid image signature")
+
+    content, media_type = await image_proxy.fetch(url)
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={
+            "Cache-Control": "public, max-age=86400",
+            # SVGs opened directly must not run scripts on our origin
+            "Content-Security-Policy": "default-src 'none'; style-src 'unsafe-inline'; sandbox",
+            "X-Content-Type-Options": "nosniff",
+        },
+    )
+
+
+@router.get("/counters", response_model=FolderCountersResponse)
+async def fetch_folder_counters(
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Total and unread message counts for the inbox and every folder. Folders
+    that are a single Gmail label are exact; the others (categories,
+    Primary+Sent, AllMails) are estimates and come with `exact: false`.
+    Cached per user and refreshed after label changes, sends and history
+    syncs.
+    """
+    try:
+        counters = await gmail_service.fetch_folder_counters(current_user["google_id"])
+        return FolderCountersResponse(counters=counters)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching folder counters: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch folder counters"
+        )
+
+
 @router.post("/fetch-by-contact", response_model=FetchEmailsResponse)
 async def fetch_emails_by_contact(
     request: Request,
@@ -151,17 +348,21 @@ async def download_attachment(
     attachment_id: str,
     file_name: str = "attachment",
     mime_type: str = "application/octet-stream",
-    current_user: dict = Depends(get_current_user),
+    size: Optional[int] = None,
+    account_id: str = Depends(get_account_id),
 ):
     """
     Download an email attachment by message ID and attachment ID.
     
     - **message_id**: Gmail message ID containing the attachment
     - **attachment_id**: Specific attachment ID within the message
+    - **size**: Attachment size from the message payload, if known; used only
+      to budget memory for concurrent downloads, and only when it is larger
+      than ADMISSION_DEFAULT_REQUEST_BYTES
     """
     try:
         result = await gmail_service.download_attachment(
-            user_id=current_user["google_id"],
+            user_id=account_id,
             message_id=message_id,
             attachment_id=attachment_id,
             file_name=file_name,
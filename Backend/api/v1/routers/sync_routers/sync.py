@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+import logging
+
+from api.v1.config import sync_config
+from api.v1.services.sync_services.backfill import get_sync_state, start_backfill
+from api.v1.utils.tokens import get_current_user
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+
+def require_sync_enabled() -> None:
+    if not sync_config.SYNC_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Mailbox sync is not enabled"
+        )
+
+
+@router.get("/status")
+async def sync_status(current_user: dict = Depends(get_current_user)):
+    """Backfill progress and the incremental sync cursor for the current user."""
+    require_sync_enabled()
+    return await get_sync_state(current_user["google_id"])
+
+
+@router.post("/backfill", status_code=status.HTTP_202_ACCEPTED)
+async def request_backfill(
+    force: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    """Queue a mailbox backfill. `force` re-runs a finished one."""
+    require_sync_enabled()
+    job_id = await start_backfill(current_user["google_id"], force=force)
+    return {"queued": job_id is not None, "job_id": str(job_id) if job_id else None}
@@ -0,0 +1,51 @@
+from pydantic import BaseModel, Field, field_validator
+from typing import Any, Dict, List, Optional
+from enum import Enum
+
+from api.v1.schemas.emails import FetchEmailsRequest
+
+
+class CompositeOp(str, Enum):
+    USER = "user"
+    FETCH_FOLDER = "fetch_folder"
+    FETCH_BY_CONTACT = "fetch_by_contact"
+    MARK_READ = "mark_read"
+    COUNTERS = "counters"
+    SYNC_STATUS = "sync_status"
+
+
+class CompositeOperation(BaseModel):
+    id: str = Field(..., min_length=1, max_length=64, description="Key of this operation's result")
+    op: CompositeOp
+    params: Dict[str, Any] = {}
+
+
+class CompositeRequest(BaseModel):
+    operations: List[CompositeOperation] = Field(..., min_length=1, max_length=20)
+
+    @field_validator("operations")
+    @classmethod
+    def unique_ids(cls, operations: List[CompositeOperation]) -> List[CompositeOperation]:
+        ids = [operation.id for operation in operations]
+        if len(set(ids)) != len(ids):
+            raise ValueError("operation ids must be unique")
+        return operations
+
+
+class CompositeResult(BaseModel):
+    status: int
+    body: Optional[Any] = None
+    error: Optional[Any] = None
+
+
+class CompositeResponse(BaseModel):
+    results: Dict[str, CompositeResult]
+
+
+class FetchFolderParams(FetchEmailsRequest):
+    unified: bool = False
+
+
+class MarkReadParams(BaseModel):
+    message_ids: List[str] = Field(..., min_length=1, max_length=1000)
+    account: Optional[str] = None
@@ -69,6 +69,24 @@ class FetchEmailsResponse(BaseModel):
     total_count: int
 
 
+class FolderCounter(BaseModel):
+    total: int
+    unread: int
+    exact: bool = True  # False when Gmail could only estimate the counts
+
+
+class FolderCountersResponse(BaseModel):
+    counters: Dict[str, FolderCounter]
+
+
+class RenderedEmailResponse(BaseModel):
+    message_id: str
+    history_id: Optional[str] = None
+    html: Optional[str] = None  # sanitized; None for plain-text messages
+    preview: str
+    remote_images: int = 0
+
+
 class FetchEmailsByContactRequest(BaseModel):
     email_address: EmailStr
     max_results: int = Field(10, ge=1, le=100)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import List, Optional
+from typing import Optional
 from datetime import datetime
 
 
@@ -11,12 +11,17 @@ class OAuthToken(BaseModel):
     refresh_token_expiry: datetime
 
 
+class OAuthCredential(OAuthToken):
+    """A stored credential document in the `credentials` collection."""
+    google_id: str = Field(..., min_length=5)
+    updated_at: datetime
+
+
 class UserCreate(BaseModel):
     email: EmailStr
     name: Optional[str] = None
     picture: Optional[str] = None
     google_id: str = Field(..., min_length=5)
-    oauth: List[OAuthToken]
     created_at: Optional[datetime] = None
     updated_at: datetime
 
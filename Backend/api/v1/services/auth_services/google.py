@@ -3,12 +3,18 @@ from fastapi import Request, HTTPException
 from api.v1.utils.verify_id_token import verify_id_token_with_retry
 from api.v1.utils.validate_scopes import validate_scopes
 from api.v1.utils.jwt import create_jwt_token
+from api.v1.services.auth_services.oauth_client import google_oauth_client
 from datetime import datetime, timezone, timedelta
+import asyncio
 import logging
+from typing import List
 
-from api.v1.config import auth_config
+from api.v1.config import auth_config, sync_config
 from api.v1.db.session import DatabaseSession
-from api.v1.schemas.users import UserCreate, OAuthToken
+from api.v1.schemas.users import UserCreate, OAuthCredential
+from api.v1.services.sync_services.backfill import start_backfill
+from api.v1.utils.cache import cache
+from api.v1.utils.tokens import access_token_cache_key, user_cache_key
 
 logger = logging.getLogger(__name__)
 
@@ -25,8 +31,8 @@ class GoogleAuthService:
             "https://www.googleapis.com/auth/gmail.modify",
         }
         self.JWT_TOKEN_EXPIRE_MINUTES = 10080 # 7 Days
+        self.MAX_LINKED_ACCOUNTS = 5
         self.GOOGLE_AUTH_URL = "https://accounts.google.com/o/oauth2/auth"       
-        self.GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
         self.fernet = auth_config.FERNET_KEY
 
     def encrypt_token(self, token: str) -> str:
@@ -56,19 +62,8 @@ class GoogleAuthService:
             raise HTTPException(status_code=400, detail="Invalid or missing OAuth state")
 
         try:
-            async with httpx.AsyncClient() as client:
-                token_response = await client.post(
-                    self.GOOGLE_TOKEN_URL,
-                    data={
-                        "code": code,
-                        "client_id": auth_config.GOOGLE_CLIENT_ID,
-                        "client_secret": auth_config.GOOGLE_CLIENT_SECRET,
-                        "redirect_uri": auth_config.GOOGLE_REDIRECT_URI,
-                        "grant_type": "authorization_code",
-                    },
-                    timeout=10
-                )
-                token_response.raise_for_status()
+            token_response = await google_oauth_client.exchange_code(code)
+            token_response.raise_for_status()
         except httpx.HTTPError as e:
             logger.error(f"Token exchange failed: {str(e)}")
             raise HTTPException(
@@ -121,7 +116,7 @@ class GoogleAuthService:
 
         # Verify ID token
         try:
-            id_info = verify_id_token_with_retry(id_token_str, auth_config.GOOGLE_CLIENT_ID)
+            id_info = await verify_id_token_with_retry(id_token_str, auth_config.GOOGLE_CLIENT_ID)
         except ValueError as ve:
             logger.error(f"Invalid ID token: {str(ve)}")
             raise HTTPException(status_code=400, detail="Invalid ID token") from ve
@@ -143,31 +138,43 @@ class GoogleAuthService:
                 name=name,
                 picture=picture,
                 google_id=google_id_val,
-                oauth=[OAuthToken(
-                    service="google",
-                    access_token=encrypted_access_token,
-                    refresh_token=encrypted_refresh_token,
-                    access_token_expiry=access_token_expiry,
-                    refresh_token_expiry=refresh_token_expiry
-                )],
                 created_at=now,
                 updated_at=now
             )
+            credential = OAuthCredential(
+                google_id=google_id_val,
+                service="google",
+                access_token=encrypted_access_token,
+                refresh_token=encrypted_refresh_token,
+                access_token_expiry=access_token_expiry,
+                refresh_token_expiry=refresh_token_expiry,
+                updated_at=now
+            )
         except Exception as e:
             logger.error(f"User validation error: {str(e)}")
             raise HTTPException(status_code=422, detail="Invalid user data format") from e
 
-        # Save user to database
+        # Save user profile and credentials (separate collections) to database
         db = DatabaseSession.get_db()
         try:
-            await db["users"].update_one(
-                {"email": user.email, "google_id": user.google_id},
-                {
-                    "$set": user.model_dump(exclude={"created_at"}, by_alias=True),
-                    "$setOnInsert": {"created_at": user.created_at}
-                },
-                upsert=True
+            await asyncio.gather(
+                # Keyed on google_id alone: the Google account's email can change
+                db["users"].update_one(
+                    {"google_id": user.google_id},
+                    {
+                        "$set": user.model_dump(exclude={"created_at"}, by_alias=True),
+                        "$setOnInsert": {"created_at": user.created_at}
+                    },
+                    upsert=True
+                ),
+                db["credentials"].update_one(
+                    {"google_id": credential.google_id, "service": credential.service},
+                    {"$set": credential.model_dump()},
+                    upsert=True
+                ),
             )
+            # Profile and tokens just changed; drop copies cached by any worker
+            await cache.delete(user_cache_key(user.google_id), access_token_cache_key(user.google_id))
 
         except Exception as e:
             logger.error(f"Database error: {str(e)}")
@@ -175,6 +182,13 @@ class GoogleAuthService:
                 status_code=500,
                 detail="Failed to save user information"
             ) from e
+
+        if sync_config.SYNC_ENABLED:
+            try:
+                await start_backfill(user.google_id)
+            except Exception as e:
+                # Login must not fail because the sync queue is unavailable
+                logger.error(f"Failed to queue backfill for user {user.google_id}: {e}")
         
         data = {
             "user_id": user.google_id,
@@ -191,4 +205,49 @@ class GoogleAuthService:
         }
 
         return response
-    
\ No newline at end of file
+
+    async def link_account(self, google_id: str, linked_google_id: str) -> None:
+        """
+        Link another Gmail account (already signed in through the OAuth callback,
+        so its own user and credentials documents exist) to `google_id`.
+        """
+        if linked_google_id == google_id:
+            raise HTTPException(status_code=400, detail="Cannot link an account to itself")
+
+        db = DatabaseSession.get_db()
+        result = await db["users"].update_one(
+            {
+                "google_id": google_id,
+                f"linked_accounts.{self.MAX_LINKED_ACCOUNTS - 1}": {"$exists": False},
+            },
+            {"$addToSet": {"linked_accounts": linked_google_id}},
+        )
+        if result.matched_count == 0:
+            raise HTTPException(
+                status_code=400,
+                detail=f"At most {self.MAX_LINKED_ACCOUNTS} accounts can be linked",
+            )
+        await cache.delete(user_cache_key(google_id))
+        logger.info(f"Linked account {linked_google_id} to user {google_id}")
+
+    async def unlink_account(self, google_id: str, linked_google_id: str) -> None:
+        db = DatabaseSession.get_db()
+        result = await db["users"].update_one(
+            {"google_id": google_id, "linked_accounts": linked_google_id},
+            {"$pull": {"linked_accounts": linked_google_id}},
+        )
+        if result.matched_count == 0:
+            raise HTTPException(status_code=404, detail="Account is not linked to this user")
+        await cache.delete(user_cache_key(google_id))
+
+    async def list_linked_accounts(self, user: dict) -> List[dict]:
+        linked = user.get("linked_accounts", [])
+        if not linked:
+            return []
+        db = DatabaseSession.get_db()
+        cursor = db["users"].find(
+            {"google_id": {"$in": linked}},
+            {"_id": 0, "email": 1, "name": 1, "picture": 1, "google_id": 1},
+        )
+        profiles = {doc["google_id"]: doc async for doc in cursor}
+        return [profiles[google_id] for google_id in linked if google_id in profiles]
@@ -0,0 +1,133 @@
+import asyncio
+import importlib.util
+import logging
+from typing import Dict, Optional
+
+import httpx
+
+from api.v1.config import auth_config, gmail_config
+from api.v1.utils.resilience import get_breaker
+
+logger = logging.getLogger(__name__)
+
+
+class GoogleOAuthClient:
+    """
+    Long-lived, pooled HTTP client for all OAuth traffic to Google: code
+    exchange, token refresh, revocation and certificate fetches. Started and
+    closed by the app lifespan so connections (and TLS sessions) are reused
+    across logins.
+    """
+
+    TOKEN_URL: str = f"{gmail_config.GOOGLE_OAUTH_ROOT}/token"
+    REVOKE_URL: str = f"{gmail_config.GOOGLE_OAUTH_ROOT}/revoke"
+
+    TIMEOUT = httpx.Timeout(10.0, connect=3.0)
+    LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60)
+    MAX_ATTEMPTS = 3
+    BACKOFF = 0.25  # seconds, doubled per attempt
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _build_client(self) -> httpx.AsyncClient:
+        # HTTP/2 needs the optional `h2` package (httpx[http2])
+        http2 = importlib.util.find_spec("h2") is not None
+        return httpx.AsyncClient(http2=http2, timeout=self.TIMEOUT, limits=self.LIMITS)
+
+    async def start(self) -> None:
+        if self._client is None:
+            self._client = self._build_client()
+
+    async def warm_up(self) -> None:
+        """Open a pooled connection to the token endpoint; the response itself is ignored."""
+        await self.client.head(self.TOKEN_URL)
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            # Outside the app lifespan (scripts, one-off tasks) start lazily
+            self._client = self._build_client()
+        return self._client
+
+    async def _send(
+        self, name: str, method: str, url: str, idempotent: bool, **kwargs
+    ) -> httpx.Response:
+        """
+        Send a request behind the endpoint's circuit breaker.
+
+        Requests that never reached Google (connect errors) are always retried.
+        Transport errors mid-request and 429/5xx responses are only retried for
+        idempotent calls, since an authorization code can be redeemed once.
+        """
+        breaker = get_breaker(f"google:{name}")
+
+        for attempt in range(self.MAX_ATTEMPTS):
+            last_attempt = attempt == self.MAX_ATTEMPTS - 1
+            try:
+                response = await breaker.call(
+                    lambda: self.client.request(method, url, **kwargs),
+                    is_failure=lambda r: r.status_code >= 500 or r.status_code == 429,
+                )
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+                if last_attempt:
+                    raise
+            except httpx.TransportError:
+                if not idempotent or last_attempt:
+                    raise
+            else:
+                retryable = response.status_code >= 500 or response.status_code == 429
+                if not (retryable and idempotent) or last_attempt:
+                    return response
+
+            logger.warning(f"Retrying Google OAuth call '{name}' (attempt {attempt + 2})")
+            await asyncio.sleep(self.BACKOFF * (2 ** attempt))
+
+    async def exchange_code(self, code: str) -> httpx.Response:
+        return await self._send(
+            "oauth.code_exchange",
+            "POST",
+            self.TOKEN_URL,
+            idempotent=False,
+            data={
+                "code": code,
+                "client_id": auth_config.GOOGLE_CLIENT_ID,
+                "client_secret": auth_config.GOOGLE_CLIENT_SECRET,
+                "redirect_uri": auth_config.GOOGLE_REDIRECT_URI,
+                "grant_type": "authorization_code",
+            },
+        )
+
+    async def refresh_token(self, refresh_token: str) -> httpx.Response:
+        return await self._send(
+            "oauth.refresh",
+            "POST",
+            self.TOKEN_URL,
+            idempotent=True,
+            data={
+                "client_id": auth_config.GOOGLE_CLIENT_ID,
+                "client_secret": auth_config.GOOGLE_CLIENT_SECRET,
+                "refresh_token": refresh_token,
+                "grant_type": "refresh_token",
+            },
+        )
+
+    async def revoke_token(self, token: str) -> httpx.Response:
+        return await self._send(
+            "oauth.revoke",
+            "POST",
+            self.REVOKE_URL,
+            idempotent=True,
+            data={"token": token},
+        )
+
+    async def get(self, name: str, url: str, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        return await self._send(name, "GET", url, idempotent=True, headers=headers)
+
+
+google_oauth_client = GoogleOAuthClient()
@@ -0,0 +1,130 @@
+import codecs
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+# Kept free of app configuration so it can be benchmarked in isolation
+# (see benchmarks/batch_codec.py).
+
+
+def build_batch_body(boundary: str, message_ids: List[str], fmt: str = "full") -> str:
+    """Encode a multipart/mixed Gmail batch body with one messages.get per id."""
+    body_lines = []
+    for i, msg_id in enumerate(message_ids):
+        content_id = i + 1
+        body_lines.extend(
+            [
+                f"--{boundary}",
+                "Content-Type: application/http",
+                f"Content-ID: {content_id}",
+                "",
+                f"GET /gmail/v1/users/me/messages/{msg_id}?format={fmt}",
+                "",
+            ]
+        )
+    body_lines.append(f"--{boundary}--")
+    return "\r\n".join(body_lines)
+
+
+def response_boundary(content_type: str, default: Optional[str] = None) -> Optional[str]:
+    """Extract the multipart boundary from a batch response's Content-Type."""
+    boundary_match = re.search(r'boundary=([^;]+)', content_type or '')
+    return boundary_match.group(1) if boundary_match else default
+
+
+class BatchPartError(Exception):
+    """A sub-request (batch part or single messages.get) that didn't return 200."""
+
+    def __init__(self, status: int, detail: str):
+        super().__init__(f"Batch subrequest failed: {detail}")
+        self.status = status
+
+    @property
+    def retryable(self) -> bool:
+        return self.status == 429 or self.status >= 500
+
+
+def _status_code(status_line: str) -> int:
+    try:
+        return int(status_line.split()[1])
+    except (IndexError, ValueError):
+        # Unreadable status: treat it like a server error
+        return 500
+
+
+def parse_batch_part(part: str, skip_failed: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Decode one part of a batch response; None for parts that carry no HTTP
+    response. With `skip_failed`, parts that failed for good (a 404 for a
+    message deleted meanwhile, say) are None too; 429 and 5xx still raise.
+    """
+    part = part.strip()
+    if not part:
+        return None
+
+    if "Content-Type: application/http" not in part:
+        return None
+
+    http_response = part.split("\r\n\r\n", 1)[1] if "\r\n\r\n" in part else part
+    response_lines = http_response.split("\r\n")
+
+    status_line = response_lines[0]
+    if not status_line.startswith("HTTP/1.1 200 OK"):
+        error = BatchPartError(_status_code(status_line), status_line)
+        if skip_failed and not error.retryable:
+            return None
+        raise error
+
+    header_end = None
+    for i, line in enumerate(response_lines[1:], 1):
+        if line.strip() == "":
+            header_end = i
+            break
+
+    if header_end is None:
+        raise Exception("Invalid HTTP response format: no empty line after headers")
+
+    json_body = "\r\n".join(response_lines[header_end+1:]).strip()
+
+    try:
+        return json.loads(json_body)
+    except json.JSONDecodeError as e:
+        raise Exception(f"Failed to parse JSON from batch response: {e}")
+
+
+def parse_batch_response(raw_response: str, boundary: str, skip_failed: bool = False) -> List[Dict[str, Any]]:
+    """Decode a multipart/mixed Gmail batch response into message resources."""
+    parts = raw_response.split(f"--{boundary}")[1:-1]  # Skip first and last empty parts
+    messages = (parse_batch_part(part, skip_failed) for part in parts)
+    return [message for message in messages if message is not None]
+
+
+class BatchResponseParser:
+    """
+    Incremental `parse_batch_response`: feed the body as it arrives and get
+    each message back as soon as the delimiter after its part has been seen.
+    """
+
+    def __init__(self, boundary: str):
+        self.delimiter = f"--{boundary}"
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._scan_from = 0
+        self._started = False
+
+    def feed(self, chunk: bytes) -> List[Dict[str, Any]]:
+        self._buffer += self._decoder.decode(chunk)
+        messages = []
+        while True:
+            index = self._buffer.find(self.delimiter, self._scan_from)
+            if index < 0:
+                # The delimiter may straddle this chunk and the next
+                self._scan_from = max(0, len(self._buffer) - len(self.delimiter))
+                return messages
+            if self._started:
+                message = parse_batch_part(self._buffer[:index])
+                if message is not None:
+                    messages.append(message)
+            self._started = True
+            self._buffer = self._buffer[index + len(self.delimiter):]
+            self._scan_from = 0
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Type
+
+from fastapi import BackgroundTasks, HTTPException, status
+from pydantic import BaseModel, ValidationError
+
+from api.v1.config import sync_config
+from api.v1.schemas.composite import (
+    CompositeOp, CompositeOperation, CompositeResult, FetchFolderParams, MarkReadParams
+)
+from api.v1.schemas.emails import FetchEmailsByContactRequest, FetchEmailsResponse, FolderCountersResponse
+from api.v1.schemas.users import UserResponse
+from api.v1.services.email_services.gmail_service import gmail_service
+from api.v1.services.sync_services.backfill import get_sync_state
+from api.v1.utils.metrics import COMPOSITE_OPERATION_DURATION
+from api.v1.utils.tokens import access_token_scope, account_ids, resolve_account
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict, Optional[BaseModel], BackgroundTasks], Awaitable[Any]]
+
+
+class CompositeService:
+    """
+    Runs several client operations for one authenticated user in one request.
+    Writes run first, in request order, so reads in the same request see them;
+    reads then run concurrently. Access tokens are resolved once per account
+    for the whole request. Each operation succeeds or fails on its own.
+    """
+
+    WRITES = {CompositeOp.MARK_READ}
+    PARAMS: Dict[CompositeOp, Type[BaseModel]] = {
+        CompositeOp.FETCH_FOLDER: FetchFolderParams,
+        CompositeOp.FETCH_BY_CONTACT: FetchEmailsByContactRequest,
+        CompositeOp.MARK_READ: MarkReadParams,
+    }
+
+    def __init__(self):
+        self._handlers: Dict[CompositeOp, Handler] = {
+            CompositeOp.USER: self._user,
+            CompositeOp.FETCH_FOLDER: self._fetch_folder,
+            CompositeOp.FETCH_BY_CONTACT: self._fetch_by_contact,
+            CompositeOp.MARK_READ: self._mark_read,
+            CompositeOp.COUNTERS: self._counters,
+            CompositeOp.SYNC_STATUS: self._sync_status,
+        }
+
+    async def run(
+        self,
+        current_user: dict,
+        operations: List[CompositeOperation],
+        background_tasks: BackgroundTasks,
+    ) -> Dict[str, CompositeResult]:
+        results: Dict[str, CompositeResult] = {}
+        with access_token_scope():
+            for operation in operations:
+                if operation.op in self.WRITES:
+                    results[operation.id] = await self._run_one(operation, current_user, background_tasks)
+
+            reads = [operation for operation in operations if operation.op not in self.WRITES]
+            outcomes = await asyncio.gather(*(
+                self._run_one(operation, current_user, background_tasks) for operation in reads
+            ))
+            results.update({operation.id: outcome for operation, outcome in zip(reads, outcomes)})
+
+        # Same order as requested
+        return {operation.id: results[operation.id] for operation in operations}
+
+    async def _run_one(
+        self, operation: CompositeOperation, current_user: dict, background_tasks: BackgroundTasks
+    ) -> CompositeResult:
+        outcome = "500"
+        start = time.perf_counter()
+        try:
+            params_model = self.PARAMS.get(operation.op)
+            try:
+                params = params_model(**operation.params) if params_model else None
+            except ValidationError as e:
+                outcome = "422"
+                return CompositeResult(
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    error=e.errors(include_url=False, include_context=False),
+                )
+            body = await self._handlers[operation.op](current_user, params, background_tasks)
+            outcome = "200"
+            return CompositeResult(status=status.HTTP_200_OK, body=body)
+        except HTTPException as e:
+            outcome = str(e.status_code)
+            return CompositeResult(status=e.status_code, error=e.detail)
+        except Exception as e:
+            logger.error(f"Composite operation '{operation.op.value}' failed: {str(e)}")
+            return CompositeResult(status=status.HTTP_500_INTERNAL_SERVER_ERROR, error="Operation failed")
+        finally:
+            COMPOSITE_OPERATION_DURATION.labels(op=operation.op.value, status=outcome).observe(
+                time.perf_counter() - start
+            )
+
+    async def _user(self, current_user: dict, params: None, background_tasks: BackgroundTasks):
+        return UserResponse(
+            email=current_user["email"],
+            name=current_user.get("name"),
+            picture=current_user.get("picture"),
+            google_id=current_user["google_id"],
+        ).model_dump()
+
+    async def _fetch_folder(self, current_user: dict, request: FetchFolderParams, background_tasks: BackgroundTasks):
+        if request.unified:
+            result = await gmail_service.fetch_unified_messages(
+                accounts=account_ids(current_user),
+                folder=request.folder,
+                max_results=request.max_results,
+                page_token=request.page_token,
+                query=request.query,
+            )
+        else:
+            result = await gmail_service.fetch_messages(
+                user_id=current_user["google_id"],
+                folder=request.folder,
+                max_results=request.max_results,
+                page_token=request.page_token,
+                query=request.query,
+            )
+        return FetchEmailsResponse(**result).model_dump()
+
+    async def _fetch_by_contact(
+        self, current_user: dict, request: FetchEmailsByContactRequest, background_tasks: BackgroundTasks
+    ):
+        result = await gmail_service.fetch_emails_by_contact(
+            user_id=current_user["google_id"],
+            email_address=request.email_address,
+            background_tasks=background_tasks,
+            max_results=request.max_results,
+            page_token=request.page_token,
+        )
+        return FetchEmailsResponse(**result).model_dump()
+
+    async def _mark_read(self, current_user: dict, request: MarkReadParams, background_tasks: BackgroundTasks):
+        account = resolve_account(current_user, request.account)
+        await gmail_service.mark_messages_as_read(account, request.message_ids)
+        return {"marked": len(request.message_ids)}
+
+    async def _counters(self, current_user: dict, params: None, background_tasks: BackgroundTasks):
+        counters = await gmail_service.fetch_folder_counters(current_user["google_id"])
+        return FolderCountersResponse(counters=counters).model_dump()
+
+    async def _sync_status(self, current_user: dict, params: None, background_tasks: BackgroundTasks):
+        if not sync_config.SYNC_ENABLED:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Mailbox sync is not enabled")
+        return await get_sync_state(current_user["google_id"])
+
+
+composite_service = CompositeService()
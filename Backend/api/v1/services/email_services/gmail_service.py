@@ -1,18 +1,44 @@
-from fastapi import BackgroundTasks
+from fastapi import BackgroundTasks, HTTPException, status
 import aiohttp
+import asyncio
+import httpx
 import base64
+import heapq
+import importlib.util
+import itertools
 import json
-import re
+import time
 import uuid
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, AsyncIterator, List, NamedTuple, Tuple
+from api.v1.config import cache_config, gmail_config, sync_config
+from api.v1.services.sync_services.scheduler import sync_scheduler
+from api.v1.utils.cache import cache
 from api.v1.utils.tokens import get_access_token
+from api.v1.services.email_services.batch_codec import (
+    BatchPartError, BatchResponseParser, build_batch_body, parse_batch_response, response_boundary
+)
+from api.v1.services.email_services.message_codec import decode_message, encode_message
+from api.v1.utils.resilience import CircuitOpenError, UserBackoff, get_breaker, hedged
+from api.v1.utils.single_flight import SingleFlight
+from api.v1.utils.metrics import (
+    GMAIL_BATCH_PARSE_DURATION, GMAIL_BATCH_SIZE, GMAIL_REQUEST_DURATION, record_cache, span
+)
+
+
+class GmailResponse(NamedTuple):
+    status: int
+    headers: Any
+    text: str
+
+    def json(self) -> Any:
+        return json.loads(self.text)
 
 
 class GmailService:
     """Asynchronous service for interacting with the Gmail API."""
 
-    BASE_URL: str = "https://www.googleapis.com/gmail/v1/users/me"
-    BATCH_URL: str = "https://www.googleapis.com/batch/gmail/v1"
+    BASE_URL: str = f"{gmail_config.GOOGLE_API_ROOT}/gmail/v1/users/me"
+    BATCH_URL: str = f"{gmail_config.GOOGLE_API_ROOT}/batch/gmail/v1"
 
     # Folder → Gmail API query/label mapping
     FOLDER_MAP: Dict[str, Dict[str, Any]] = {
@@ -30,12 +56,159 @@ class GmailService:
         "Sent": {"labelIds": ["SENT"]},
         "Spam": {"labelIds": ["SPAM"]},
         "Drafts": {"labelIds": ["DRAFT"]},
-        "AllMails": {"includeSpamTrash": True},
+        # A string: aiohttp can't encode booleans in a query string
+        "AllMails": {"includeSpamTrash": "true"},
+    }
+
+    # Folders that are exactly one label, counted exactly by labels.get. Gmail
+    # can't count a label combination such as INBOX + a category, or a query,
+    # so the other FOLDER_MAP folders are estimated with messages.list.
+    COUNTER_LABELS: Dict[str, str] = {
+        "Inbox": "INBOX",
+        "Starred": "STARRED",
+        "Sent": "SENT",
+        "Spam": "SPAM",
+        "Drafts": "DRAFT",
+    }
+
+    # Unread ids listed per estimated folder: below this the unread count is
+    # exact, above it it is Gmail's resultSizeEstimate
+    COUNTER_UNREAD_CAP: int = 500
+
+    # Per-endpoint deadlines (seconds) for a whole call, including reading the body
+    TIMEOUTS: Dict[str, float] = {
+        "messages.list": 10,
+        "users.getProfile": 10,
+        "history.list": 10,
+        "labels.get": 10,
+        "messages.batch": 30,
+        "messages.get": 10,
+        "messages.batchModify": 10,
+        "messages.send": 60,
+        "attachments.get": 30,
+    }
+
+    # Idempotent endpoints that may be hedged, and how long to wait before hedging
+    HEDGE_DELAYS: Dict[str, float] = {
+        "messages.list": 1.0,
+        "users.getProfile": 1.0,
+        "history.list": 1.0,
+        "labels.get": 1.0,
+        "messages.batch": 3.0,
+        "messages.get": 1.0,
+        "attachments.get": 2.0,
     }
 
     def __init__(self):
         """No user dependency at init - user_id is passed per request."""
-        pass
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._http2_client: Optional[httpx.AsyncClient] = None
+        # Identical concurrent inbox fetches (several tabs, double mounts) share one upstream call
+        self._fetches = SingleFlight("fetch_messages", result_ttl=cache_config.CACHE_FETCH_TTL)
+        # Gmail's 429s are per-user quota, so they throttle that user rather than trip a breaker
+        self._backoff = UserBackoff("gmail")
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared keep-alive session, creating it on first use."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300)
+            )
+        return self._session
+
+    def _get_http2_client(self) -> httpx.AsyncClient:
+        """
+        Client for the multiplexed fetch strategy: concurrent requests share one
+        HTTP/2 connection instead of a connection each. HTTP/2 needs the
+        optional `h2` package (httpx[http2]) and TLS; otherwise it is HTTP/1.1.
+        """
+        if self._http2_client is None:
+            self._http2_client = httpx.AsyncClient(
+                http2=importlib.util.find_spec("h2") is not None,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60),
+                timeout=None,  # _request enforces each endpoint's deadline
+            )
+        return self._http2_client
+
+    async def warm_up(self) -> None:
+        """
+        Open a keep-alive connection (DNS, TCP and TLS) to the API host so the
+        first user request doesn't pay for it. The unauthenticated response is ignored.
+        """
+        timeout = aiohttp.ClientTimeout(total=self.TIMEOUTS["messages.list"])
+        async with self._get_session().head(gmail_config.GOOGLE_API_ROOT, timeout=timeout) as resp:
+            await resp.read()
+        if gmail_config.GMAIL_FETCH_STRATEGY != "batch":
+            await self._get_http2_client().head(gmail_config.GOOGLE_API_ROOT, timeout=timeout.total)
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        if self._http2_client is not None:
+            await self._http2_client.aclose()
+        self._http2_client = None
+
+    async def _request(
+        self, endpoint: str, method: str, url: str, user_id: str, http2: bool = False, **kwargs
+    ) -> GmailResponse:
+        """
+        Perform a Gmail API call for `user_id` with the endpoint's deadline,
+        behind its circuit breaker, hedging idempotent endpoints when enabled.
+        Only 5xx, timeouts and transport errors count against the shared
+        breaker; a 429 puts just this user on a backoff and raises
+        RateLimitedError. `http2` sends it on the multiplexed client instead of
+        the aiohttp session.
+        """
+        timeout = aiohttp.ClientTimeout(total=self.TIMEOUTS[endpoint])
+        hedge_delay = (
+            self.HEDGE_DELAYS.get(endpoint) if gmail_config.GMAIL_HEDGING_ENABLED else None
+        )
+        breaker = get_breaker(f"gmail:{endpoint}")
+        self._backoff.check(user_id)
+
+        async def attempt() -> GmailResponse:
+            if http2:
+                resp = await asyncio.wait_for(
+                    self._get_http2_client().request(method, url, **kwargs), timeout.total
+                )
+                return GmailResponse(resp.status_code, resp.headers, resp.text)
+            session = self._get_session()
+            async with session.request(method, url, timeout=timeout, **kwargs) as resp:
+                return GmailResponse(resp.status, resp.headers, await resp.text())
+
+        outcome = "error"
+        start = time.perf_counter()
+        try:
+            with span(f"gmail.{endpoint}", endpoint=endpoint):
+                resp = await breaker.call(
+                    lambda: hedged(attempt, hedge_delay),
+                    is_failure=lambda r: r.status >= 500,
+                )
+            outcome = str(resp.status)
+            if resp.status == 429:
+                raise self._backoff.throttled(user_id, resp.headers.get("Retry-After"))
+            self._backoff.succeeded(user_id)
+            return resp
+        except CircuitOpenError:
+            outcome = "circuit_open"
+            raise
+        except asyncio.TimeoutError as e:
+            outcome = "timeout"
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail=f"Gmail API call '{endpoint}' timed out",
+            ) from e
+        except (aiohttp.ClientError, httpx.HTTPError) as e:
+            outcome = "client_error"
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f"Gmail API call '{endpoint}' failed: {e}",
+            ) from e
+        finally:
+            GMAIL_REQUEST_DURATION.labels(endpoint=endpoint, status=outcome).observe(
+                time.perf_counter() - start
+            )
 
     async def _get_headers(self, user_id: str) -> Dict[str, str]:
         """Retrieve a fresh access token for given user_id and return Gmail API headers."""
@@ -74,103 +247,442 @@ class GmailService:
         url = f"{self.BASE_URL}/messages"
         headers = await self._get_headers(user_id)
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers, params=params) as resp:
-                if resp.status != 200:
-                    raise Exception(
-                        f"Gmail API Error {resp.status}: {await resp.text()}"
-                    )
-                return await resp.json()
+        resp = await self._request("messages.list", "GET", url, user_id, headers=headers, params=params)
+        if resp.status != 200:
+            raise Exception(f"Gmail API Error {resp.status}: {resp.text}")
+        return resp.json()
+
+    async def get_profile(self, user_id: str) -> Dict[str, Any]:
+        """
+        Fetch the mailbox profile (emailAddress, messagesTotal, historyId).
+        """
+        url = f"{self.BASE_URL}/profile"
+        headers = await self._get_headers(user_id)
+
+        resp = await self._request("users.getProfile", "GET", url, user_id, headers=headers)
+        if resp.status != 200:
+            raise Exception(f"Gmail API Error {resp.status}: {resp.text}")
+        return resp.json()
+
+    async def list_history(
+        self,
+        user_id: str,
+        start_history_id: int,
+        page_token: Optional[str] = None,
+        max_results: int = 500,
+    ) -> Dict[str, Any]:
+        """
+        List mailbox changes after `start_history_id`. Raises HTTPException(404)
+        when the start id is too old for Gmail to replay.
+        """
+        params: List[Tuple[str, str]] = [
+            ("startHistoryId", str(start_history_id)),
+            ("maxResults", str(max_results)),
+        ]
+        params += [
+            ("historyTypes", history_type)
+            for history_type in ("messageAdded", "messageDeleted", "labelAdded", "labelRemoved")
+        ]
+        if page_token:
+            params.append(("pageToken", page_token))
+
+        url = f"{self.BASE_URL}/history"
+        headers = await self._get_headers(user_id)
+
+        resp = await self._request("history.list", "GET", url, user_id, headers=headers, params=params)
+        if resp.status == 404:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="History id expired")
+        if resp.status != 200:
+            raise Exception(f"Gmail API Error {resp.status}: {resp.text}")
+        return resp.json()
+
+    async def get_label(self, user_id: str, label_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Fetch a label with its message/thread counts. None if the mailbox has
+        no such label (e.g. inbox categories are disabled).
+        """
+        url = f"{self.BASE_URL}/labels/{label_id}"
+        headers = await self._get_headers(user_id)
+
+        resp = await self._request("labels.get", "GET", url, user_id, headers=headers)
+        if resp.status == 404:
+            return None
+        if resp.status != 200:
+            raise Exception(f"Gmail API Error {resp.status}: {resp.text}")
+        return resp.json()
+
+    @staticmethod
+    def _counters_cache_key(user_id: str) -> str:
+        # v3: every folder, with an `exact` flag
+        return f"counters:v3:{user_id}"
+
+    async def _label_counter(self, user_id: str, label_id: str) -> Dict[str, Any]:
+        label = await self.get_label(user_id, label_id) or {}
+        return {
+            "total": label.get("messagesTotal", 0),
+            "unread": label.get("messagesUnread", 0),
+            "exact": True,
+        }
+
+    async def _estimate_counter(self, user_id: str, folder: str) -> Dict[str, Any]:
+        """
+        Counts for a folder defined by a query or several labels: the total is
+        Gmail's resultSizeEstimate, and unread ids are listed up to
+        COUNTER_UNREAD_CAP, so the unread badge is exact unless it is larger.
+        """
+        params = dict(self.FOLDER_MAP[folder])
+        query = params.get("q")
+        url = f"{self.BASE_URL}/messages"
+        headers = await self._get_headers(user_id)
+
+        total_resp, unread_resp = await asyncio.gather(
+            self._request(
+                "messages.list", "GET", url, user_id, headers=headers,
+                params={**params, "maxResults": 1, "fields": "resultSizeEstimate"},
+            ),
+            self._request(
+                "messages.list", "GET", url, user_id, headers=headers,
+                params={
+                    **params,
+                    "q": f"({query}) is:unread" if query else "is:unread",
+                    "maxResults": self.COUNTER_UNREAD_CAP,
+                    "fields": "messages/id,nextPageToken,resultSizeEstimate",
+                },
+            ),
+        )
+        for resp in (total_resp, unread_resp):
+            if resp.status != 200:
+                raise Exception(f"Gmail API Error {resp.status}: {resp.text}")
+
+        unread_page = unread_resp.json()
+        if "nextPageToken" in unread_page:
+            unread = unread_page.get("resultSizeEstimate", 0)
+        else:
+            unread = len(unread_page.get("messages", []))
+        return {
+            "total": max(total_resp.json().get("resultSizeEstimate", 0), unread),
+            "unread": unread,
+            "exact": False,
+        }
+
+    async def fetch_folder_counters(self, user_id: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Total and unread message counts for the inbox and every FOLDER_MAP
+        folder, from one concurrent round of labels.get (single-label folders,
+        exact) and messages.list calls (the rest, estimated), cached until
+        labels change.
+        """
+        cache_key = self._counters_cache_key(user_id)
+        counters = await cache.get(cache_key)
+        record_cache("counters", hit=counters is not None)
+        if counters is not None:
+            return counters
+
+        folders = list(self.COUNTER_LABELS) + [
+            folder for folder in self.FOLDER_MAP if folder not in self.COUNTER_LABELS
+        ]
+        results = await asyncio.gather(*(
+            self._label_counter(user_id, self.COUNTER_LABELS[folder])
+            if folder in self.COUNTER_LABELS
+            else self._estimate_counter(user_id, folder)
+            for folder in folders
+        ))
+        counters = dict(zip(folders, results))
+        await cache.set(cache_key, counters, ttl=cache_config.CACHE_COUNTERS_TTL)
+        return counters
+
+    async def invalidate_counters(self, user_id: str) -> None:
+        await cache.delete(self._counters_cache_key(user_id))
+
+    def invalidate_fetches(self, user_id: str) -> None:
+        """Stop reusing this user's coalesced inbox pages after a write."""
+        self._fetches.forget(lambda key: key[0] == user_id)
+
+    async def invalidate_messages(self, user_id: str, message_ids: List[str]) -> None:
+        """Drop cached copies of messages whose labels or content changed."""
+        await cache.delete(*(
+            self._message_cache_key(user_id, msg_id, fmt)
+            for msg_id in message_ids
+            for fmt in ("full", "metadata")
+        ))
+
+    @staticmethod
+    def _message_cache_key(user_id: str, message_id: str, fmt: str = "full") -> str:
+        return f"msg:{user_id}:{message_id}:{fmt}"
 
     async def messages_batch_request(
-        self, user_id: str, message_ids: List[str]
+        self,
+        user_id: str,
+        message_ids: List[str],
+        fmt: str = "full",
+        use_cache: bool = True,
+        skip_failed: bool = False,
     ) -> List[Dict[str, Any]]:
         """
-        Fetch full Gmail messages using batch request.
+        Fetch Gmail messages in `fmt` ("full" or "metadata"), serving cached ones
+        and batch-fetching the rest. Bulk readers such as the backfill pass
+        `use_cache=False` so they don't evict interactive entries, and
+        `skip_failed=True` to leave out messages that can't be fetched (deleted
+        since they were listed) instead of failing; 429s and 5xx still raise.
         """
         if not message_ids:
             return []
+        if not use_cache:
+            return await self._fetch_by_ids(user_id, message_ids, fmt, skip_failed)
+
+        keys = {msg_id: self._message_cache_key(user_id, msg_id, fmt) for msg_id in message_ids}
+        cached = await cache.get_many(keys.values())
+        # Cached entries are in the compact stored form (see message_codec)
+        found = {msg_id: decode_message(cached[key]) for msg_id, key in keys.items() if key in cached}
+        for msg_id in message_ids:
+            record_cache("messages", hit=msg_id in found)
+
+        missing = [msg_id for msg_id in message_ids if msg_id not in found]
+        if missing:
+            fetched = await self._fetch_by_ids(user_id, missing, fmt, skip_failed)
+            fresh = {msg["id"]: msg for msg in fetched if "id" in msg}
+            await cache.set_many(
+                {keys[msg_id]: encode_message(msg) for msg_id, msg in fresh.items() if msg_id in keys},
+                ttl=cache_config.CACHE_MESSAGE_TTL,
+            )
+            found.update(fresh)
+
+        return [found[msg_id] for msg_id in message_ids if msg_id in found]
+
+    async def get_stored_message(self, user_id: str, message_id: str) -> Dict[str, Any]:
+        """
+        One full message in its compact stored form (see message_codec), for
+        readers that only need headers or a single part body.
+        """
+        key = self._message_cache_key(user_id, message_id)
+        stored = await cache.get(key)
+        record_cache("messages", hit=stored is not None)
+        if stored is None:
+            fetched = [msg for msg in await self._fetch_by_ids(user_id, [message_id]) if "id" in msg]
+            if not fetched:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Message not found")
+            stored = encode_message(fetched[0])
+            await cache.set(key, stored, ttl=cache_config.CACHE_MESSAGE_TTL)
+        return stored
+
+    @staticmethod
+    def _fetch_strategy(count: int) -> str:
+        strategy = gmail_config.GMAIL_FETCH_STRATEGY
+        if strategy == "auto":
+            return "multiplex" if count <= gmail_config.GMAIL_MULTIPLEX_MAX_MESSAGES else "batch"
+        return strategy
+
+    async def _fetch_by_ids(
+        self, user_id: str, message_ids: List[str], fmt: str = "full", skip_failed: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Fetch messages by id with the configured strategy (see GmailConfig)."""
+        if self._fetch_strategy(len(message_ids)) == "multiplex":
+            found = {
+                msg["id"]: msg async for msg in self._iter_multiplexed(user_id, message_ids, fmt, skip_failed)
+            }
+            return [found[msg_id] for msg_id in message_ids if msg_id in found]
+        return await self._fetch_batch(user_id, message_ids, fmt, skip_failed)
 
+    async def _iter_multiplexed(
+        self, user_id: str, message_ids: List[str], fmt: str = "full", skip_failed: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        One messages.get per id, at most GMAIL_MULTIPLEX_CONCURRENCY at a time,
+        yielding each message as soon as it arrives. Gmail answers them in
+        parallel, where the batch endpoint works through its parts in sequence.
+        """
+        headers = await self._get_headers(user_id)
+        semaphore = asyncio.Semaphore(gmail_config.GMAIL_MULTIPLEX_CONCURRENCY)
+
+        async def get(msg_id: str) -> Optional[Dict[str, Any]]:
+            async with semaphore:
+                resp = await self._request(
+                    "messages.get",
+                    "GET",
+                    f"{self.BASE_URL}/messages/{msg_id}",
+                    user_id,
+                    http2=True,
+                    headers=headers,
+                    params={"format": fmt},
+                )
+            if resp.status != 200:
+                # Same contract as a failed batch sub-response
+                error = BatchPartError(resp.status, f"Gmail API Error {resp.status}: {resp.text}")
+                if skip_failed and not error.retryable:
+                    return None
+                raise error
+            return resp.json()
+
+        tasks = [asyncio.ensure_future(get(msg_id)) for msg_id in message_ids]
+        for task in tasks:
+            # After the first failure the rest are cancelled; don't log theirs as unretrieved
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                message = await next_done
+                if message is not None:
+                    yield message
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _fetch_batch(
+        self, user_id: str, message_ids: List[str], fmt: str = "full", skip_failed: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Fetch full Gmail messages using batch request.
+        """
+        GMAIL_BATCH_SIZE.observe(len(message_ids))
         headers = await self._get_headers(user_id)
         boundary = f"batch_{uuid.uuid4().hex}"
 
-        # Construct multipart/mixed body
-        body_lines = []
-        for i, msg_id in enumerate(message_ids):
-            content_id = i + 1
-            body_lines.extend(
-                [
-                    f"--{boundary}",
-                    "Content-Type: application/http",
-                    f"Content-ID: {content_id}",
-                    "",
-                    f"GET /gmail/v1/users/me/messages/{msg_id}?format=full",
-                    "",
-                ]
-            )
-        body_lines.append(f"--{boundary}--")
-        body = "\r\n".join(body_lines)
+        body = build_batch_body(boundary, message_ids, fmt)
+
+        batch_headers = {
+            "Authorization": headers["Authorization"],
+            "Content-Type": f"multipart/mixed; boundary={boundary}",
+        }
+
+        resp = await self._request(
+            "messages.batch", "POST", self.BATCH_URL, user_id, headers=batch_headers, data=body
+        )
+        if resp.status != 200:
+            raise Exception(f"Gmail Batch API Error {resp.status}: {resp.text}")
+
+        # The response uses its own boundary, given in the Content-Type header
+        boundary = response_boundary(resp.headers.get('Content-Type', ''), default=boundary)
+
+        parse_start = time.perf_counter()
+        try:
+            messages = parse_batch_response(resp.text, boundary, skip_failed)
+        except BatchPartError as e:
+            if e.status == 429:
+                # Gmail rate limits parts of a batch per user as well
+                raise self._backoff.throttled(user_id) from e
+            raise
+        GMAIL_BATCH_PARSE_DURATION.observe(time.perf_counter() - parse_start)
+        return messages
+
+
+    async def stream_messages(
+        self, user_id: str, message_ids: List[str]
+    ) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Yield `(position, message)` for full messages as they become available:
+        cached ones first, then each batch sub-response as soon as it has been
+        received and parsed, rather than after the whole batch body.
+        """
+        if not message_ids:
+            return
+
+        keys = {msg_id: self._message_cache_key(user_id, msg_id) for msg_id in message_ids}
+        positions = {msg_id: i for i, msg_id in enumerate(message_ids)}
+        cached = await cache.get_many(keys.values())
+        missing = []
+        for msg_id in message_ids:
+            record_cache("messages", hit=keys[msg_id] in cached)
+            if keys[msg_id] in cached:
+                yield positions[msg_id], decode_message(cached[keys[msg_id]])
+            else:
+                missing.append(msg_id)
+        if not missing:
+            return
+
+        if self._fetch_strategy(len(missing)) == "multiplex":
+            fresh: Dict[str, Any] = {}
+            try:
+                async for message in self._iter_multiplexed(user_id, missing):
+                    fresh[message["id"]] = message
+                    yield positions[message["id"]], message
+            finally:
+                if fresh:
+                    await cache.set_many(
+                        {keys[msg_id]: encode_message(msg) for msg_id, msg in fresh.items()},
+                        ttl=cache_config.CACHE_MESSAGE_TTL,
+                    )
+            return
 
+        GMAIL_BATCH_SIZE.observe(len(missing))
+        headers = await self._get_headers(user_id)
+        boundary = f"batch_{uuid.uuid4().hex}"
         batch_headers = {
             "Authorization": headers["Authorization"],
             "Content-Type": f"multipart/mixed; boundary={boundary}",
         }
+        breaker = get_breaker("gmail:messages.batch")
+        self._backoff.check(user_id)
+        breaker.before_call()
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                self.BATCH_URL, headers=batch_headers, data=body
+        fresh: Dict[str, Any] = {}
+        outcome = "error"
+        start = time.perf_counter()
+        try:
+            async with self._get_session().post(
+                self.BATCH_URL,
+                data=build_batch_body(boundary, missing),
+                headers=batch_headers,
+                timeout=aiohttp.ClientTimeout(total=self.TIMEOUTS["messages.batch"]),
             ) as resp:
+                outcome = str(resp.status)
                 if resp.status != 200:
-                    raise Exception(
-                        f"Gmail Batch API Error {resp.status}: {await resp.text()}"
+                    text = await resp.text()
+                    breaker.record(resp.status < 500)
+                    if resp.status == 429:
+                        raise self._backoff.throttled(user_id, resp.headers.get("Retry-After"))
+                    raise HTTPException(
+                        status_code=status.HTTP_502_BAD_GATEWAY,
+                        detail=f"Gmail Batch API Error {resp.status}: {text}",
                     )
-                
-                # Get the content type and extract boundary from response headers
-                content_type = resp.headers.get('Content-Type', '')
-                boundary_match = re.search(r'boundary=([^;]+)', content_type)
-                response_boundary = boundary_match.group(1) if boundary_match else boundary
-                
-                raw_response = await resp.text()
-
-        # Parse multipart response
-        messages: List[Dict[str, Any]] = []
-        
-        parts = raw_response.split(f"--{response_boundary}")[1:-1]  # Skip first and last empty parts
-        
-        for part in parts:
-            part = part.strip()
-            if not part:
-                continue
-                
-            if "Content-Type: application/http" not in part:
-                continue
-                
-            http_response = part.split("\r\n\r\n", 1)[1] if "\r\n\r\n" in part else part
-            response_lines = http_response.split("\r\n")
-            
-            status_line = response_lines[0]
-            if not status_line.startswith("HTTP/1.1 200 OK"):
-                raise Exception(f"Batch subrequest failed: {status_line}")
-            
-            header_end = None
-            for i, line in enumerate(response_lines[1:], 1):
-                if line.strip() == "":
-                    header_end = i
-                    break
-                    
-            if header_end is None:
-                raise Exception("Invalid HTTP response format: no empty line after headers")
-            
-            json_body = "\r\n".join(response_lines[header_end+1:]).strip()
-            
-            try:
-                message_data = json.loads(json_body)
-                messages.append(message_data)
-            except json.JSONDecodeError as e:
-                raise Exception(f"Failed to parse JSON from batch response: {e}")
-
-        return messages
 
+                parser = BatchResponseParser(
+                    response_boundary(resp.headers.get("Content-Type", ""), default=boundary)
+                )
+                async for chunk in resp.content.iter_any():
+                    for message in parser.feed(chunk):
+                        if message.get("id") in positions:
+                            fresh[message["id"]] = message
+                            yield positions[message["id"]], message
+            breaker.record(True)
+            self._backoff.succeeded(user_id)
+        except (asyncio.CancelledError, GeneratorExit):
+            # The client went away mid-stream
+            outcome = "cancelled"
+            breaker.abandon()
+            raise
+        except asyncio.TimeoutError as e:
+            outcome = "timeout"
+            breaker.record(False)
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail="Gmail API call 'messages.batch' timed out",
+            ) from e
+        except aiohttp.ClientError as e:
+            outcome = "client_error"
+            breaker.record(False)
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f"Gmail API call 'messages.batch' failed: {e}",
+            ) from e
+        except HTTPException:
+            raise
+        except BatchPartError as e:
+            breaker.record(e.status < 500)
+            if e.status == 429:
+                raise self._backoff.throttled(user_id) from e
+            raise
+        except Exception:
+            # e.g. a malformed part
+            breaker.record(False)
+            raise
+        finally:
+            GMAIL_REQUEST_DURATION.labels(endpoint="messages.batch.stream", status=outcome).observe(
+                time.perf_counter() - start
+            )
+            if fresh:
+                await cache.set_many(
+                    {keys[msg_id]: encode_message(msg) for msg_id, msg in fresh.items()},
+                    ttl=cache_config.CACHE_MESSAGE_TTL,
+                )
 
     async def fetch_messages(
         self,
@@ -181,8 +693,22 @@ class GmailService:
         query: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
-        Fetch full Gmail messages using message IDs (batched).
+        Fetch full Gmail messages using message IDs (batched). Concurrent
+        identical calls share one upstream fetch; the result must not be mutated.
         """
+        key = (user_id, folder, max_results, page_token, query)
+        return await self._fetches.do(
+            key, lambda: self._fetch_messages(user_id, folder, max_results, page_token, query)
+        )
+
+    async def _fetch_messages(
+        self,
+        user_id: str,
+        folder: str,
+        max_results: int,
+        page_token: Optional[str],
+        query: Optional[str],
+    ) -> Dict[str, Any]:
         ids_response = await self.fetch_message_ids(
             user_id=user_id, folder=folder, max_results=max_results, page_token=page_token, query=query
         )
@@ -196,27 +722,190 @@ class GmailService:
             "result_size_estimate": ids_response.get("resultSizeEstimate", len(full_messages)),
             "total_count": len(full_messages),
         }
-    
-    async def mark_messages_as_read(self, user_id: str, message_ids: List[str]) -> None:
+
+    @staticmethod
+    def _encode_unified_token(cursors: Dict[str, Tuple[Optional[str], int]]) -> Optional[str]:
+        if not cursors:
+            return None
+        raw = json.dumps(cursors, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @staticmethod
+    def _decode_unified_token(
+        page_token: Optional[str], accounts: List[str]
+    ) -> Dict[str, Tuple[Optional[str], int]]:
+        """Per-account (Gmail page token, offset into that page); exhausted accounts are absent."""
+        if not page_token:
+            return {account: (None, 0) for account in accounts}
+        try:
+            raw = base64.urlsafe_b64decode(page_token + "=" * (-len(page_token) % 4))
+            decoded = json.loads(raw)
+            if not isinstance(decoded, dict):
+                raise ValueError("page token is not an object")
+            cursors = {
+                account: (token, int(offset))
+                for account, (token, offset) in decoded.items()
+            }
+        except (ValueError, TypeError, AttributeError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid page token")
+        valid_cursors = all(
+            (token is None or isinstance(token, str)) and offset >= 0 for token, offset in cursors.values()
+        )
+        if not valid_cursors or not set(cursors) <= set(accounts):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid page token")
+        return cursors
+
+    async def _unified_candidates(
+        self,
+        account: str,
+        cursor: Tuple[Optional[str], int],
+        folder: str,
+        max_results: int,
+        query: Optional[str],
+    ) -> Tuple[List[str], Dict[str, Dict[str, Any]], List[Tuple[Optional[str], int]], Optional[str], int]:
         """
-        Mark a list of Gmail messages as read by removing the 'UNREAD' label.
-        Runs in background after fetch-by-contact.
+        The next `max_results` message ids after `cursor` with their metadata,
+        listing a second Gmail page when the offset leaves too few on the first.
+        Also returns the (page token, size) of each listed page, the token after
+        the last page and Gmail's result size estimate.
+        """
+        page_token, offset = cursor
+        pages: List[Tuple[Optional[str], int]] = []
+        ids: List[str] = []
+        estimate = 0
+        while True:
+            response = await self.fetch_message_ids(
+                user_id=account, folder=folder, max_results=max_results, page_token=page_token, query=query
+            )
+            page_ids = [m["id"] for m in response.get("messages", [])]
+            if not pages:
+                estimate = response.get("resultSizeEstimate", len(page_ids))
+            pages.append((page_token, len(page_ids)))
+            ids.extend(page_ids)
+            page_token = response.get("nextPageToken")
+            if page_token is None or len(ids) - offset >= max_results:
+                break
+
+        candidates = ids[offset:offset + max_results]
+        messages = await self.messages_batch_request(account, candidates, fmt="metadata")
+        return candidates, {m["id"]: m for m in messages}, pages, page_token, estimate
+
+    @staticmethod
+    def _advance_cursor(
+        offset: int, consumed: int, pages: List[Tuple[Optional[str], int]], next_token: Optional[str]
+    ) -> Optional[Tuple[Optional[str], int]]:
+        position = offset + consumed
+        for page_token, size in pages:
+            if position < size:
+                return page_token, position
+            position -= size
+        return (next_token, 0) if next_token else None
+
+    async def fetch_unified_messages(
+        self,
+        accounts: List[str],
+        folder: str = "Inbox:Primary",
+        max_results: int = 20,
+        page_token: Optional[str] = None,
+        query: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        One page across several linked accounts, newest first. Each account's
+        candidates are listed concurrently and k-way merged by `internalDate`
+        (Gmail lists newest first, so each account's list is already sorted);
+        only the winners are then fetched in full. The page token is a
+        composite of per-account cursors. Each email gets an `account` field
+        with the google_id that owns it.
+        """
+        cursors = self._decode_unified_token(page_token, accounts)
+        active = [account for account in accounts if account in cursors]
+        results = await asyncio.gather(*(
+            self._unified_candidates(account, cursors[account], folder, max_results, query)
+            for account in active
+        ))
+
+        def entries(account: str, candidates: List[str], metadata: Dict[str, Dict[str, Any]]):
+            # Messages the batch did not return are skipped
+            for position, message_id in enumerate(candidates):
+                if message_id in metadata:
+                    yield -int(metadata[message_id].get("internalDate", 0)), position, account, message_id
+
+        merged = list(itertools.islice(
+            heapq.merge(*(entries(account, *result[:2]) for account, result in zip(active, results))),
+            max_results,
+        ))
+
+        taken: Dict[str, int] = {}
+        for _, position, account, _ in merged:
+            taken[account] = position + 1
+        next_cursors = {}
+        for account, (candidates, metadata, pages, next_token, _) in zip(active, results):
+            consumed = taken.get(account, 0)
+            if all(message_id not in metadata for message_id in candidates[consumed:]):
+                consumed = len(candidates)
+            cursor = self._advance_cursor(cursors[account][1], consumed, pages, next_token)
+            if cursor is not None:
+                next_cursors[account] = cursor
+
+        winners: Dict[str, List[str]] = {}
+        for _, _, account, message_id in merged:
+            winners.setdefault(account, []).append(message_id)
+        fetched = await asyncio.gather(*(
+            self.messages_batch_request(account, ids) for account, ids in winners.items()
+        ))
+        full = {
+            (account, message["id"]): message
+            for account, messages in zip(winners, fetched)
+            for message in messages
+        }
+        emails = [
+            {**full[(account, message_id)], "account": account}
+            for _, _, account, message_id in merged
+            if (account, message_id) in full
+        ]
+
+        return {
+            "emails": emails,
+            "next_page_token": self._encode_unified_token(next_cursors),
+            "result_size_estimate": sum(result[4] for result in results),
+            "total_count": len(emails),
+        }
+
+    async def modify_labels(
+        self,
+        user_id: str,
+        message_ids: List[str],
+        add: Optional[List[str]] = None,
+        remove: Optional[List[str]] = None,
+    ) -> None:
+        """
+        Add and/or remove labels on a list of Gmail messages.
         """
         if not message_ids:
             return
 
         url = f"{self.BASE_URL}/messages/batchModify"
         headers = await self._get_headers(user_id)
-        payload = {
-            "ids": message_ids,
-            "removeLabelIds": ["UNREAD"]
-        }
+        payload = {"ids": message_ids}
+        if add:
+            payload["addLabelIds"] = add
+        if remove:
+            payload["removeLabelIds"] = remove
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json=payload) as resp:
-                if resp.status not in (200, 204): 
-                    text = await resp.text()
-                    raise Exception(f"Gmail batchModify error {resp.status}: {text}")
+        resp = await self._request("messages.batchModify", "POST", url, user_id, headers=headers, json=payload)
+        if resp.status not in (200, 204):
+            raise Exception(f"Gmail batchModify error {resp.status}: {resp.text}")
+
+        # Cached copies carry the old labels and counts
+        await self.invalidate_messages(user_id, message_ids)
+        await self.invalidate_counters(user_id)
+        self.invalidate_fetches(user_id)
+
+    async def mark_messages_as_read(self, user_id: str, message_ids: List[str]) -> None:
+        """
+        Mark a list of Gmail messages as read by removing the 'UNREAD' label.
+        """
+        await self.modify_labels(user_id, message_ids, remove=["UNREAD"])
 
     
     async def fetch_emails_by_contact(
@@ -240,7 +929,11 @@ class GmailService:
         )
         message_ids = [m["id"] for m in contact_message_ids.get("messages", [])]
 
-        if message_ids:
+        if message_ids and sync_config.SYNC_ENABLED:
+            await sync_scheduler.enqueue(
+                user_id, "labels", {"message_ids": message_ids, "remove": ["UNREAD"]}
+            )
+        elif message_ids:
             background_tasks.add_task(
                 self.mark_messages_as_read,
                 user_id,
@@ -299,11 +992,12 @@ class GmailService:
         payload = {"raw": encoded_msg}
         url = f"{self.BASE_URL}/messages/send"
         headers = await self._get_headers(user_id)
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json=payload) as resp:
-                if resp.status != 200:
-                    raise Exception(f"Gmail Send API Error {resp.status}: {await resp.text()}")
-                return await resp.json()
+        resp = await self._request("messages.send", "POST", url, user_id, headers=headers, json=payload)
+        if resp.status != 200:
+            raise Exception(f"Gmail Send API Error {resp.status}: {resp.text}")
+        await self.invalidate_counters(user_id)
+        self.invalidate_fetches(user_id)
+        return resp.json()
 
     async def download_attachment(
         self,
@@ -321,17 +1015,18 @@ class GmailService:
             Dict containing filename, mime_type, size, and base64 encoded data
         """
         headers = await self._get_headers(user_id)
-        
-        async with aiohttp.ClientSession() as session:
-            attachment_url = f"{self.BASE_URL}/messages/{message_id}/attachments/{attachment_id}"
-            async with session.get(attachment_url, headers=headers) as resp:
-                if resp.status != 200:
-                    raise Exception(f"Gmail Attachment API Error {resp.status}: {await resp.text()}")
-                attachment_data = await resp.json()
+        attachment_url = f"{self.BASE_URL}/messages/{message_id}/attachments/{attachment_id}"
+        resp = await self._request("attachments.get", "GET", attachment_url, user_id, headers=headers)
+        if resp.status != 200:
+            raise Exception(f"Gmail Attachment API Error {resp.status}: {resp.text}")
+        attachment_data = resp.json()
         
         return {
             "filename": file_name,
             "mime_type": mime_type,
             "size": attachment_data["size"],
             "data": attachment_data["data"]  # Base64 encoded attachment data
-        }
\ No newline at end of file
+        }
+
+
+gmail_service = GmailService()
@@ -0,0 +1,126 @@
+import asyncio
+import ipaddress
+import logging
+import socket
+from typing import List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+import aiohttp
+from aiohttp.abc import AbstractResolver, ResolveResult
+from aiohttp.resolver import DefaultResolver
+from fastapi import HTTPException, status
+
+from api.v1.config import render_config
+
+logger = logging.getLogger(__name__)
+
+
+class BlockedAddressError(OSError):
+    """A host resolved to a non-public address."""
+
+
+class PublicResolver(AbstractResolver):
+    """
+    Resolves like aiohttp's default resolver but refuses hosts with any
+    non-public address. The connector connects to exactly the addresses
+    returned here, so a host can't pass a check with one DNS answer and then
+    be connected to through another (DNS rebinding).
+    """
+
+    def __init__(self):
+        self._resolver = DefaultResolver()
+
+    async def resolve(
+        self, host: str, port: int = 0, family: socket.AddressFamily = socket.AF_INET
+    ) -> List[ResolveResult]:
+        results = await self._resolver.resolve(host, port, family)
+        if any(not ipaddress.ip_address(result["host"]).is_global for result in results):
+            raise BlockedAddressError(f"{host} resolves to a non-public address")
+        return results
+
+    async def close(self) -> None:
+        await self._resolver.close()
+
+
+class ImageProxy:
+    """
+    Fetches remote images referenced by rendered emails, so the client never
+    contacts senders' servers directly (no IP or read-receipt leaks). Only
+    public http(s) hosts are fetched, every redirect hop is re-checked, and
+    bodies are capped at `max_bytes`.
+    """
+
+    TIMEOUT = aiohttp.ClientTimeout(total=10)
+    MAX_REDIRECTS = 3
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=50, ttl_dns_cache=300, resolver=PublicResolver()),
+                headers={"User-Agent": "Maileyo-ImageProxy/1.0"},
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    @staticmethod
+    def _check_url(url: str) -> None:
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported image URL")
+        # Host names are checked by PublicResolver as they are connected to;
+        # the connector doesn't resolve IP literals, so refuse internal ones
+        # here (SSRF)
+        try:
+            address = ipaddress.ip_address(parts.hostname)
+        except ValueError:
+            return
+        if not address.is_global:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Image host not allowed")
+
+    async def fetch(self, url: str) -> Tuple[bytes, str]:
+        """Return (body, content type) of a remote image."""
+        session = self._get_session()
+        for _ in range(self.MAX_REDIRECTS + 1):
+            self._check_url(url)
+            try:
+                async with session.get(url, timeout=self.TIMEOUT, allow_redirects=False) as resp:
+                    if resp.status in (301, 302, 303, 307, 308) and "Location" in resp.headers:
+                        url = urljoin(url, resp.headers["Location"])
+                        continue
+                    if resp.status != 200:
+                        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Image fetch failed: {resp.status}")
+
+                    content_type = resp.headers.get("Content-Type", "").split(";")[0].strip().lower()
+                    if not content_type.startswith("image/"):
+                        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Not an image")
+                    if (resp.content_length or 0) > self.max_bytes:
+                        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Image too large")
+
+                    body = bytearray()
+                    async for chunk in resp.content.iter_chunked(64 * 1024):
+                        body.extend(chunk)
+                        if len(body) > self.max_bytes:
+                            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Image too large")
+                    return bytes(body), content_type
+            except asyncio.TimeoutError:
+                raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Image fetch timed out")
+            except aiohttp.ClientConnectorError as e:
+                if isinstance(e.os_error, BlockedAddressError):
+                    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Image host not allowed")
+                if isinstance(e.os_error, socket.gaierror):
+                    raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Image host not found")
+                raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Image fetch failed: {e}")
+            except aiohttp.ClientError as e:
+                raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Image fetch failed: {e}")
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Too many redirects")
+
+
+image_proxy = ImageProxy(max_bytes=render_config.IMAGE_PROXY_MAX_BYTES)
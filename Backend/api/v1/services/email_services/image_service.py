@@ -0,0 +1,121 @@
+import base64
+import hashlib
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from api.v1.config import admission_config, render_config
+from api.v1.services.email_services.gmail_service import gmail_service
+from api.v1.services.email_services.images import make_variant
+from api.v1.services.email_services.message_codec import iter_parts, part_body
+from api.v1.utils.admission import DOWNLOAD_MEMORY_FACTOR, admit, heavy_lane
+from api.v1.utils.disk_cache import DiskCache
+from api.v1.utils.metrics import record_cache
+from api.v1.utils.process_pool import process_pool
+
+
+class MessageImageService:
+    """
+    Resized variants of inline (`cid:`) images and image attachments, so
+    previews don't download multi-megabyte originals as base64 JSON. Variants
+    are produced in the process pool and kept in a byte-budgeted disk cache.
+    """
+
+    def __init__(self, disk_cache: DiskCache):
+        self.disk_cache = disk_cache
+
+    @staticmethod
+    def _cache_key(user_id: str, message_id: str, ref: str, width: Optional[int], height: Optional[int], fmt: str) -> str:
+        raw = f"{user_id}\0{message_id}\0{ref}\0{width}\0{height}\0{fmt}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    @staticmethod
+    async def _download(user_id: str, message_id: str, attachment_id: str) -> bytes:
+        attachment = await gmail_service.download_attachment(
+            user_id=user_id, message_id=message_id, attachment_id=attachment_id
+        )
+        data = attachment["data"]
+        return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+    @staticmethod
+    async def _locate(user_id: str, message_id: str, ref: str) -> Tuple[Optional[str], Optional[bytes], int]:
+        """
+        Find the image in the stored message. Returns (attachment id to download,
+        or None; inline bytes, or None; size in bytes). An attachment id that
+        isn't in the stored copy (Gmail reissues them) is still downloaded, at
+        the default size estimate.
+        """
+        stored = await gmail_service.get_stored_message(user_id, message_id)
+        if not ref.startswith("cid:"):
+            for part in iter_parts(stored):
+                body = part.get("body", {})
+                if body.get("attachmentId") == ref:
+                    return ref, None, body.get("size", 0)
+            return ref, None, admission_config.ADMISSION_DEFAULT_REQUEST_BYTES
+
+        # Find the part whose Content-ID (or X-Attachment-Id) is the cid
+        target = ref[4:].strip().strip("<>")
+        for part in iter_parts(stored):
+            headers = {h.get("name", "").lower(): h.get("value", "") for h in part.get("headers", [])}
+            ids = {headers.get("content-id", "").strip().strip("<>"), headers.get("x-attachment-id", "").strip()}
+            if target not in ids:
+                continue
+            body = part.get("body", {})
+            if body.get("attachmentId"):
+                return body["attachmentId"], None, body.get("size", 0)
+            data = part_body(stored, part)
+            if data:
+                return None, data, len(data)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No inline image '{ref[4:]}'")
+
+    async def _render(
+        self, key: str, original: bytes, width: Optional[int], height: Optional[int], fmt: str
+    ) -> Tuple[bytes, str]:
+        # Deferred like in images.py; needed here to tell Pillow's errors apart
+        from PIL import Image, UnidentifiedImageError
+
+        try:
+            data, media_type = await process_pool.run(make_variant, original, width, height, fmt)
+        except Image.DecompressionBombError:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Image too large to preview")
+        except UnidentifiedImageError:
+            raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Attachment is not a supported image")
+
+        await self.disk_cache.set(key, data, media_type)
+        return data, media_type
+
+    async def get(
+        self,
+        user_id: str,
+        message_id: str,
+        ref: str,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        fmt: str = "webp",
+    ) -> Tuple[bytes, str]:
+        """
+        `ref` is `cid:<content-id>` for inline images or a Gmail attachment id.
+        Returns (image bytes, media type).
+        """
+        key = self._cache_key(user_id, message_id, ref, width, height, fmt)
+        cached = await self.disk_cache.get(key)
+        record_cache("images", hit=cached is not None)
+        if cached is not None:
+            return cached
+
+        attachment_id, original, size = await self._locate(user_id, message_id, ref)
+        if original is not None:
+            # Inline bodies are already in memory with the stored message
+            return await self._render(key, original, width, height, fmt)
+
+        # Only a download counts against the heavy requests' memory budget,
+        # charged at the original's size, until the variant is made
+        cost = max(size, 1) * DOWNLOAD_MEMORY_FACTOR
+        async with admit(heavy_lane, cost, "/emails/messages/{message_id}/images/{ref}"):
+            original = await self._download(user_id, message_id, attachment_id)
+            return await self._render(key, original, width, height, fmt)
+
+
+message_image_service = MessageImageService(
+    DiskCache(render_config.IMAGE_CACHE_DIR, render_config.IMAGE_CACHE_MAX_BYTES)
+)
@@ -0,0 +1,52 @@
+"""
+Image variants for attachment previews and inline images. Pure functions so
+they can run in the process pool. Pillow is imported on first use: only
+pool workers need it, and it is the slowest import on the app's startup path.
+"""
+import io
+from typing import Optional, Tuple
+
+MAX_DIMENSION = 2048
+# Images larger than this are refused as decompression bombs. Pillow only
+# warns above its MAX_IMAGE_PIXELS and raises above twice that, so
+# make_variant checks the size itself.
+MAX_PIXELS = 50_000_000
+
+FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "png": ("PNG", "image/png"),
+}
+
+
+def make_variant(
+    data: bytes, width: Optional[int], height: Optional[int], fmt: str = "webp"
+) -> Tuple[bytes, str]:
+    """
+    Resize `data` to fit within width x height (keeping the aspect ratio, never
+    upscaling) and encode it as `fmt`. Returns (bytes, media type).
+    """
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+    with Image.open(io.BytesIO(data)) as image:
+        if image.width * image.height > MAX_PIXELS:
+            raise Image.DecompressionBombError(
+                f"Image size ({image.width * image.height} pixels) exceeds limit of {MAX_PIXELS} pixels"
+            )
+        image.draft("RGB", (width or MAX_DIMENSION, height or MAX_DIMENSION))  # fast JPEG downscale
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((width or MAX_DIMENSION, height or MAX_DIMENSION), Image.Resampling.LANCZOS)
+
+        pil_format, media_type = FORMATS[fmt]
+        if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+            image = image.convert("RGBA")
+
+        out = io.BytesIO()
+        options = {"quality": 80, "method": 4} if pil_format == "WEBP" else {}
+        if pil_format == "JPEG":
+            options = {"quality": 82, "optimize": True, "progressive": True}
+        image.save(out, pil_format, **options)
+        return out.getvalue(), media_type
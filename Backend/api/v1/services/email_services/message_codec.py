@@ -0,0 +1,162 @@
+"""
+Compact storage format for Gmail `format=full` messages.
+
+Gmail returns every part body as base64url text inside the nested payload,
+which is ~33% larger than the bytes it encodes and compresses poorly. A
+stored message keeps the top-level fields, the part tree and its headers as
+plain (queryable) fields; the part bodies are decoded to bytes, concatenated
+and compressed into one blob that is only decompressed when a body is read.
+"""
+import base64
+import copy
+import re
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+    _zstd_compressor = zstandard.ZstdCompressor(level=3)
+    _zstd_decompressor = zstandard.ZstdDecompressor()
+except ImportError:  # zstd is optional; zlib is always available
+    zstandard = None
+
+FORMAT_VERSION = 1
+DEFAULT_CODEC = "zstd" if zstandard is not None else "zlib"
+
+# Top-level message fields stored as-is
+MESSAGE_FIELDS = ("id", "threadId", "labelIds", "snippet", "historyId", "internalDate", "sizeEstimate")
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return _zstd_compressor.compress(data)
+    return zlib.compress(data, 6)
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Stored message is zstd-compressed but zstandard is not installed")
+        return _zstd_decompressor.decompress(data)
+    return zlib.decompress(data)
+
+
+def _walk(part: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield part
+    for child in part.get("parts", []):
+        yield from _walk(child)
+
+
+def _b64url_decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def is_encoded(stored: Dict[str, Any]) -> bool:
+    return stored.get("v") == FORMAT_VERSION and "bodies" in stored
+
+
+def encode_message(message: Dict[str, Any], codec: str = DEFAULT_CODEC) -> Dict[str, Any]:
+    """Convert a Gmail message to its stored form. Messages without bodies are kept as-is."""
+    payload = message.get("payload")
+    if not payload:
+        return message
+
+    skeleton = copy.deepcopy(payload)
+    chunks: List[bytes] = []
+    offset = 0
+    for part in _walk(skeleton):
+        body = part.get("body", {})
+        data = body.pop("data", None)
+        if data is None:
+            continue
+        raw = _b64url_decode(data)
+        # Offset, length, and whether Gmail padded the base64, to re-encode faithfully
+        body["blob"] = [offset, len(raw), data.endswith("=")]
+        chunks.append(raw)
+        offset += len(raw)
+
+    stored = {field: message[field] for field in MESSAGE_FIELDS if field in message}
+    stored.update({
+        "v": FORMAT_VERSION,
+        "payload": skeleton,
+        "codec": codec,
+        "bodies": _compress(b"".join(chunks), codec),
+    })
+    return stored
+
+
+def _bodies(stored: Dict[str, Any]) -> bytes:
+    return _decompress(bytes(stored["bodies"]), stored["codec"])
+
+
+def headers(stored: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Top-level message headers, without touching the compressed bodies."""
+    return stored.get("payload", {}).get("headers", [])
+
+
+def iter_parts(stored: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Every part of the message tree, depth first."""
+    return _walk(stored.get("payload", {}))
+
+
+def part_body(stored: Dict[str, Any], part: Dict[str, Any]) -> Optional[bytes]:
+    """Raw bytes of a part from `iter_parts`, if its body is inline (not an attachment id)."""
+    body = part.get("body", {})
+    if body.get("data"):
+        return _b64url_decode(body["data"])
+    if body.get("blob"):
+        start, length, _ = body["blob"]
+        return _bodies(stored)[start:start + length]
+    return None
+
+
+def find_part(stored: Dict[str, Any], mime_type: str) -> Optional[Tuple[Dict[str, Any], bytes]]:
+    """The first part with `mime_type` (e.g. "text/html") and its raw body bytes, or None."""
+    if not is_encoded(stored):
+        for part in _walk(stored.get("payload", {})):
+            if part.get("mimeType") == mime_type and part.get("body", {}).get("data"):
+                return part, _b64url_decode(part["body"]["data"])
+        return None
+
+    for part in _walk(stored["payload"]):
+        blob = part.get("body", {}).get("blob")
+        if part.get("mimeType") == mime_type and blob:
+            start, length, _ = blob
+            return part, _bodies(stored)[start:start + length]
+    return None
+
+
+def find_part_body(stored: Dict[str, Any], mime_type: str) -> Optional[bytes]:
+    """Raw bytes of the first part with `mime_type`, or None."""
+    found = find_part(stored, mime_type)
+    return found[1] if found else None
+
+
+def part_charset(part: Dict[str, Any], default: str = "utf-8") -> str:
+    for header in part.get("headers", []):
+        if header.get("name", "").lower() == "content-type":
+            match = re.search(r'charset="?([\w.:-]+)"?', header.get("value", ""), re.IGNORECASE)
+            if match:
+                return match.group(1)
+    return default
+
+
+def decode_message(stored: Dict[str, Any]) -> Dict[str, Any]:
+    """Rebuild the Gmail message, re-encoding part bodies as base64url."""
+    if not is_encoded(stored):
+        return stored
+
+    bodies = _bodies(stored)
+    payload = copy.deepcopy(stored["payload"])
+    for part in _walk(payload):
+        body = part.get("body", {})
+        blob: Optional[Tuple[int, int, bool]] = body.pop("blob", None)
+        if blob is None:
+            continue
+        start, length, padded = blob
+        data = base64.urlsafe_b64encode(bodies[start:start + length]).decode()
+        body["data"] = data if padded else data.rstrip("=")
+
+    message = {field: stored[field] for field in MESSAGE_FIELDS if field in stored}
+    message["payload"] = payload
+    return message
@@ -0,0 +1,66 @@
+import logging
+import time
+from typing import Any, Dict
+
+from api.v1.config import render_config
+from api.v1.services.email_services.gmail_service import gmail_service
+from api.v1.services.email_services.message_codec import find_part, part_charset
+from api.v1.services.email_services.renderer import PREVIEW_CHARS, render_html
+from api.v1.utils.cache import cache
+from api.v1.utils.metrics import RENDER_DURATION, record_cache
+from api.v1.utils.process_pool import process_pool
+
+logger = logging.getLogger(__name__)
+
+
+class MessageRenderer:
+    """
+    Renders message bodies for display: sanitized HTML with proxied images and
+    a plain-text preview. Sanitizing large HTML is CPU-bound, so it runs in a
+    process pool off the event loop. Results are cached per
+    (message id, historyId), which changes whenever the message does.
+    """
+
+    async def _render_html(self, user_id: str, message_id: str, html: str) -> Dict[str, Any]:
+        return await process_pool.run(
+            render_html,
+            html,
+            render_config.PUBLIC_API_URL,
+            render_config.IMAGE_PROXY_SECRET,
+            message_id,
+            user_id,
+        )
+
+    @staticmethod
+    def _decode(part: Dict[str, Any], body: bytes) -> str:
+        try:
+            return body.decode(part_charset(part), errors="replace")
+        except LookupError:
+            return body.decode("utf-8", errors="replace")
+
+    async def render(self, user_id: str, message_id: str) -> Dict[str, Any]:
+        stored = await gmail_service.get_stored_message(user_id, message_id)
+        history_id = stored.get("historyId")
+        cache_key = f"render:v3:{user_id}:{message_id}:{history_id}"
+        rendered = await cache.get(cache_key)
+        record_cache("render", hit=rendered is not None)
+        if rendered is not None:
+            return rendered
+
+        start = time.perf_counter()
+        html_part = find_part(stored, "text/html")
+        if html_part is not None:
+            result = await self._render_html(user_id, message_id, self._decode(*html_part))
+        else:
+            text_part = find_part(stored, "text/plain")
+            text = self._decode(*text_part) if text_part else ""
+            result = {"html": None, "preview": " ".join(text.split())[:PREVIEW_CHARS], "remote_images": 0}
+        RENDER_DURATION.observe(time.perf_counter() - start)
+
+        rendered = {"message_id": message_id, "history_id": history_id, **result}
+        await cache.set(cache_key, rendered, ttl=render_config.RENDER_CACHE_TTL)
+        return rendered
+
+
+
+message_renderer = MessageRenderer()
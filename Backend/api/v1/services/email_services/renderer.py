@@ -0,0 +1,92 @@
+"""
+HTML body rendering: sanitize, route remote images through the image proxy
+and derive a plain-text preview. Pure functions, so they can run in a
+process pool (see render_service.py).
+"""
+import re
+from html import unescape
+from typing import Any, Dict, Optional
+from urllib.parse import quote, urlencode
+
+import nh3
+
+from api.v1.utils.url_signing import sign
+
+PREVIEW_CHARS = 300
+
+# Tags dropped together with their content
+CONTENT_TAGS = {"script", "style", "head", "title"}
+# Tags that end a line of text, so words on either side stay apart in previews
+BLOCK_END = re.compile(r"<(?:br|/p|/div|/tr|/td|/th|/li|/h[1-6]|/table|/blockquote)\b[^>]*>", re.IGNORECASE)
+
+ATTRIBUTES = {tag: set(attrs) for tag, attrs in nh3.ALLOWED_ATTRIBUTES.items()}
+# Table layout attributes that email HTML still relies on
+ATTRIBUTES.setdefault("*", set()).update({"style", "align", "valign", "bgcolor", "width", "height", "dir"})
+ATTRIBUTES.setdefault("font", set()).update({"color", "face", "size"})
+
+# Inline styles are kept, minus properties that can load remote resources
+STYLE_PROPERTIES = {
+    "color", "background-color", "font", "font-family", "font-size", "font-style", "font-weight",
+    "line-height", "letter-spacing", "text-align", "text-decoration", "text-transform",
+    "vertical-align", "white-space", "word-break", "display",
+    "width", "height", "max-width", "min-width", "max-height",
+    "margin", "margin-top", "margin-right", "margin-bottom", "margin-left",
+    "padding", "padding-top", "padding-right", "padding-bottom", "padding-left",
+    "border", "border-top", "border-right", "border-bottom", "border-left",
+    "border-color", "border-style", "border-width", "border-radius", "border-collapse",
+}
+
+
+def proxied_image_url(url: str, proxy_base: str, proxy_secret: str) -> str:
+    query = urlencode({"url": url, "sig": sign(url, proxy_secret)})
+    return f"{proxy_base}/emails/image-proxy?{query}"
+
+
+def inline_image_url(message_id: str, cid: str, proxy_base: str, account: Optional[str] = None) -> str:
+    url = f"{proxy_base}/emails/messages/{quote(message_id)}/images/{quote('cid:' + cid)}"
+    return f"{url}?{urlencode({'account': account})}" if account else url
+
+
+def text_preview(html: str, limit: int = PREVIEW_CHARS) -> str:
+    text = nh3.clean(BLOCK_END.sub(" ", html), tags=set(), clean_content_tags=CONTENT_TAGS)
+    return " ".join(unescape(text).split())[:limit]
+
+
+def render_html(
+    html: str,
+    proxy_base: str,
+    proxy_secret: str,
+    message_id: Optional[str] = None,
+    account: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Sanitize `html`, rewriting remote <img> sources to signed proxy URLs and,
+    given `message_id`, inline `cid:` images to the message image endpoint
+    (of the linked `account` that owns the message, when given).
+    """
+    remote_images = 0
+
+    def attribute_filter(element: str, attribute: str, value: str):
+        nonlocal remote_images
+        if element != "img" or attribute != "src":
+            return value
+        lowered = value.strip().lower()
+        if lowered.startswith(("http://", "https://")):
+            remote_images += 1
+            return proxied_image_url(value.strip(), proxy_base, proxy_secret)
+        if lowered.startswith("cid:"):
+            cid = value.strip()[4:]
+            return inline_image_url(message_id, cid, proxy_base, account) if message_id else value
+        return None
+
+    cleaned = nh3.clean(
+        html,
+        attributes=ATTRIBUTES,
+        clean_content_tags=CONTENT_TAGS,
+        attribute_filter=attribute_filter,
+        url_schemes={"http", "https", "mailto", "cid"},
+        link_rel="noopener noreferrer nofollow",
+        set_tag_attribute_values={"a": {"target": "_blank"}},
+        filter_style_properties=STYLE_PROPERTIES,
+    )
+    return {"html": cleaned, "preview": text_preview(html), "remote_images": remote_images}
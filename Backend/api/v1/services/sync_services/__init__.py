@@ -0,0 +1 @@
+# Sync services module
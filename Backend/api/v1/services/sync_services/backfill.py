@@ -0,0 +1,169 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+
+from api.v1.config import sync_config
+from api.v1.db.bulk_writer import bulk_writer
+from api.v1.db.session import DatabaseSession
+from api.v1.services.email_services.gmail_service import gmail_service
+from api.v1.services.sync_services.message_store import upsert_messages
+from api.v1.services.sync_services.scheduler import sync_scheduler
+from api.v1.utils.resilience import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+SYNC_STATE = "sync_state"
+
+# Gmail quota units charged per call
+PROFILE_UNITS = 1
+LIST_UNITS = 5
+GET_UNITS = 5
+
+_quotas: Dict[str, RateLimiter] = {}
+
+
+def quota_for(google_id: str) -> RateLimiter:
+    limiter = _quotas.get(google_id)
+    if limiter is None:
+        rate = sync_config.BACKFILL_QUOTA_PER_SECOND
+        limiter = _quotas[google_id] = RateLimiter(rate, burst=rate)
+    return limiter
+
+
+async def start_backfill(google_id: str, force: bool = False) -> Optional[ObjectId]:
+    """
+    Queue a backfill unless one is pending. Once a backfill has finished (and
+    without `force`), make sure incremental history sync is queued instead.
+    """
+    db = DatabaseSession.get_db()
+    state = await db[SYNC_STATE].find_one({"_id": google_id}, {"backfill.status": 1})
+    if state and state.get("backfill", {}).get("status") == "done" and not force:
+        return await start_history_sync(google_id)
+    return await sync_scheduler.enqueue(
+        google_id, "backfill", {}, dedupe_key=f"backfill:{google_id}"
+    )
+
+
+async def start_history_sync(google_id: str) -> Optional[ObjectId]:
+    """Queue the recurring incremental sync job unless it is already pending."""
+    return await sync_scheduler.enqueue(
+        google_id, "history", {}, dedupe_key=f"history:{google_id}"
+    )
+
+
+async def get_sync_state(google_id: str) -> Dict[str, Any]:
+    db = DatabaseSession.get_db()
+    state = await db[SYNC_STATE].find_one({"_id": google_id}, {"_id": 0})
+    return state or {}
+
+
+async def _begin(google_id: str) -> Dict[str, Any]:
+    await quota_for(google_id).acquire(PROFILE_UNITS)
+    profile = await gmail_service.get_profile(google_id)
+    now = datetime.now(timezone.utc)
+    history_id = int(profile["historyId"])
+
+    db = DatabaseSession.get_db()
+    await db[SYNC_STATE].update_one(
+        {"_id": google_id},
+        {
+            "$set": {
+                "backfill": {
+                    "status": "running",
+                    "started_at": now,
+                    "updated_at": now,
+                    "estimate": profile.get("messagesTotal"),
+                    "processed": 0,
+                    "skipped": 0,
+                    "page_token": None,
+                },
+            },
+            # Incremental sync resumes from here; never move an existing cursor forward
+            "$min": {"history_id": history_id},
+        },
+        upsert=True,
+    )
+    logger.info(f"Backfill started for user {google_id} (~{profile.get('messagesTotal')} messages)")
+    return {"page_token": None, "processed": 0, "skipped": 0}
+
+
+async def fetch_and_store(google_id: str, message_ids: List[str]) -> Dict[str, int]:
+    """
+    Fetch metadata in concurrent batch requests, writing each batch as it
+    arrives. Messages that can no longer be fetched (deleted since the page
+    was listed) are skipped; 429s and 5xx fail the page so the job retries it.
+    """
+    quota = quota_for(google_id)
+    semaphore = asyncio.Semaphore(sync_config.BACKFILL_CONCURRENCY)
+    size = sync_config.BACKFILL_BATCH_SIZE
+
+    async def fetch_batch(batch: List[str]) -> int:
+        async with semaphore:
+            await quota.acquire(GET_UNITS * len(batch))
+            fetched = await gmail_service.messages_batch_request(
+                google_id, batch, fmt="metadata", use_cache=False, skip_failed=True
+            )
+        return await upsert_messages(google_id, fetched)
+
+    batches = [message_ids[i:i + size] for i in range(0, len(message_ids), size)]
+    tasks = [asyncio.ensure_future(fetch_batch(batch)) for batch in batches]
+    try:
+        stored = sum(await asyncio.gather(*tasks))
+    except BaseException:
+        # Don't leave the other batches running and spending quota
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    # The cursor must not move past writes that are still buffered
+    await bulk_writer.flush()
+    return {"stored": stored, "skipped": len(message_ids) - stored}
+
+
+async def run_backfill_page(job: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Backfill one `messages.list` page and return the cursor for the next one.
+    The cursor lives in the job payload, so a crashed or restarted worker
+    resumes at the last finished page; re-running a page only re-upserts it.
+    """
+    google_id = job["google_id"]
+    cursor = job["payload"] or await _begin(google_id)
+
+    await quota_for(google_id).acquire(LIST_UNITS)
+    page = await gmail_service.fetch_message_ids(
+        user_id=google_id,
+        max_results=sync_config.BACKFILL_PAGE_SIZE,
+        page_token=cursor["page_token"],
+    )
+    message_ids = [m["id"] for m in page.get("messages", [])]
+    counts = await fetch_and_store(google_id, message_ids)
+
+    cursor = {
+        "page_token": page.get("nextPageToken"),
+        "processed": cursor["processed"] + counts["stored"],
+        "skipped": cursor["skipped"] + counts["skipped"],
+    }
+    now = datetime.now(timezone.utc)
+    progress = {
+        "backfill.processed": cursor["processed"],
+        "backfill.skipped": cursor["skipped"],
+        "backfill.page_token": cursor["page_token"],
+        "backfill.updated_at": now,
+    }
+    if not cursor["page_token"]:
+        progress.update({"backfill.status": "done", "backfill.finished_at": now})
+
+    db = DatabaseSession.get_db()
+    await db[SYNC_STATE].update_one({"_id": google_id}, {"$set": progress})
+    if counts["skipped"]:
+        logger.warning(f"Backfill for user {google_id}: skipped {counts['skipped']} messages that could not be fetched")
+
+    if cursor["page_token"]:
+        logger.info(f"Backfill for user {google_id}: {cursor['processed']} messages stored")
+        return cursor
+    logger.info(f"Backfill finished for user {google_id}: {cursor['processed']} messages stored")
+    await start_history_sync(google_id)
+    return None
@@ -0,0 +1,118 @@
+import logging
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from fastapi import HTTPException, status
+
+from api.v1.config import sync_config
+from api.v1.db.bulk_writer import bulk_writer
+from api.v1.db.session import DatabaseSession
+from api.v1.services.email_services.gmail_service import gmail_service
+from api.v1.services.sync_services.backfill import (
+    SYNC_STATE, fetch_and_store, quota_for, start_backfill
+)
+from api.v1.services.sync_services.message_store import delete_messages, update_labels
+from api.v1.services.sync_services.scheduler import Continuation
+
+logger = logging.getLogger(__name__)
+
+HISTORY_UNITS = 2
+
+
+class HistoryChanges:
+    """Net effect of a run of Gmail history records, per message."""
+
+    def __init__(self):
+        self.added: Set[str] = set()
+        self.deleted: Set[str] = set()
+        # message id -> (labels to add, labels to remove), kept disjoint so the
+        # two resulting updates commute inside an unordered bulk write
+        self.labels: Dict[str, Tuple[Set[str], Set[str]]] = {}
+
+    def _label_sets(self, message_id: str) -> Tuple[Set[str], Set[str]]:
+        return self.labels.setdefault(message_id, (set(), set()))
+
+    def apply(self, record: Dict[str, Any]) -> None:
+        for item in record.get("messagesAdded", []):
+            message_id = item["message"]["id"]
+            self.added.add(message_id)
+            self.deleted.discard(message_id)
+        for item in record.get("messagesDeleted", []):
+            message_id = item["message"]["id"]
+            self.deleted.add(message_id)
+            self.added.discard(message_id)
+        for item in record.get("labelsAdded", []):
+            add, remove = self._label_sets(item["message"]["id"])
+            add.update(item.get("labelIds", []))
+            remove.difference_update(item.get("labelIds", []))
+        for item in record.get("labelsRemoved", []):
+            add, remove = self._label_sets(item["message"]["id"])
+            remove.update(item.get("labelIds", []))
+            add.difference_update(item.get("labelIds", []))
+
+    def label_updates(self) -> Dict[str, Tuple[Set[str], Set[str]]]:
+        # Added messages are re-fetched with their current labels anyway
+        return {
+            message_id: sets for message_id, sets in self.labels.items()
+            if message_id not in self.added and message_id not in self.deleted
+        }
+
+    def changed(self) -> List[str]:
+        return list(self.added | self.deleted | set(self.labels))
+
+
+async def run_history_sync(job: Dict[str, Any]) -> Optional[Continuation]:
+    """
+    Replay Gmail history since the stored cursor into the local message store,
+    then reschedule itself. An expired cursor triggers a fresh backfill.
+    """
+    google_id = job["google_id"]
+    db = DatabaseSession.get_db()
+    state = await db[SYNC_STATE].find_one({"_id": google_id}, {"history_id": 1})
+    if not state or not state.get("history_id"):
+        return None
+    start_id = state["history_id"]
+
+    changes = HistoryChanges()
+    latest_id = start_id
+    page_token = None
+    try:
+        while True:
+            await quota_for(google_id).acquire(HISTORY_UNITS)
+            page = await gmail_service.list_history(google_id, start_id, page_token)
+            for record in page.get("history", []):
+                changes.apply(record)
+            latest_id = int(page.get("historyId", latest_id))
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                break
+    except HTTPException as e:
+        if e.status_code != status.HTTP_404_NOT_FOUND:
+            raise
+        logger.warning(f"History cursor {start_id} expired for user {google_id}, re-running backfill")
+        await db[SYNC_STATE].update_one({"_id": google_id}, {"$unset": {"history_id": ""}})
+        await start_backfill(google_id, force=True)
+        return None
+
+    if changes.added:
+        await fetch_and_store(google_id, list(changes.added))
+    if changes.deleted:
+        await delete_messages(google_id, list(changes.deleted))
+    for message_id, (add, remove) in changes.label_updates().items():
+        await update_labels(google_id, message_id, add=list(add), remove=list(remove))
+    await bulk_writer.flush()
+
+    if changes.changed():
+        await gmail_service.invalidate_messages(google_id, changes.changed())
+        await gmail_service.invalidate_counters(google_id)
+        gmail_service.invalidate_fetches(google_id)
+        logger.info(
+            f"History sync for user {google_id}: {len(changes.added)} added, "
+            f"{len(changes.deleted)} deleted, {len(changes.labels)} relabelled"
+        )
+
+    # Conditional, so a concurrent backfill reset is not overwritten
+    await db[SYNC_STATE].update_one(
+        {"_id": google_id, "history_id": start_id},
+        {"$set": {"history_id": latest_id}},
+    )
+    return Continuation({}, delay=sync_config.SYNC_HISTORY_INTERVAL)
@@ -0,0 +1,41 @@
+from typing import Any, Dict, Optional
+
+from api.v1.db.bulk_writer import bulk_writer
+from api.v1.services.email_services.gmail_service import gmail_service
+from api.v1.services.sync_services.backfill import run_backfill_page
+from api.v1.services.sync_services.history import run_history_sync
+from api.v1.services.sync_services.message_store import update_labels
+from api.v1.services.sync_services.scheduler import Continuation, sync_scheduler
+
+
+@sync_scheduler.handler("labels")
+async def apply_label_mutation(job: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Apply a label change queued from the request path (e.g. mark as read)."""
+    payload = job["payload"]
+    await gmail_service.modify_labels(
+        job["google_id"],
+        payload["message_ids"],
+        add=payload.get("add"),
+        remove=payload.get("remove"),
+    )
+    # Mirror the change locally now rather than at the next history sync;
+    # best effort, the next history sync repairs a lost write
+    for message_id in payload["message_ids"]:
+        await update_labels(
+            job["google_id"], message_id, add=payload.get("add") or [], remove=payload.get("remove") or []
+        )
+    return None
+
+
+@sync_scheduler.handler("backfill")
+async def backfill(job: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Backfill the local message store one page at a time."""
+    with bulk_writer.scope():
+        return await run_backfill_page(job)
+
+
+@sync_scheduler.handler("history")
+async def history(job: Dict[str, Any]) -> Optional[Continuation]:
+    """Apply mailbox changes since the last sync, then reschedule."""
+    with bulk_writer.scope():
+        return await run_history_sync(job)
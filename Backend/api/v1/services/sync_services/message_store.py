@@ -0,0 +1,82 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from pymongo import DeleteOne, UpdateOne
+
+from api.v1.db.bulk_writer import bulk_writer
+
+MESSAGES = "messages"
+
+# Headers kept on the local copy, as stored field names
+STORED_HEADERS = {
+    "from": "from",
+    "to": "to",
+    "cc": "cc",
+    "subject": "subject",
+    "date": "date",
+    "message-id": "message_id_header",
+}
+
+
+def normalize_message(google_id: str, message: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten a Gmail `metadata`/`full` message into the stored document shape."""
+    headers = {}
+    for header in message.get("payload", {}).get("headers", []):
+        field = STORED_HEADERS.get(header.get("name", "").lower())
+        if field and field not in headers:
+            headers[field] = header.get("value")
+
+    internal_date = message.get("internalDate")
+    return {
+        "google_id": google_id,
+        "message_id": message["id"],
+        "thread_id": message.get("threadId"),
+        "label_ids": message.get("labelIds", []),
+        "snippet": message.get("snippet", ""),
+        "history_id": int(message["historyId"]) if message.get("historyId") else None,
+        "internal_date": (
+            datetime.fromtimestamp(int(internal_date) / 1000, tz=timezone.utc)
+            if internal_date else None
+        ),
+        "size_estimate": message.get("sizeEstimate"),
+        **headers,
+    }
+
+
+def upsert_operations(google_id: str, messages: List[Dict[str, Any]]) -> List[UpdateOne]:
+    now = datetime.now(timezone.utc)
+    operations = []
+    for message in messages:
+        if "id" not in message:
+            continue
+        doc = normalize_message(google_id, message)
+        operations.append(UpdateOne(
+            {"google_id": google_id, "message_id": doc["message_id"]},
+            {"$set": {**doc, "synced_at": now}},
+            upsert=True,
+        ))
+    return operations
+
+
+async def upsert_messages(google_id: str, messages: List[Dict[str, Any]]) -> int:
+    """Queue upserts of Gmail messages into the local store. Durable after `bulk_writer.flush()`."""
+    operations = upsert_operations(google_id, messages)
+    await bulk_writer.add(MESSAGES, *operations)
+    return len(operations)
+
+
+async def update_labels(
+    google_id: str, message_id: str, add: List[str] = (), remove: List[str] = ()
+) -> None:
+    """Queue a label change on a stored message."""
+    key = {"google_id": google_id, "message_id": message_id}
+    if add:
+        await bulk_writer.add(MESSAGES, UpdateOne(key, {"$addToSet": {"label_ids": {"$each": list(add)}}}))
+    if remove:
+        await bulk_writer.add(MESSAGES, UpdateOne(key, {"$pull": {"label_ids": {"$in": list(remove)}}}))
+
+
+async def delete_messages(google_id: str, message_ids: List[str]) -> None:
+    await bulk_writer.add(
+        MESSAGES, *(DeleteOne({"google_id": google_id, "message_id": msg_id}) for msg_id in message_ids)
+    )
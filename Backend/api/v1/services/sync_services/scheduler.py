@@ -0,0 +1,329 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Set, Union
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from api.v1.config import sync_config
+from api.v1.db.session import DatabaseSession
+from api.v1.utils.metrics import SYNC_JOB_DURATION
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first. Label mutations mirror something the user just did, so
+# they go ahead of mailbox-wide work.
+PRIORITIES: Dict[str, int] = {"labels": 0, "history": 10, "backfill": 20}
+
+
+
+class Continuation(NamedTuple):
+    """Returned by a handler to requeue its job with `payload` after `delay` seconds."""
+    payload: Dict[str, Any]
+    delay: float = 0
+
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Union[None, Dict[str, Any], Continuation]]]
+
+
+class SyncScheduler:
+    """
+    Mongo-backed queue of per-user mailbox jobs, drained by a small pool of
+    async workers in every app process.
+
+    - Fairness: each job gets a virtual start time `seq`, the later of its
+      user's previous `seq + 1` and the scheduler clock (the `seq` of the last
+      claimed job). Workers claim by (priority, seq), so a user with a deep
+      queue takes turns with everyone else instead of blocking them.
+    - Leases: a claimed job belongs to one worker until `lease_expires_at`,
+      extended while the handler runs. If the process dies the lease lapses
+      and another worker picks the job up; `attempts` bounds retries.
+    - Continuations: a handler may return a new payload (or a Continuation
+      with a delay) to requeue the job with it, so long jobs run one chunk at
+      a time and recurring jobs reschedule themselves.
+
+    The worker pool is deliberately small: jobs share the event loop and
+    Gmail quota with interactive requests.
+    """
+
+    JOBS = "sync_jobs"
+    LANES = "sync_lanes"
+    CLOCK_ID = "__clock__"
+
+    def __init__(
+        self,
+        workers: int = 2,
+        lease_seconds: float = 60,
+        poll_interval: float = 1,
+        max_attempts: int = 5,
+    ):
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._handlers: Dict[str, JobHandler] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._busy_users: Set[str] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def handler(self, kind: str) -> Callable[[JobHandler], JobHandler]:
+        """Register the coroutine that processes jobs of `kind`."""
+        def register(func: JobHandler) -> JobHandler:
+            self._handlers[kind] = func
+            return func
+        return register
+
+    def _db(self):
+        return DatabaseSession.get_db()
+
+    async def _next_seq(self, google_id: str) -> int:
+        lanes = self._db()[self.LANES]
+        clock = await lanes.find_one({"_id": self.CLOCK_ID}, {"seq": 1})
+        clock_seq = clock["seq"] if clock else 0
+        lane = await lanes.find_one_and_update(
+            {"_id": google_id},
+            [{"$set": {"seq": {"$max": [{"$add": [{"$ifNull": ["$seq", 0]}, 1]}, clock_seq]}}}],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return lane["seq"]
+
+    async def enqueue(
+        self,
+        google_id: str,
+        kind: str,
+        payload: Optional[Dict[str, Any]] = None,
+        dedupe_key: Optional[str] = None,
+        delay: float = 0,
+    ) -> Optional[ObjectId]:
+        """
+        Queue a job. With `dedupe_key`, nothing is queued while another job
+        with the same key is still queued or running; returns None then.
+        """
+        now = datetime.now(timezone.utc)
+        job = {
+            "google_id": google_id,
+            "kind": kind,
+            "payload": payload or {},
+            "priority": PRIORITIES.get(kind, 50),
+            "seq": await self._next_seq(google_id),
+            "status": "queued",
+            "active": True,
+            "attempts": 0,
+            "run_after": now + timedelta(seconds=delay),
+            "created_at": now,
+            "updated_at": now,
+        }
+        if dedupe_key:
+            job["dedupe_key"] = dedupe_key
+        try:
+            result = await self._db()[self.JOBS].insert_one(job)
+        except DuplicateKeyError:
+            logger.info(f"Sync job '{dedupe_key}' already pending for user {google_id}")
+            return None
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return result.inserted_id
+
+    async def _fail_abandoned(self, now: datetime) -> None:
+        # A job whose process keeps crashing (or running out of memory) never
+        # reaches _fail; stop reclaiming it once its attempts are spent
+        result = await self._db()[self.JOBS].update_many(
+            {"status": "running", "lease_expires_at": {"$lt": now}, "attempts": {"$gte": self.max_attempts}},
+            {
+                "$set": {
+                    "status": "failed",
+                    "last_error": "Lease lapsed on the final attempt",
+                    "finished_at": now,
+                    "updated_at": now,
+                },
+                "$unset": {"active": "", "lease_owner": "", "lease_expires_at": ""},
+            },
+        )
+        if result.modified_count:
+            logger.error(f"Failed {result.modified_count} sync jobs whose lease lapsed on the final attempt")
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        await self._fail_abandoned(now)
+        query: Dict[str, Any] = {
+            "$or": [
+                {"status": "queued", "run_after": {"$lte": now}},
+                # Lease lapsed: the worker holding it crashed or hung
+                {
+                    "status": "running",
+                    "lease_expires_at": {"$lt": now},
+                    "attempts": {"$lt": self.max_attempts},
+                },
+            ]
+        }
+        if self._busy_users:
+            # One job per user at a time in this process
+            query["google_id"] = {"$nin": list(self._busy_users)}
+
+        job = await self._db()[self.JOBS].find_one_and_update(
+            query,
+            {
+                "$set": {
+                    "status": "running",
+                    "lease_owner": self.worker_id,
+                    "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("priority", 1), ("seq", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if job is not None:
+            await self._db()[self.LANES].update_one(
+                {"_id": self.CLOCK_ID}, {"$max": {"seq": job["seq"]}}, upsert=True
+            )
+        return job
+
+    async def _finish(self, job: Dict[str, Any], update: Dict[str, Any]) -> None:
+        # Only the current lease holder may move the job on
+        update.setdefault("$set", {})["updated_at"] = datetime.now(timezone.utc)
+        update.setdefault("$unset", {}).update({"lease_owner": "", "lease_expires_at": ""})
+        result = await self._db()[self.JOBS].update_one(
+            {"_id": job["_id"], "lease_owner": self.worker_id}, update
+        )
+        if result.matched_count == 0:
+            logger.warning(f"Lost lease on sync job {job['_id']} ({job['kind']}) before finishing")
+
+    async def _complete(self, job: Dict[str, Any]) -> None:
+        await self._finish(job, {
+            "$set": {"status": "done", "finished_at": datetime.now(timezone.utc)},
+            "$unset": {"active": ""},
+        })
+
+    async def _continue(self, job: Dict[str, Any], continuation: Continuation) -> None:
+        # A new seq puts the next chunk behind other users' pending jobs
+        await self._finish(job, {"$set": {
+            "status": "queued",
+            "payload": continuation.payload,
+            "seq": await self._next_seq(job["google_id"]),
+            "attempts": 0,
+            "run_after": datetime.now(timezone.utc) + timedelta(seconds=continuation.delay),
+        }})
+
+    async def _fail(self, job: Dict[str, Any], error: Exception) -> None:
+        now = datetime.now(timezone.utc)
+        if job["attempts"] >= self.max_attempts:
+            logger.error(f"Sync job {job['_id']} ({job['kind']}) failed permanently: {error}")
+            await self._finish(job, {
+                "$set": {"status": "failed", "last_error": str(error), "finished_at": now},
+                "$unset": {"active": ""},
+            })
+            return
+        backoff = min(5 * 2 ** job["attempts"], 600)
+        logger.warning(f"Sync job {job['_id']} ({job['kind']}) failed, retrying in {backoff}s: {error}")
+        await self._finish(job, {"$set": {
+            "status": "queued",
+            "last_error": str(error),
+            "run_after": now + timedelta(seconds=backoff),
+        }})
+
+    async def _release(self, job: Dict[str, Any]) -> None:
+        # Shutting down mid-job: hand it back without spending an attempt
+        await self._finish(job, {
+            "$set": {"status": "queued", "run_after": datetime.now(timezone.utc)},
+            "$inc": {"attempts": -1},
+        })
+
+    async def _keep_lease(self, job_id: ObjectId) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await self._db()[self.JOBS].update_one(
+                {"_id": job_id, "lease_owner": self.worker_id},
+                {"$set": {"lease_expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)}},
+            )
+
+    async def _settle(self, job: Dict[str, Any], bookkeeping: Awaitable[None]) -> None:
+        # If recording the outcome fails, the lease lapses and the job is
+        # claimed again, which counts as another attempt
+        try:
+            await bookkeeping
+        except Exception:
+            logger.exception(f"Failed to record the outcome of sync job {job['_id']} ({job['kind']})")
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        handler = self._handlers.get(job["kind"])
+        lease = asyncio.create_task(self._keep_lease(job["_id"]))
+        start = time.perf_counter()
+        outcome = "done"
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for sync job kind '{job['kind']}'")
+            result = await handler(job)
+        except asyncio.CancelledError:
+            outcome = "released"
+            try:
+                await asyncio.shield(self._release(job))
+            except Exception:
+                logger.exception(f"Failed to release sync job {job['_id']}; its lease will lapse")
+            raise
+        except Exception as e:
+            outcome = "error"
+            await self._settle(job, self._fail(job, e))
+        else:
+            if result is not None:
+                outcome = "continued"
+                if not isinstance(result, Continuation):
+                    result = Continuation(result)
+                await self._settle(job, self._continue(job, result))
+            else:
+                await self._settle(job, self._complete(job))
+        finally:
+            lease.cancel()
+            SYNC_JOB_DURATION.labels(kind=job["kind"], outcome=outcome).observe(time.perf_counter() - start)
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logger.error(f"Failed to claim sync job: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._busy_users.add(job["google_id"])
+            try:
+                await self._run(job)
+            except Exception:
+                # Keep the worker alive; the job is retried once its lease lapses
+                logger.exception(f"Sync worker error on job {job['_id']} ({job['kind']})")
+            finally:
+                self._busy_users.discard(job["google_id"])
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        logger.info(f"Sync scheduler started with {self.workers} workers ({self.worker_id})")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+sync_scheduler = SyncScheduler(
+    workers=sync_config.SYNC_WORKERS,
+    lease_seconds=sync_config.SYNC_LEASE_SECONDS,
+    poll_interval=sync_config.SYNC_POLL_INTERVAL,
+    max_attempts=sync_config.SYNC_MAX_ATTEMPTS,
+)
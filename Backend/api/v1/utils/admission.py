@@ -0,0 +1,282 @@
+import asyncio
+import logging
+import re
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Deque, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+
+from api.v1.config import admission_config
+from api.v1.utils.metrics import ADMISSION_DECISIONS, ADMISSION_IN_FLIGHT_BYTES, ADMISSION_QUEUE_WAIT
+
+logger = logging.getLogger(__name__)
+
+# Rough peak memory per payload byte while a request is handled. A send holds
+# the JSON body, the parsed strings, the decoded files and the encoded MIME
+# message; a download holds Gmail's base64 JSON and our own response.
+SEND_MEMORY_FACTOR = 4
+DOWNLOAD_MEMORY_FACTOR = 3
+
+
+class Overloaded(Exception):
+    """Raised when a lane can't admit a request, either at once or before the queue timeout."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class AdmissionLane:
+    """
+    A weighted FIFO semaphore. Each request takes `cost` units out of
+    `capacity` (estimated bytes for heavy routes, 1 for reads) and waits its
+    turn in order when they aren't available, so a large upload isn't starved
+    by a stream of small ones. A request larger than the whole capacity is
+    admitted alone rather than never.
+    """
+
+    def __init__(self, name: str, capacity: int, max_queue: int, timeout: float):
+        self.name = name
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.used = 0
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+
+    @asynccontextmanager
+    async def slot(self, cost: int) -> AsyncIterator[None]:
+        cost = min(cost, self.capacity)
+        await self._acquire(cost)
+        try:
+            yield
+        finally:
+            self._release(cost)
+
+    async def _acquire(self, cost: int) -> None:
+        if not self._waiters and self.used + cost <= self.capacity:
+            self.used += cost
+            ADMISSION_DECISIONS.labels(lane=self.name, result="admitted").inc()
+            return
+        if len(self._waiters) >= self.max_queue:
+            ADMISSION_DECISIONS.labels(lane=self.name, result="shed").inc()
+            raise Overloaded("queue full")
+
+        waiter = (cost, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        ADMISSION_DECISIONS.labels(lane=self.name, result="queued").inc()
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter[1], self.timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter[1].done() and not waiter[1].cancelled():
+                # Granted just as we gave up: hand the units back
+                self._release(cost)
+            else:
+                self._waiters.remove(waiter)
+                # The head may have been what held the others back
+                self._wake()
+            if isinstance(e, asyncio.TimeoutError):
+                ADMISSION_DECISIONS.labels(lane=self.name, result="timeout").inc()
+                raise Overloaded("queue timeout")
+            raise
+        finally:
+            ADMISSION_QUEUE_WAIT.labels(lane=self.name).observe(time.perf_counter() - start)
+
+    def _release(self, cost: int) -> None:
+        self.used -= cost
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.used + self._waiters[0][0] <= self.capacity:
+            cost, future = self._waiters.popleft()
+            if not future.done():
+                self.used += cost
+                future.set_result(None)
+
+
+@dataclass(frozen=True)
+class AdmissionRule:
+    method: str
+    pattern: re.Pattern
+    route: str
+    lane: AdmissionLane
+    # Estimated bytes for a request; None for count-based lanes
+    estimate: Optional[Callable[[dict], int]] = None
+
+
+def _header(scope: dict, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _positive_int(value: Optional[str]) -> Optional[int]:
+    try:
+        number = int(value) if value is not None else None
+    except ValueError:
+        return None
+    return number if number is not None and number > 0 else None
+
+
+def estimate_send(scope: dict) -> int:
+    # Attachments arrive base64-encoded inside the JSON body
+    return body_limit(scope) * SEND_MEMORY_FACTOR
+
+
+def body_limit(scope: dict) -> int:
+    """Bytes of body a heavy request is admitted for: its Content-Length, or the default when chunked."""
+    return _positive_int(_header(scope, b"content-length")) or admission_config.ADMISSION_DEFAULT_REQUEST_BYTES
+
+
+def estimate_download(scope: dict) -> int:
+    # Clients know each attachment's size from the message payload and may
+    # pass it as `size`. It comes from the client, so it can only raise the
+    # estimate above the default, never lower it.
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    size = max(_positive_int(query.get("size", [None])[0]) or 0, admission_config.ADMISSION_DEFAULT_REQUEST_BYTES)
+    return size * DOWNLOAD_MEMORY_FACTOR
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware admitting requests per lane before their body is read.
+    Heavy routes share a per-worker byte budget; cheap inbox reads and image
+    previews get their own concurrency lanes, so they never queue behind
+    uploads. Other routes pass straight through. A request that can't be
+    admitted is shed with a 503 and `Retry-After`; a heavy request whose body
+    outgrows what it was admitted for (a chunked upload has no
+    Content-Length to estimate from) is cut off with a 413.
+    """
+
+    def __init__(self, app, rules: List[AdmissionRule]):
+        self.app = app
+        self.rules = rules
+
+    def _match(self, scope: dict) -> Optional[AdmissionRule]:
+        for rule in self.rules:
+            if rule.method == scope["method"] and rule.pattern.fullmatch(scope["path"]):
+                return rule
+        return None
+
+    @staticmethod
+    def _limit_body(rule: AdmissionRule, receive, limit: int):
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    ADMISSION_DECISIONS.labels(lane=rule.lane.name, result="too_large").inc()
+                    # FastAPI passes HTTPExceptions raised while reading the body through as-is
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"Request body exceeds {limit} bytes",
+                    )
+            return message
+
+        return limited_receive
+
+    async def __call__(self, scope, receive, send):
+        rule = self._match(scope) if scope["type"] == "http" else None
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        cost = rule.estimate(scope) if rule.estimate else 1
+        try:
+            async with rule.lane.slot(cost):
+                if rule.estimate:
+                    ADMISSION_IN_FLIGHT_BYTES.labels(route=rule.route).inc(cost)
+                    receive = self._limit_body(rule, receive, body_limit(scope))
+                try:
+                    await self.app(scope, receive, send)
+                finally:
+                    if rule.estimate:
+                        ADMISSION_IN_FLIGHT_BYTES.labels(route=rule.route).dec(cost)
+        except Overloaded as e:
+            logger.warning(f"Shed {scope['method']} {rule.route} ({rule.lane.name}: {e.reason})")
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Server is busy, please retry"},
+                headers={"Retry-After": str(admission_config.ADMISSION_RETRY_AFTER)},
+            )
+            await response(scope, receive, send)
+
+
+@asynccontextmanager
+async def admit(lane: AdmissionLane, cost: int, route: str) -> AsyncIterator[None]:
+    """
+    Charge `cost` estimated bytes to `lane` from inside a handler, for work
+    whose size is only known once the request is running. Raises a 503 with
+    `Retry-After` when it can't be admitted.
+    """
+    if not admission_config.ADMISSION_ENABLED:
+        yield
+        return
+
+    cost = min(cost, lane.capacity)
+    try:
+        await lane._acquire(cost)
+    except Overloaded as e:
+        logger.warning(f"Shed {route} ({lane.name}: {e.reason})")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please retry",
+            headers={"Retry-After": str(admission_config.ADMISSION_RETRY_AFTER)},
+        )
+    ADMISSION_IN_FLIGHT_BYTES.labels(route=route).inc(cost)
+    try:
+        yield
+    finally:
+        ADMISSION_IN_FLIGHT_BYTES.labels(route=route).dec(cost)
+        lane._release(cost)
+
+
+# Per-worker lanes, shared by the middleware's rules and `admit`
+heavy_lane = AdmissionLane(
+    "heavy",
+    admission_config.ADMISSION_MEMORY_BUDGET,
+    admission_config.ADMISSION_MAX_QUEUE,
+    admission_config.ADMISSION_QUEUE_TIMEOUT,
+)
+read_lane = AdmissionLane(
+    "reads",
+    admission_config.ADMISSION_READ_CONCURRENCY,
+    admission_config.ADMISSION_MAX_QUEUE,
+    admission_config.ADMISSION_QUEUE_TIMEOUT,
+)
+image_lane = AdmissionLane(
+    "images",
+    admission_config.ADMISSION_IMAGE_CONCURRENCY,
+    admission_config.ADMISSION_MAX_QUEUE,
+    admission_config.ADMISSION_QUEUE_TIMEOUT,
+)
+
+
+def default_rules() -> List[AdmissionRule]:
+    heavy, reads = heavy_lane, read_lane
+    return [
+        AdmissionRule("POST", re.compile(r"/emails/send"), "/emails/send", heavy, estimate_send),
+        AdmissionRule(
+            "GET", re.compile(r"/emails/attachments/[^/]+/[^/]+"),
+            "/emails/attachments/{message_id}/{attachment_id}", heavy, estimate_download,
+        ),
+        AdmissionRule(
+            "GET", re.compile(r"/emails/messages/[^/]+/images/[^/]+"),
+            "/emails/messages/{message_id}/images/{ref}", image_lane,
+        ),
+        AdmissionRule("GET", re.compile(r"/emails/fetch"), "/emails/fetch", reads),
+        AdmissionRule("GET", re.compile(r"/emails/fetch/stream"), "/emails/fetch/stream", reads),
+        AdmissionRule("GET", re.compile(r"/emails/counters"), "/emails/counters", reads),
+        AdmissionRule("POST", re.compile(r"/emails/fetch-by-contact"), "/emails/fetch-by-contact", reads),
+        # Mostly folder fetches and counters (see composite_service)
+        AdmissionRule("POST", re.compile(r"/composite"), "/composite", reads),
+    ]
@@ -0,0 +1,191 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from api.v1.config import cache_config
+from api.v1.db.session import DatabaseSession
+
+
+class CacheBackend(ABC):
+    """Async key/value cache with per-entry TTLs (seconds). Values must be BSON-serializable."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Return the entries that are present; missing keys are omitted."""
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        ...
+
+    @abstractmethod
+    async def set_many(self, items: Dict[str, Any], ttl: float) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, *keys: str) -> None:
+        ...
+
+
+class LRUCache(CacheBackend):
+    """In-process LRU cache. Fast, but private to each worker process."""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get_nowait(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set_nowait(self, key: str, value: Any, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[Any]:
+        return self.get_nowait(key)
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        found = {}
+        for key in keys:
+            value = self.get_nowait(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        self.set_nowait(key, value, ttl)
+
+    async def set_many(self, items: Dict[str, Any], ttl: float) -> None:
+        for key, value in items.items():
+            self.set_nowait(key, value, ttl)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+
+class MongoTTLCache(CacheBackend):
+    """
+    Cache shared by all worker processes, stored in the `cache` collection.
+    Expired documents are removed by the TTL index on `expires_at` (declared in
+    db/indexes.py); reads also filter on it since the TTL monitor runs only
+    about once a minute.
+    """
+
+    COLLECTION = "cache"
+
+    def _collection(self):
+        return DatabaseSession.get_db()[self.COLLECTION]
+
+    @staticmethod
+    def _expiry(ttl: float) -> datetime:
+        return datetime.now(timezone.utc) + timedelta(seconds=ttl)
+
+    async def get(self, key: str) -> Optional[Any]:
+        doc = await self._collection().find_one(
+            {"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}}, {"value": 1}
+        )
+        return doc["value"] if doc else None
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        cursor = self._collection().find(
+            {"_id": {"$in": keys}, "expires_at": {"$gt": datetime.now(timezone.utc)}}, {"value": 1}
+        )
+        return {doc["_id"]: doc["value"] async for doc in cursor}
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        await self._collection().update_one(
+            {"_id": key}, {"$set": {"value": value, "expires_at": self._expiry(ttl)}}, upsert=True
+        )
+
+    async def set_many(self, items: Dict[str, Any], ttl: float) -> None:
+        if not items:
+            return
+        expires_at = self._expiry(ttl)
+        await self._collection().bulk_write(
+            [
+                UpdateOne({"_id": key}, {"$set": {"value": value, "expires_at": expires_at}}, upsert=True)
+                for key, value in items.items()
+            ],
+            ordered=False,
+        )
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self._collection().delete_many({"_id": {"$in": list(keys)}})
+
+
+class TieredCache(CacheBackend):
+    """
+    A short-lived in-process LRU in front of a shared backend: repeated reads
+    within a worker skip the round trip, while workers still share entries.
+    Deletes only clear the local tier of the calling worker, so `local_ttl`
+    bounds how long another worker can serve an invalidated entry.
+    """
+
+    def __init__(self, shared: CacheBackend, local: LRUCache, local_ttl: float):
+        self.shared = shared
+        self.local = local
+        self.local_ttl = local_ttl
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = self.local.get_nowait(key)
+        if value is None:
+            value = await self.shared.get(key)
+            if value is not None:
+                self.local.set_nowait(key, value, self.local_ttl)
+        return value
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(keys)
+        found = await self.local.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            shared = await self.shared.get_many(missing)
+            for key, value in shared.items():
+                self.local.set_nowait(key, value, self.local_ttl)
+            found.update(shared)
+        return found
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        self.local.set_nowait(key, value, min(ttl, self.local_ttl))
+        await self.shared.set(key, value, ttl)
+
+    async def set_many(self, items: Dict[str, Any], ttl: float) -> None:
+        for key, value in items.items():
+            self.local.set_nowait(key, value, min(ttl, self.local_ttl))
+        await self.shared.set_many(items, ttl)
+
+    async def delete(self, *keys: str) -> None:
+        await self.local.delete(*keys)
+        await self.shared.delete(*keys)
+
+
+def build_cache() -> CacheBackend:
+    local = LRUCache(max_entries=cache_config.CACHE_MAX_ENTRIES)
+    if cache_config.CACHE_BACKEND == "mongo":
+        return TieredCache(MongoTTLCache(), local, local_ttl=cache_config.CACHE_LOCAL_TTL)
+    return local
+
+
+cache = build_cache()
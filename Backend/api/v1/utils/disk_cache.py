@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TMP_PREFIX = ".tmp-"
+# Temp files older than this were left behind by a crashed writer
+STALE_TMP_SECONDS = 3600
+
+
+class DiskCache:
+    """
+    Byte-budgeted file cache for derived binary artifacts (image variants).
+
+    Entries are files named by key; reads refresh the mtime, and when the
+    directory grows past `max_bytes` the least recently used files are removed
+    until it is back under 90% of the budget. The directory is rescanned for
+    eviction, so workers sharing it enforce one common budget. File I/O runs
+    in threads.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._approx_bytes: Optional[int] = None
+        self._evicting = asyncio.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _read(self, key: str) -> Optional[Tuple[bytes, str]]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                media_type = f.readline().decode().strip()
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data, media_type
+
+    def _write(self, key: str, data: bytes, media_type: str) -> int:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=TMP_PREFIX)
+        with os.fdopen(fd, "wb") as f:
+            f.write(media_type.encode() + b"\n")
+            f.write(data)
+        os.replace(tmp_path, path)
+        return len(data) + len(media_type) + 1
+
+    def _scan(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        stale_before = time.time() - STALE_TMP_SECONDS
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                    if name.startswith(TMP_PREFIX):
+                        # Another worker may still be writing it; only clear leftovers
+                        if stat.st_mtime < stale_before:
+                            os.remove(path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict(self) -> int:
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        if removed:
+            logger.info(f"Disk cache {self.directory}: evicted {removed} files, {total} bytes remain")
+        return total
+
+    async def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        return await asyncio.to_thread(self._read, key)
+
+    async def set(self, key: str, data: bytes, media_type: str) -> None:
+        written = await asyncio.to_thread(self._write, key, data, media_type)
+        if self._approx_bytes is None:
+            self._approx_bytes = sum(size for _, size, _ in await asyncio.to_thread(self._scan))
+        else:
+            self._approx_bytes += written
+
+        if self._approx_bytes > self.max_bytes and not self._evicting.locked():
+            async with self._evicting:
+                self._approx_bytes = await asyncio.to_thread(self._evict)
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from cryptography.fernet import InvalidToken
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from api.v1.config import auth_config
+
+logger = logging.getLogger(__name__)
+
+ROTATION_LOCK_ID = "fernet_rotation"
+ROTATION_LEASE_SECONDS = 120
+
+
+def _rotate(value: str) -> str:
+    return auth_config.FERNET_KEY.rotate(value.encode()).decode()
+
+
+async def rotate_encrypted_tokens(db: AsyncIOMotorDatabase, batch_size: int = 200) -> int:
+    """
+    Re-encrypt every stored OAuth credential with the primary (first) Fernet key.
+
+    Each update is conditional on the encrypted tokens being unchanged, so a
+    login or token refresh that happens while rotation runs is not overwritten.
+    Returns the number of credentials rewritten.
+    """
+    rotated_count = 0
+    operations: List[UpdateOne] = []
+
+    cursor = db["credentials"].find({}, {"_id": 1, "access_token": 1, "refresh_token": 1})
+    async for credential in cursor:
+        try:
+            access_token = _rotate(credential["access_token"])
+            refresh_token = _rotate(credential["refresh_token"])
+        except InvalidToken:
+            logger.error(f"Skipping credential {credential['_id']}: not decryptable with any configured key")
+            continue
+
+        operations.append(
+            UpdateOne(
+                {
+                    "_id": credential["_id"],
+                    "access_token": credential["access_token"],
+                    "refresh_token": credential["refresh_token"],
+                },
+                {"$set": {"access_token": access_token, "refresh_token": refresh_token}},
+            )
+        )
+        if len(operations) >= batch_size:
+            result = await db["credentials"].bulk_write(operations, ordered=False)
+            rotated_count += result.modified_count
+            operations = []
+
+    if operations:
+        result = await db["credentials"].bulk_write(operations, ordered=False)
+        rotated_count += result.modified_count
+
+    logger.info(f"Fernet key rotation re-encrypted {rotated_count} credentials")
+    return rotated_count
+
+
+async def _claim_rotation(db: AsyncIOMotorDatabase, owner: str) -> bool:
+    """
+    Take the rotation lease for the current primary key. Fails when the
+    rotation to this key already completed, or another process holds a live
+    lease on it.
+    """
+    now = datetime.now(timezone.utc)
+    try:
+        await db["locks"].update_one(
+            {
+                "_id": ROTATION_LOCK_ID,
+                "$or": [
+                    {"primary_key_id": {"$ne": auth_config.FERNET_PRIMARY_KEY_ID}},
+                    {"completed_at": None, "expires_at": {"$lt": now}},
+                ],
+            },
+            {"$set": {
+                "primary_key_id": auth_config.FERNET_PRIMARY_KEY_ID,
+                "owner": owner,
+                "expires_at": now + timedelta(seconds=ROTATION_LEASE_SECONDS),
+                "completed_at": None,
+            }},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        # The lock document exists but didn't match: done or held elsewhere
+        return False
+
+
+async def _keep_rotation_lease(db: AsyncIOMotorDatabase, owner: str) -> None:
+    while True:
+        await asyncio.sleep(ROTATION_LEASE_SECONDS / 3)
+        await db["locks"].update_one(
+            {"_id": ROTATION_LOCK_ID, "owner": owner},
+            {"$set": {"expires_at": datetime.now(timezone.utc) + timedelta(seconds=ROTATION_LEASE_SECONDS)}},
+        )
+
+
+async def rotate_once(db: AsyncIOMotorDatabase) -> None:
+    """
+    Run `rotate_encrypted_tokens` in at most one process per primary key, for
+    FERNET_ROTATE_ON_STARTUP with several workers. A Mongo lease guards the
+    run; if its holder dies, the next process to start picks it up.
+    """
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    if not await _claim_rotation(db, owner):
+        logger.info("Fernet key rotation already done or running elsewhere; skipping")
+        return
+
+    lease = asyncio.create_task(_keep_rotation_lease(db, owner))
+    try:
+        await rotate_encrypted_tokens(db)
+        await db["locks"].update_one(
+            {"_id": ROTATION_LOCK_ID, "owner": owner},
+            {"$set": {"completed_at": datetime.now(timezone.utc)}},
+        )
+    except asyncio.CancelledError:
+        # Shutting down: let another process take over straight away
+        await asyncio.shield(db["locks"].update_one(
+            {"_id": ROTATION_LOCK_ID, "owner": owner}, {"$set": {"expires_at": datetime.now(timezone.utc)}}
+        ))
+        raise
+    except Exception as e:
+        logger.error(f"Fernet key rotation failed: {str(e)}")
+    finally:
+        lease.cancel()
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import logging
+import re
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional
+
+from api.v1.config import diagnostics_config
+
+logger = logging.getLogger(__name__)
+
+SLOW_CALLBACK_PATTERN = re.compile(r"Executing (?P<handle>.+) took (?P<seconds>[\d.]+) seconds")
+
+
+class _SlowCallbackHandler(logging.Handler):
+    """Collects asyncio debug-mode 'Executing <Handle> took N seconds' warnings."""
+
+    def __init__(self, detector: "LoopStallDetector"):
+        super().__init__(level=logging.WARNING)
+        self.detector = detector
+
+    def emit(self, record: logging.LogRecord) -> None:
+        match = SLOW_CALLBACK_PATTERN.search(record.getMessage())
+        if match:
+            self.detector.add_report(
+                kind="slow_callback",
+                duration=float(match.group("seconds")),
+                callback=match.group("handle"),
+            )
+
+
+class LoopStallDetector:
+    """
+    Opt-in diagnostics for code that blocks the event loop.
+
+    - Enables asyncio debug mode with `slow_callback_duration = threshold`, and
+      records the slow-callback warnings asyncio emits.
+    - Runs a heartbeat coroutine on the loop and a watchdog thread beside it.
+      When the heartbeat is late by more than `threshold`, the watchdog samples
+      the loop thread's stack while it is still blocked, which points at the
+      offending sync call (e.g. `time.sleep`, a sync HTTP client, CPU-heavy work).
+
+    Reports are kept in a bounded buffer and logged as JSON lines.
+    """
+
+    def __init__(self, threshold: float = 0.1, max_reports: int = 200):
+        self.threshold = threshold
+        self.interval = threshold / 2
+        self._reports: Deque[Dict[str, Any]] = deque(maxlen=max_reports)
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._log_handler = _SlowCallbackHandler(self)
+
+    def add_report(self, kind: str, duration: float, **details: Any) -> None:
+        report = {
+            "kind": kind,
+            "duration": round(duration, 4),
+            "at": datetime.now(timezone.utc).isoformat(),
+            **details,
+        }
+        self._reports.append(report)
+        logger.warning(json.dumps({"event": "loop_stall", **report}))
+
+    def reports(self) -> List[Dict[str, Any]]:
+        return list(self._reports)
+
+    async def _beat(self) -> None:
+        while True:
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def _watch(self) -> None:
+        reported_beat = None
+        while not self._stopped.wait(self.interval):
+            beat = self._last_beat
+            lag = time.monotonic() - beat - self.interval
+            if lag <= self.threshold or beat == reported_beat:
+                continue
+            # One sample per stall: the loop is still blocked right now
+            reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = traceback.format_stack(frame) if frame is not None else []
+            self.add_report(kind="stall", duration=lag, stack=[line.strip() for line in stack[-15:]])
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        loop.set_debug(True)
+        loop.slow_callback_duration = self.threshold
+        logging.getLogger("asyncio").addHandler(self._log_handler)
+
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._heartbeat = asyncio.create_task(self._beat())
+        self._stopped.clear()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-stall-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"Event loop stall detection enabled (threshold {self.threshold}s)")
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+        logging.getLogger("asyncio").removeHandler(self._log_handler)
+
+
+loop_stall_detector = LoopStallDetector(threshold=diagnostics_config.LOOP_STALL_THRESHOLD)
@@ -0,0 +1,198 @@
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+from fastapi import Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from pymongo import monitoring
+
+try:
+    from opentelemetry import trace
+    _tracer = trace.get_tracer("maileyo.backend")
+except ImportError:  # tracing is optional
+    _tracer = None
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+GMAIL_REQUEST_DURATION = Histogram(
+    "gmail_api_request_duration_seconds",
+    "Gmail API call latency by endpoint and outcome",
+    ["endpoint", "status"],
+)
+GMAIL_BATCH_SIZE = Histogram(
+    "gmail_batch_size",
+    "Number of messages per Gmail batch request",
+    buckets=(1, 5, 10, 20, 50, 100),
+)
+GMAIL_BATCH_PARSE_DURATION = Histogram(
+    "gmail_batch_parse_seconds",
+    "Time spent parsing Gmail multipart batch responses",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5),
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups by cache and result (hit/miss)",
+    ["cache", "result"],
+)
+COMPOSITE_OPERATION_DURATION = Histogram(
+    "composite_operation_duration_seconds",
+    "Latency of each operation inside a /composite request, by op and status",
+    ["op", "status"],
+)
+SINGLE_FLIGHT_REQUESTS = Counter(
+    "single_flight_requests_total",
+    "Coalesced calls by name and result (leader/shared/cached)",
+    ["name", "result"],
+)
+MONGO_COMMAND_DURATION = Histogram(
+    "mongo_command_duration_seconds",
+    "MongoDB command latency by command and collection",
+    ["command", "collection", "status"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "Delay between when the loop monitor should have woken and when it did",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+BULK_WRITE_DURATION = Histogram(
+    "mongo_bulk_write_duration_seconds",
+    "BulkWriter flush latency by collection and outcome",
+    ["collection", "status"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+BULK_WRITE_BATCH_SIZE = Histogram(
+    "mongo_bulk_write_batch_size",
+    "Operations per BulkWriter flush",
+    ["collection"],
+    buckets=(1, 10, 50, 100, 250, 500, 1000),
+)
+BULK_WRITE_PENDING = Gauge(
+    "mongo_bulk_write_pending",
+    "Operations buffered in the BulkWriter, not yet flushed",
+    multiprocess_mode="livesum",
+)
+ADMISSION_DECISIONS = Counter(
+    "admission_decisions_total",
+    "Admission control outcomes by lane and result (admitted/queued/shed/timeout/too_large)",
+    ["lane", "result"],
+)
+ADMISSION_QUEUE_WAIT = Histogram(
+    "admission_queue_wait_seconds",
+    "Time requests waited for admission, by lane",
+    ["lane"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+ADMISSION_IN_FLIGHT_BYTES = Gauge(
+    "admission_in_flight_bytes",
+    "Estimated bytes held by admitted heavy requests, by route",
+    ["route"],
+    multiprocess_mode="livesum",
+)
+RENDER_DURATION = Histogram(
+    "email_render_duration_seconds",
+    "Time to sanitize and render an HTML body, including the process-pool hop",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+SYNC_JOB_DURATION = Histogram(
+    "sync_job_duration_seconds",
+    "Background sync job run time by kind and outcome",
+    ["kind", "outcome"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[None]:
+    """Open an OpenTelemetry span when opentelemetry is installed, otherwise do nothing."""
+    if _tracer is None:
+        yield
+        return
+    with _tracer.start_as_current_span(name, attributes=attributes):
+        yield
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency per route template (not raw path)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the (shared) scope
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status_code),
+            ).observe(time.perf_counter() - start)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Times every command sent by the Motor client."""
+
+    def __init__(self):
+        self._collections: Dict[int, str] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        collection = event.command.get(event.command_name)
+        self._collections[event.request_id] = collection if isinstance(collection, str) else ""
+
+    def _observe(self, event, status: str) -> None:
+        collection = self._collections.pop(event.request_id, "")
+        MONGO_COMMAND_DURATION.labels(
+            command=event.command_name, collection=collection, status=status
+        ).observe(event.duration_micros / 1_000_000)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._observe(event, "ok")
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._observe(event, "error")
+
+
+async def monitor_event_loop_lag(interval: float = 0.5) -> None:
+    """Sleep `interval` seconds in a loop and record how late each wakeup is."""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - expected))
+
+
+def metrics_response() -> Response:
+    # With several workers, each writes samples to PROMETHEUS_MULTIPROC_DIR and
+    # the scrape aggregates them; otherwise only this process would be reported
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
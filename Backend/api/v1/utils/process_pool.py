@@ -0,0 +1,81 @@
+import asyncio
+import importlib
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional, Sequence, TypeVar
+
+from fastapi import HTTPException, status
+
+from api.v1.config import render_config
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class WorkerCrashed(HTTPException):
+    """Raised for a job whose worker died, e.g. of OOM or a crash in a native decoder."""
+
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Processing failed",
+        )
+
+
+def _preload(modules: Sequence[str]) -> None:
+    for module in modules:
+        importlib.import_module(module)
+
+
+class ProcessPool:
+    """
+    Lazily started process pool for CPU-bound work (HTML sanitizing, image
+    resizing) that would otherwise block the event loop. `workers=0` runs
+    jobs in the loop's default thread pool instead.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Optional[Executor]:
+        if self.workers > 0 and self._executor is None:
+            # Forking the app directly would copy locks held by its other threads
+            # (Motor's executor, warm-up imports) into workers, which can deadlock
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else None)
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        return self._executor
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """Run a picklable top-level `func(*args)` in the pool."""
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        try:
+            return await loop.run_in_executor(executor, func, *args)
+        except BrokenProcessPool as e:
+            # A worker died and took the pool with it. Only the first of the
+            # jobs that were in it replaces the pool, and none is retried: the
+            # input that killed the worker would likely kill the next one too.
+            if self._executor is executor:
+                logger.warning("Process pool broken, restarting it")
+                self._executor = None
+                executor.shutdown(wait=False, cancel_futures=True)
+            raise WorkerCrashed() from e
+
+    async def warm_up(self, modules: Sequence[str]) -> None:
+        """Start every worker and import `modules` in it, so the first job doesn't pay for either."""
+        if self.workers > 0:
+            await asyncio.gather(*(self.run(_preload, list(modules)) for _ in range(self.workers)))
+
+    def close(self) -> None:
+        if self._executor is not None:
+            # Waiting lets idle workers exit cleanly; queued jobs are dropped
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+process_pool = ProcessPool(workers=render_config.RENDER_WORKERS)
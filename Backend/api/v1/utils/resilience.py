@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+from fastapi import HTTPException, status
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(HTTPException):
+    """Raised when a call is rejected because the endpoint's circuit is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Upstream '{name}' is temporarily unavailable",
+            headers={"Retry-After": str(max(1, int(retry_after)))},
+        )
+
+
+class RateLimitedError(HTTPException):
+    """Raised when the upstream rate limited this user, or they are still cooling down from it."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Too many requests to '{name}', please retry later",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+
+class CircuitBreaker:
+    """
+    Rolling-window circuit breaker.
+
+    The circuit opens when at least `min_calls` outcomes were recorded in the
+    last `window` seconds and the failure ratio crosses `failure_threshold`.
+    While open, calls fail fast. After `reset_timeout` a single probe is let
+    through (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: float = 0.5,
+        min_calls: int = 10,
+        window: float = 30.0,
+        reset_timeout: float = 15.0,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.min_calls = min_calls
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def _trim(self, now: float) -> None:
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._outcomes.popleft()
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError if the call must not be attempted."""
+        if self.state == self.CLOSED:
+            return
+
+        elapsed = time.monotonic() - self._opened_at
+        if self.state == self.OPEN and elapsed >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return
+
+        raise CircuitOpenError(self.name, self.reset_timeout - elapsed)
+
+    def abandon(self) -> None:
+        """The call was cancelled: it says nothing about upstream health."""
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = False
+
+    def record(self, success: bool) -> None:
+        now = time.monotonic()
+
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = False
+            if success:
+                logger.info(f"Circuit '{self.name}' closed after successful probe")
+                self.state = self.CLOSED
+                self._outcomes.clear()
+            else:
+                self._open(now)
+            return
+
+        self._outcomes.append((now, success))
+        self._trim(now)
+
+        if self.state == self.CLOSED and len(self._outcomes) >= self.min_calls:
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if failures / len(self._outcomes) >= self.failure_threshold:
+                self._open(now)
+
+    def _open(self, now: float) -> None:
+        logger.warning(f"Circuit '{self.name}' opened")
+        self.state = self.OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+
+    async def call(self, func: Callable[[], Awaitable[T]], is_failure: Optional[Callable[[T], bool]] = None) -> T:
+        """Run `func` under the breaker. Exceptions and `is_failure(result)` count as failures."""
+        self.before_call()
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            # Cancelled hedges and client disconnects
+            self.abandon()
+            raise
+        except Exception:
+            self.record(False)
+            raise
+        self.record(not (is_failure and is_failure(result)))
+        return result
+
+
+class RateLimiter:
+    """
+    Token bucket: `rate` units per second with bursts up to `burst`. Used to keep
+    background work under per-user API quotas (Gmail charges units per method).
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, units: float = 1) -> None:
+        """Wait until `units` are available and take them. `units` may exceed `burst`."""
+        async with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= units
+            if self._tokens < 0:
+                # Callers queue on the lock, so debt is paid off in order
+                await asyncio.sleep(-self._tokens / self.rate)
+
+
+class UserBackoff:
+    """
+    Per-user cooldowns after upstream 429s. Quotas like Gmail's are per user,
+    so one busy mailbox (or its backfill) is made to wait on its own instead of
+    counting against an endpoint's shared circuit breaker. Honours the
+    upstream's `Retry-After` when it is a number of seconds, otherwise backs
+    off exponentially from `base` up to `cap` seconds.
+    """
+
+    def __init__(self, name: str, base: float = 1.0, cap: float = 60.0):
+        self.name = name
+        self.base = base
+        self.cap = cap
+        # user -> (cooldown end, consecutive 429s)
+        self._state: Dict[str, Tuple[float, int]] = {}
+
+    def check(self, user_id: str) -> None:
+        """Raise RateLimitedError while `user_id` is cooling down."""
+        state = self._state.get(user_id)
+        if state is not None and state[0] > time.monotonic():
+            raise RateLimitedError(self.name, state[0] - time.monotonic())
+
+    def throttled(self, user_id: str, retry_after: Optional[str] = None) -> RateLimitedError:
+        """Start (or lengthen) `user_id`'s cooldown and return the error to raise."""
+        strikes = self._state.get(user_id, (0.0, 0))[1] + 1
+        try:
+            delay = min(self.cap, max(0.0, float(retry_after)))
+        except (TypeError, ValueError):
+            delay = min(self.cap, self.base * 2 ** (strikes - 1))
+        self._state[user_id] = (time.monotonic() + delay, strikes)
+        logger.warning(f"'{self.name}' rate limited a user; backing off {delay:.0f}s")
+        return RateLimitedError(self.name, delay)
+
+    def succeeded(self, user_id: str) -> None:
+        self._state.pop(user_id, None)
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str, **kwargs) -> CircuitBreaker:
+    """Return the process-wide breaker for `name`, creating it on first use."""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers[name] = CircuitBreaker(name, **kwargs)
+    return breaker
+
+
+async def hedged(func: Callable[[], Awaitable[T]], delay: Optional[float]) -> T:
+    """
+    Run `func` and, if it has not finished after `delay` seconds, start a second
+    identical attempt. The first attempt to succeed wins and the other is cancelled.
+    Only use for idempotent requests.
+    """
+    if delay is None:
+        return await func()
+
+    first = asyncio.ensure_future(func())
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done:
+        return first.result()
+
+    second = asyncio.ensure_future(func())
+    pending = {first, second}
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,77 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from api.v1.utils.metrics import SINGLE_FLIGHT_REQUESTS
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: the first caller for a key runs
+    `func`, and callers arriving while it is in flight await the same result
+    (or exception). With `result_ttl > 0` a successful result is also reused
+    for that many seconds after it completes.
+
+    The upstream call runs as its own task, so a caller disconnecting does not
+    cancel it for the others. Results are shared objects; callers must not
+    mutate them. State is per process.
+    """
+
+    def __init__(self, name: str, result_ttl: float = 0.0, max_results: int = 1000):
+        self.name = name
+        self.result_ttl = result_ttl
+        self.max_results = max_results
+        self._in_flight: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self._results: Dict[Hashable, Tuple[float, Any]] = {}
+
+    def _cached(self, key: Hashable) -> Tuple[bool, Any]:
+        entry = self._results.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._results[key]
+            return False, None
+        return True, value
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        if len(self._results) >= self.max_results:
+            now = time.monotonic()
+            self._results = {k: v for k, v in self._results.items() if v[0] > now}
+            while len(self._results) >= self.max_results:
+                # Dicts keep insertion order: drop the oldest entry
+                del self._results[next(iter(self._results))]
+        self._results[key] = (time.monotonic() + self.result_ttl, value)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        if self.result_ttl > 0:
+            found, value = self._cached(key)
+            if found:
+                SINGLE_FLIGHT_REQUESTS.labels(name=self.name, result="cached").inc()
+                return value
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            SINGLE_FLIGHT_REQUESTS.labels(name=self.name, result="shared").inc()
+        else:
+            SINGLE_FLIGHT_REQUESTS.labels(name=self.name, result="leader").inc()
+            task = self._in_flight[key] = asyncio.ensure_future(func())
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: "asyncio.Future[Any]") -> None:
+        if self._in_flight.get(key) is not task:
+            # Detached by forget(): its result may predate a write
+            return
+        del self._in_flight[key]
+        if not task.cancelled() and task.exception() is None and self.result_ttl > 0:
+            self._store(key, task.result())
+
+    def forget(self, predicate: Callable[[Hashable], bool]) -> None:
+        """
+        Drop cached results and detach in-flight calls whose key matches, so
+        the next caller starts a fresh upstream call (e.g. after a write).
+        """
+        self._results = {k: v for k, v in self._results.items() if not predicate(k)}
+        for key in [k for k in self._in_flight if predicate(k)]:
+            del self._in_flight[key]
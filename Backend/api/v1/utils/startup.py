@@ -0,0 +1,55 @@
+import asyncio
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTracker:
+    """
+    Times each startup phase (module imports, lifespan setup, warm-up steps)
+    and tracks readiness. Warm-up runs in the background after the lifespan
+    has started, so the port binds and `/wakeup` answers right away while
+    `/ready` reports 503 until connections, keys and workers are warm.
+    """
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.failures: Dict[str, str] = {}
+        self.ready = False
+
+    def record(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = round(seconds, 4)
+
+    @asynccontextmanager
+    async def phase(self, name: str) -> AsyncIterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    async def _step(self, name: str, func: Callable[[], Awaitable[Any]], timeout: float) -> None:
+        try:
+            async with self.phase(name):
+                await asyncio.wait_for(func(), timeout)
+        except Exception as e:
+            # Warm-up is best effort: the first real request just pays the cost
+            self.failures[name] = repr(e)
+            logger.warning(f"Startup warm-up step '{name}' failed: {e!r}")
+
+    async def warm_up(self, steps: Dict[str, Callable[[], Awaitable[Any]]], timeout: float = 10.0) -> None:
+        """Run the warm-up steps concurrently, then mark the process ready."""
+        async with self.phase("warm_up"):
+            await asyncio.gather(*(self._step(name, func, timeout) for name, func in steps.items()))
+        self.ready = True
+        logger.info(json.dumps({"event": "startup", **self.status()}))
+
+    def status(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "phases": dict(self.phases), "failures": dict(self.failures)}
+
+
+startup = StartupTracker()
@@ -1,15 +1,29 @@
-import requests
-from fastapi import HTTPException, status, Request
+import asyncio
+import httpx
+from fastapi import Depends, HTTPException, status, Request
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from jose import JWTError, jwt, ExpiredSignatureError
-from typing import Dict, Any, Optional
-from datetime import datetime, timezone
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Iterator, List, Optional
+from datetime import datetime, timezone, timedelta
+import logging
 
-from api.v1.config import auth_config
+from api.v1.config import auth_config, cache_config
 from api.v1.db.session import DatabaseSession
+from api.v1.services.auth_services.oauth_client import google_oauth_client
+from api.v1.utils.cache import cache
+from api.v1.utils.metrics import record_cache
+
+logger = logging.getLogger(__name__)
 
 fernet = auth_config.FERNET_KEY
 
+# Access tokens resolved so far in the current request scope, by google_id
+_request_tokens: ContextVar[Optional[Dict[str, "asyncio.Future[str]"]]] = ContextVar(
+    "request_tokens", default=None
+)
+
 
 async def get_token_from_cookie(request: Request) -> str:
     token = request.cookies.get("token")
@@ -21,6 +35,25 @@ async def get_token_from_cookie(request: Request) -> str:
     return token
 
 
+def user_cache_key(google_id: str) -> str:
+    return f"user:{google_id}"
+
+
+def access_token_cache_key(google_id: str) -> str:
+    return f"access_token:{google_id}"
+
+
+async def cache_access_token(google_id: str, access_token: str, expiry: datetime) -> None:
+    """Share a usable access token across workers, encrypted, until shortly before it expires."""
+    ttl = (expiry - datetime.now(timezone.utc)).total_seconds() - 60
+    if ttl > 0:
+        await cache.set(
+            access_token_cache_key(google_id),
+            fernet.encrypt(access_token.encode()).decode(),
+            ttl=ttl,
+        )
+
+
 async def get_current_user(
     request: Request,
 ):
@@ -49,17 +82,52 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
 
+    cache_key = user_cache_key(user_id)
+    user = await cache.get(cache_key)
+    record_cache("users", hit=user is not None)
+    if user is not None:
+        return user
+
     user = await db["users"].find_one(
         {"google_id": user_id},
-        {"_id": 0, "email": 1, "name": 1, "picture": 1, "google_id": 1}
+        {"_id": 0, "email": 1, "name": 1, "picture": 1, "google_id": 1, "linked_accounts": 1}
     )
 
     if not user:
         raise credentials_exception
 
+    await cache.set(cache_key, user, ttl=cache_config.CACHE_USER_TTL)
     return user
 
 
+def account_ids(user: dict) -> List[str]:
+    """The user's own google_id followed by the Gmail accounts linked to it."""
+    return [user["google_id"], *user.get("linked_accounts", [])]
+
+
+def resolve_account(current_user: dict, account: Optional[str] = None) -> str:
+    """
+    The google_id the current user acts as: their own (the default) or one of
+    their linked accounts.
+    """
+    if account is None:
+        return current_user["google_id"]
+    if account not in account_ids(current_user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Account is not linked to this user",
+        )
+    return account
+
+
+async def get_account_id(
+    account: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+) -> str:
+    """Dependency resolving the optional `account` query parameter (see resolve_account)."""
+    return resolve_account(current_user, account)
+
+
 def decrypt_oauth_tokens(oauth_token: dict) -> dict:
     try:
         return {
@@ -80,38 +148,50 @@ async def get_oauth_tokens(
     if not google_id:
         raise ValueError("User profile must be provided")
 
-    user_doc = await db["users"].find_one(
-        {"google_id": google_id},
-        {"_id": 0, "oauth": 1}
+    credential = await db["credentials"].find_one(
+        {"google_id": google_id, "service": "google"},
+        {"_id": 0}
     )
+    if credential:
+        return decrypt_oauth_tokens(credential)
 
-    if not user_doc or "oauth" not in user_doc:
-        raise HTTPException(status_code=404, detail="OAuth tokens not found")
-
-    for token in user_doc["oauth"]:
-        if token.get("service") == "google":
-            return decrypt_oauth_tokens(token)
+    # Users not yet moved by scripts/migrate_oauth_credentials.py
+    user_doc = await db["users"].find_one(
+        {"google_id": google_id, "oauth.service": "google"},
+        {"_id": 0, "oauth": {"$elemMatch": {"service": "google"}}}
+    )
+    if user_doc and user_doc.get("oauth"):
+        logger.warning(f"Using legacy embedded OAuth tokens for user {google_id}")
+        return decrypt_oauth_tokens(user_doc["oauth"][0])
 
     raise HTTPException(status_code=404, detail="Google OAuth tokens not found")
 
 
-def refresh_access_token(refresh_token: str) -> Optional[Dict[str, Any]]:
-    token_url = "https://oauth2.googleapis.com/token"
-
-    payload = {
-        "client_id": auth_config.GOOGLE_CLIENT_ID,
-        "client_secret": auth_config.GOOGLE_CLIENT_SECRET,
-        "refresh_token": refresh_token,
-        "grant_type": "refresh_token"
+async def store_refreshed_token(
+    db: AsyncIOMotorDatabase,
+    google_id: str,
+    refreshed: Dict[str, Any]
+) -> None:
+    """Persist a refreshed access token so later requests don't refresh again."""
+    now = datetime.now(timezone.utc)
+    update = {
+        "access_token": fernet.encrypt(refreshed["access_token"].encode()).decode(),
+        "access_token_expiry": now + timedelta(seconds=refreshed.get("expires_in", 3600)),
+        "updated_at": now,
     }
+    if refreshed.get("refresh_token"):
+        update["refresh_token"] = fernet.encrypt(refreshed["refresh_token"].encode()).decode()
 
-    headers = {
-        "Content-Type": "application/x-www-form-urlencoded"
-    }
+    await db["credentials"].update_one(
+        {"google_id": google_id, "service": "google"},
+        {"$set": update}
+    )
 
+
+async def refresh_access_token(refresh_token: str) -> Optional[Dict[str, Any]]:
     try:
-        response = requests.post(token_url, data=payload, headers=headers)
-    except requests.RequestException as e:
+        response = await google_oauth_client.refresh_token(refresh_token)
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=503, detail=f"Token refresh request failed: {str(e)}")
 
     if response.status_code == 200:
@@ -128,14 +208,44 @@ def refresh_access_token(refresh_token: str) -> Optional[Dict[str, Any]]:
         )
 
 
+@contextmanager
+def access_token_scope() -> Iterator[None]:
+    """
+    Within this scope each account's access token is resolved at most once;
+    concurrent tasks started inside it share the lookup. Used by endpoints
+    that run several operations for the same user.
+    """
+    reset = _request_tokens.set({})
+    try:
+        yield
+    finally:
+        _request_tokens.reset(reset)
+
+
 async def get_access_token(
     user: Optional[dict] = None,
     google_id: Optional[str] = None
     ) -> str:
 
+    google_id = google_id or user["google_id"]
+    scope = _request_tokens.get()
+    if scope is None:
+        return await _resolve_access_token(google_id)
+    if google_id not in scope:
+        scope[google_id] = asyncio.ensure_future(_resolve_access_token(google_id))
+    # Shielded: one caller being cancelled must not cancel the shared lookup
+    return await asyncio.shield(scope[google_id])
+
+
+async def _resolve_access_token(google_id: str) -> str:
     db = DatabaseSession.get_db()
 
-    tokens = await get_oauth_tokens(db=db, google_id=google_id or user["google_id"])
+    cached = await cache.get(access_token_cache_key(google_id))
+    record_cache("access_token", hit=cached is not None)
+    if cached is not None:
+        return fernet.decrypt(cached.encode()).decode()
+
+    tokens = await get_oauth_tokens(db=db, google_id=google_id)
     now = datetime.now(timezone.utc)
     
     # Make expiry values timezone-aware (assume stored in UTC)
@@ -144,6 +254,7 @@ async def get_access_token(
         access_expiry = access_expiry.replace(tzinfo=timezone.utc)
 
     if access_expiry > now:
+        await cache_access_token(google_id, tokens["access_token"], access_expiry)
         return tokens["access_token"]
 
     refresh_expiry = tokens["refresh_token_expiry"]
@@ -156,11 +267,22 @@ async def get_access_token(
             detail="Refresh token expired"
         )
 
-    refreshed = refresh_access_token(tokens["refresh_token"])
+    refreshed = await refresh_access_token(tokens["refresh_token"])
     if not refreshed or "access_token" not in refreshed:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Failed to refresh access token"
         )
 
+    try:
+        await store_refreshed_token(db, google_id, refreshed)
+    except Exception as e:
+        # The token is still usable for this request; the next one will refresh again
+        logger.error(f"Failed to store refreshed token for user {google_id}: {e}")
+
+    await cache_access_token(
+        google_id,
+        refreshed["access_token"],
+        now + timedelta(seconds=refreshed.get("expires_in", 3600)),
+    )
     return refreshed["access_token"]
@@ -0,0 +1,13 @@
+import base64
+import hashlib
+import hmac
+
+
+def sign(value: str, secret: str) -> str:
+    """Short URL-safe HMAC-SHA256 signature of `value`."""
+    digest = hmac.new(secret.encode(), value.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:16]).decode().rstrip("=")
+
+
+def verify(value: str, signature: str, secret: str) -> bool:
+    return hmac.compare_digest(sign(value, secret), signature or "")
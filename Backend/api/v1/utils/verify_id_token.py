@@ -1,18 +1,131 @@
-from time import sleep
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
+import asyncio
+import logging
+import re
+import time
+from typing import Any, Dict, Optional
 
-def verify_id_token_with_retry(id_token_str: str, client_id: str, max_retries: int = 3, delay: float = 1.0):
+import httpx
+from jose import jwt, JWTError
+
+from api.v1.config import gmail_config
+from api.v1.services.auth_services.oauth_client import google_oauth_client
+from api.v1.utils.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_CERTS_URL = f"{gmail_config.GOOGLE_API_ROOT}/oauth2/v3/certs"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+
+class GoogleJWKSCache:
+    """
+    Google's signing keys, cached for the lifetime advertised by the
+    `Cache-Control: max-age` of the certs response. Concurrent callers share a
+    single refresh.
+    """
+
+    DEFAULT_MAX_AGE = 3600
+    # Minimum spacing between forced refreshes triggered by an unknown `kid`
+    MIN_REFRESH_INTERVAL = 30
+
+    def __init__(self, certs_url: str = GOOGLE_CERTS_URL):
+        self.certs_url = certs_url
+        self._keys: Dict[str, Dict[str, Any]] = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _parse_max_age(cache_control: str) -> Optional[int]:
+        match = re.search(r"max-age=(\d+)", cache_control or "")
+        return int(match.group(1)) if match else None
+
+    async def _fetch(self) -> None:
+        response = await google_oauth_client.get("oauth.certs", self.certs_url)
+        response.raise_for_status()
+
+        max_age = self._parse_max_age(response.headers.get("Cache-Control", ""))
+        now = time.monotonic()
+        self._keys = {key["kid"]: key for key in response.json().get("keys", [])}
+        self._fetched_at = now
+        self._expires_at = now + (max_age if max_age is not None else self.DEFAULT_MAX_AGE)
+
+    async def prefetch(self) -> None:
+        """Load the key set ahead of the first login (called during startup warm-up)."""
+        async with self._lock:
+            if time.monotonic() >= self._expires_at:
+                await self._fetch()
+
+    async def get_key(self, kid: str) -> Dict[str, Any]:
+        """Return the JWK for `kid`, refreshing the key set if expired or if `kid` is unknown."""
+        now = time.monotonic()
+        key = self._keys.get(kid)
+        if key is not None and now < self._expires_at:
+            record_cache("jwks", hit=True)
+            return key
+
+        record_cache("jwks", hit=False)
+
+        async with self._lock:
+            # Another coroutine may have refreshed while we waited for the lock
+            now = time.monotonic()
+            key = self._keys.get(kid)
+            stale = now >= self._expires_at
+            if stale or (key is None and now - self._fetched_at >= self.MIN_REFRESH_INTERVAL):
+                try:
+                    await self._fetch()
+                except httpx.HTTPError as e:
+                    if not self._keys:
+                        raise ValueError(f"Could not fetch Google certificates: {e}") from e
+                    logger.warning(f"Using stale Google certificates, refresh failed: {e}")
+                key = self._keys.get(kid)
+
+        if key is None:
+            raise ValueError(f"Unknown signing key id: {kid}")
+        return key
+
+
+jwks_cache = GoogleJWKSCache()
+
+
+async def verify_id_token(id_token_str: str, client_id: str, clock_skew: int = 0) -> Dict[str, Any]:
+    """
+    Verify a Google ID token locally against the cached JWKS.
+    Raises ValueError on any verification failure, like google-auth does.
+    """
+    try:
+        header = jwt.get_unverified_header(id_token_str)
+    except JWTError as e:
+        raise ValueError(f"Malformed ID token: {e}") from e
+
+    key = await jwks_cache.get_key(header.get("kid"))
+
+    try:
+        claims = jwt.decode(
+            id_token_str,
+            key,
+            algorithms=[key.get("alg", "RS256")],
+            audience=client_id,
+            issuer=GOOGLE_ISSUERS,
+            options={"verify_at_hash": False, "leeway": clock_skew},
+        )
+    except JWTError as e:
+        raise ValueError(f"Invalid ID token: {e}") from e
+
+    # python-jose does not reject tokens issued in the future
+    if claims.get("iat", 0) > time.time() + clock_skew:
+        raise ValueError(f"Token used too early, {claims['iat']} > {int(time.time())}")
+
+    return claims
+
+
+async def verify_id_token_with_retry(id_token_str: str, client_id: str, max_retries: int = 3, delay: float = 1.0):
     for attempt in range(max_retries):
         try:
-            return id_token.verify_oauth2_token(
-                id_token_str,
-                google_requests.Request(),
-                client_id
-            )
+            return await verify_id_token(id_token_str, client_id)
         except ValueError as ve:
             if "Token used too early" in str(ve) and attempt < max_retries - 1:
-                print("Retrying token verification due to early token use...")
-                sleep(delay)
+                logger.info("Retrying token verification due to early token use...")
+                await asyncio.sleep(delay)
             else:
                 raise
@@ -0,0 +1,143 @@
+"""
+Micro-benchmarks for the Gmail batch protocol codec: building the
+multipart request body and parsing the multipart response.
+
+Covers 1, 10, 100 and 1000 messages at several payload sizes, reporting
+median wall time, time per message and peak traced allocations
+(tracemalloc). Needs only the standard library; run from the Backend
+directory:
+
+    python -m benchmarks.batch_codec
+    python -m benchmarks.batch_codec --check        # exit 1 on superlinear scaling
+    python -m benchmarks.batch_codec --sizes 2000 --counts 10 100 --json out.json
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+import uuid
+from typing import Any, Callable, Dict, List
+
+from api.v1.services.email_services.batch_codec import build_batch_body, parse_batch_response
+from benchmarks.fixtures import batch_response, make_message, message_id
+
+DEFAULT_COUNTS = [1, 10, 100, 1000]
+# Approximate body text sizes: short notification, typical email, newsletter
+DEFAULT_SIZES = [500, 4000, 40000]
+
+
+def measure(func: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """Median wall time over `repeat` runs, and peak traced allocation of one run."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"median_s": statistics.median(timings), "peak_alloc_bytes": peak}
+
+
+def repeats_for(count: int, size: int) -> int:
+    # Keep each case to roughly a second on a plain Linux box
+    return max(3, min(200, 200_000_000 // max(1, count * size * 50)))
+
+
+def run(counts: List[int], sizes: List[int]) -> List[Dict[str, Any]]:
+    rows = []
+    for size in sizes:
+        for count in counts:
+            ids = [message_id(i) for i in range(count)]
+            boundary = f"batch_{uuid.uuid4().hex}"
+            raw = batch_response(boundary, [make_message(msg_id, body_size=size) for msg_id in ids])
+            repeat = repeats_for(count, size)
+
+            encode = measure(lambda: build_batch_body(boundary, ids), repeat)
+            parse = measure(lambda: parse_batch_response(raw, boundary), repeat)
+            assert len(parse_batch_response(raw, boundary)) == count
+
+            rows.append(
+                {
+                    "messages": count,
+                    "body_size": size,
+                    "response_bytes": len(raw),
+                    "encode_ms": encode["median_s"] * 1000,
+                    "encode_peak_kb": encode["peak_alloc_bytes"] / 1024,
+                    "parse_ms": parse["median_s"] * 1000,
+                    "parse_us_per_msg": parse["median_s"] * 1e6 / count,
+                    "parse_peak_kb": parse["peak_alloc_bytes"] / 1024,
+                    "parse_peak_x_input": parse["peak_alloc_bytes"] / len(raw),
+                }
+            )
+    return rows
+
+
+def check_scaling(rows: List[Dict[str, Any]], max_ratio: float) -> List[str]:
+    """
+    Parse cost per message should stay roughly flat as the batch grows. Compare
+    the largest batch against the 10-message batch of the same payload size.
+    """
+    failures = []
+    for size in sorted({row["body_size"] for row in rows}):
+        by_count = {row["messages"]: row for row in rows if row["body_size"] == size}
+        largest = max(by_count)
+        baseline = 10 if 10 in by_count and largest > 10 else min(by_count)
+        if baseline == largest:
+            continue
+        ratio = by_count[largest]["parse_us_per_msg"] / by_count[baseline]["parse_us_per_msg"]
+        if ratio > max_ratio:
+            failures.append(
+                f"body_size={size}: per-message parse cost at {largest} msgs is {ratio:.2f}x "
+                f"that at {baseline} msgs (limit {max_ratio}x)"
+            )
+    return failures
+
+
+def print_table(rows: List[Dict[str, Any]]) -> None:
+    header = (
+        f"{'msgs':>6}{'body B':>8}{'resp KB':>10}{'enc ms':>9}{'enc KB':>9}"
+        f"{'parse ms':>10}{'us/msg':>9}{'parse KB':>10}{'x input':>9}"
+    )
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(
+            f"{row['messages']:>6}{row['body_size']:>8}{row['response_bytes'] / 1024:>10.1f}"
+            f"{row['encode_ms']:>9.3f}{row['encode_peak_kb']:>9.1f}{row['parse_ms']:>10.3f}"
+            f"{row['parse_us_per_msg']:>9.1f}{row['parse_peak_kb']:>10.1f}{row['parse_peak_x_input']:>9.2f}"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--counts", type=int, nargs="+", default=DEFAULT_COUNTS)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--check", action="store_true", help="fail if parsing scales superlinearly")
+    parser.add_argument("--max-ratio", type=float, default=2.5,
+                        help="allowed growth of per-message parse time from 10 msgs to the largest batch")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    rows = run(args.counts, args.sizes)
+    print_table(rows)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+    if args.check:
+        failures = check_scaling(rows, args.max_ratio)
+        for failure in failures:
+            print(f"FAIL {failure}", file=sys.stderr)
+        return 1 if failures else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
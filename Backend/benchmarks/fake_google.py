@@ -0,0 +1,136 @@
+"""
+Local fake of the Gmail and Google OAuth endpoints the backend calls.
+
+Serves deterministic list, multipart batch, message, attachment, send and
+batchModify responses plus token refresh and certificates, with configurable latency and
+error injection. Run standalone from the Backend directory:
+
+    python -m benchmarks.fake_google --port 9100 --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import random
+import re
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict
+
+from aiohttp import web
+
+from benchmarks import fixtures
+
+BATCH_ITEM = re.compile(r"GET /gmail/v1/users/me/messages/([^?\s]+)\?format=(\w+)")
+
+
+@dataclass
+class FakeGoogleOptions:
+    latency: float = 0.03  # seconds added to every response
+    jitter: float = 0.01  # uniform extra latency in [0, jitter]
+    per_message_latency: float = 0.002  # batch endpoint processes messages serially
+    error_rate: float = 0.0  # fraction of requests answered with 503
+    mailbox_size: int = 5000
+    body_size: int = 4000
+    attachment_size: int = 512 * 1024
+    seed: int = 1
+    stats: Dict[str, int] = field(default_factory=dict)
+
+
+def build_app(options: FakeGoogleOptions) -> web.Application:
+    rng = random.Random(options.seed)
+
+    @web.middleware
+    async def latency_and_errors(request: web.Request, handler):
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else "unknown"
+        options.stats[route] = options.stats.get(route, 0) + 1
+        await asyncio.sleep(options.latency + rng.uniform(0, options.jitter))
+        if options.error_rate and rng.random() < options.error_rate:
+            return web.json_response({"error": {"code": 503, "message": "Backend Error"}}, status=503)
+        return await handler(request)
+
+    async def list_messages(request: web.Request):
+        max_results = int(request.query.get("maxResults", 20))
+        return web.json_response(
+            fixtures.list_response(options.mailbox_size, max_results, request.query.get("pageToken"))
+        )
+
+    async def get_message(request: web.Request):
+        return web.json_response(
+            fixtures.make_message(
+                request.match_info["message_id"],
+                options.body_size,
+                options.attachment_size,
+                request.query.get("format", "full"),
+            )
+        )
+
+    async def batch(request: web.Request):
+        items = BATCH_ITEM.findall(await request.text())
+        await asyncio.sleep(options.per_message_latency * len(items))
+        bodies = [
+            fixtures.make_message(msg_id, options.body_size, options.attachment_size, fmt)
+            for msg_id, fmt in items
+        ]
+        boundary = f"batch_{uuid.uuid4().hex}"
+        return web.Response(
+            text=fixtures.batch_response(boundary, bodies),
+            headers={"Content-Type": f"multipart/mixed; boundary={boundary}"},
+        )
+
+    async def get_attachment(request: web.Request):
+        return web.json_response(fixtures.attachment_response(options.attachment_size))
+
+    async def send_message(request: web.Request):
+        payload = await request.json()
+        if "raw" not in payload:
+            return web.json_response({"error": {"code": 400, "message": "raw required"}}, status=400)
+        return web.json_response({"id": uuid.uuid4().hex[:16], "threadId": uuid.uuid4().hex[:16], "labelIds": ["SENT"]})
+
+    async def batch_modify(request: web.Request):
+        await request.read()
+        return web.Response(status=204)
+
+    async def certs(request: web.Request):
+        # Benchmarks sign session JWTs directly; no ID tokens to verify
+        return web.json_response({"keys": []}, headers={"Cache-Control": "public, max-age=3600"})
+
+    async def token(request: web.Request):
+        return web.json_response(
+            {"access_token": f"ya29.bench-{uuid.uuid4().hex}", "expires_in": 3599, "token_type": "Bearer"}
+        )
+
+    app = web.Application(middlewares=[latency_and_errors], client_max_size=64 * 1024 * 1024)
+    app.router.add_get("/gmail/v1/users/me/messages", list_messages)
+    app.router.add_get("/gmail/v1/users/me/messages/{message_id}", get_message)
+    app.router.add_get("/gmail/v1/users/me/messages/{message_id}/attachments/{attachment_id}", get_attachment)
+    app.router.add_post("/gmail/v1/users/me/messages/send", send_message)
+    app.router.add_post("/gmail/v1/users/me/messages/batchModify", batch_modify)
+    app.router.add_post("/batch/gmail/v1", batch)
+    app.router.add_post("/token", token)
+    app.router.add_get("/oauth2/v3/certs", certs)
+    return app
+
+
+async def start_fake_google(options: FakeGoogleOptions, host: str = "127.0.0.1", port: int = 0) -> web.AppRunner:
+    """Start the fake server on the running loop. Returns the runner; its bound port is in `runner.addresses`."""
+    runner = web.AppRunner(build_app(options), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    return runner
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=FakeGoogleOptions.latency)
+    parser.add_argument("--jitter", type=float, default=FakeGoogleOptions.jitter)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    options = FakeGoogleOptions(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    web.run_app(build_app(options), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Synthetic Gmail API payloads shaped like recorded `format=full` responses.
+
+Message ids are deterministic (`msg000001`, ...) so every component of the
+benchmark can regenerate the same mailbox without sharing state.
+"""
+import base64
+import json
+import random
+from typing import Any, Dict, List, Optional
+
+BENCH_GOOGLE_ID = "100000000000000000001"
+BENCH_EMAIL = "bench@example.com"
+
+WORDS = (
+    "meeting invoice project update quarterly report schedule review team "
+    "please attached thanks regards customer launch budget deadline follow"
+).split()
+
+
+def b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def message_id(index: int) -> str:
+    return f"msg{index:06d}"
+
+
+def _text(rng: random.Random, size: int) -> str:
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:size]
+
+
+def _header(name: str, value: str) -> Dict[str, str]:
+    return {"name": name, "value": value}
+
+
+def make_message(
+    msg_id: str,
+    body_size: int = 4000,
+    attachment_size: Optional[int] = None,
+    fmt: str = "full",
+) -> Dict[str, Any]:
+    """Build a Gmail `users.messages` resource with text and HTML parts."""
+    rng = random.Random(msg_id)
+    index = int(msg_id[3:]) if msg_id[3:].isdigit() else 0
+    sender = f"sender{index % 50}@example.com"
+    subject = _text(rng, 48).capitalize()
+    text = _text(rng, body_size)
+    html = f"<html><body><p>{text}</p><img src=\"https://cdn.example.com/{msg_id}.png\"></body></html>"
+
+    headers = [
+        _header("From", f"Sender {index % 50} <{sender}>"),
+        _header("To", "Bench User <bench@example.com>"),
+        _header("Subject", subject),
+        _header("Date", "Mon, 6 Oct 2025 09:30:00 +0000"),
+        _header("Message-ID", f"<{msg_id}@mail.example.com>"),
+    ]
+    alternative = {
+        "partId": "0",
+        "mimeType": "multipart/alternative",
+        "filename": "",
+        "headers": [_header("Content-Type", "multipart/alternative; boundary=alt")],
+        "body": {"size": 0},
+        "parts": [
+            {
+                "partId": "0.0",
+                "mimeType": "text/plain",
+                "filename": "",
+                "headers": [_header("Content-Type", "text/plain; charset=UTF-8")],
+                "body": {"size": len(text), "data": b64url(text.encode())},
+            },
+            {
+                "partId": "0.1",
+                "mimeType": "text/html",
+                "filename": "",
+                "headers": [_header("Content-Type", "text/html; charset=UTF-8")],
+                "body": {"size": len(html), "data": b64url(html.encode())},
+            },
+        ],
+    }
+    parts = [alternative]
+    if attachment_size:
+        parts.append(
+            {
+                "partId": "1",
+                "mimeType": "application/pdf",
+                "filename": f"{msg_id}.pdf",
+                "headers": [
+                    _header("Content-Type", f"application/pdf; name=\"{msg_id}.pdf\""),
+                    _header("Content-Disposition", f"attachment; filename=\"{msg_id}.pdf\""),
+                ],
+                "body": {"attachmentId": f"att-{msg_id}", "size": attachment_size},
+            }
+        )
+
+    message = {
+        "id": msg_id,
+        "threadId": f"thr{index // 3:06d}",
+        "labelIds": ["INBOX", "CATEGORY_PERSONAL"] + (["UNREAD"] if index % 3 == 0 else []),
+        "snippet": text[:120],
+        "sizeEstimate": body_size * 3 + (attachment_size or 0),
+        "historyId": str(100000 + index),
+        "internalDate": str(1759743000000 - index * 60000),
+    }
+    if fmt == "minimal":
+        return message
+    if fmt == "metadata":
+        message["payload"] = {"mimeType": "multipart/mixed", "headers": headers}
+        return message
+    message["payload"] = {
+        "partId": "",
+        "mimeType": "multipart/mixed",
+        "filename": "",
+        "headers": headers,
+        "body": {"size": 0},
+        "parts": parts,
+    }
+    return message
+
+
+def list_response(total: int, max_results: int, page_token: Optional[str]) -> Dict[str, Any]:
+    start = int(page_token) if page_token else 0
+    end = min(start + max_results, total)
+    response: Dict[str, Any] = {
+        "messages": [
+            {"id": message_id(i), "threadId": f"thr{i // 3:06d}"} for i in range(start, end)
+        ],
+        "resultSizeEstimate": total,
+    }
+    if end < total:
+        response["nextPageToken"] = str(end)
+    return response
+
+
+def batch_response(boundary: str, bodies: List[Dict[str, Any]]) -> str:
+    """Encode sub-responses the way Gmail's batch endpoint does."""
+    lines: List[str] = []
+    for i, body in enumerate(bodies, 1):
+        lines.extend(
+            [
+                f"--{boundary}",
+                "Content-Type: application/http",
+                f"Content-ID: <response-{i}>",
+                "",
+                "HTTP/1.1 200 OK",
+                "Content-Type: application/json; charset=UTF-8",
+                "Vary: Origin",
+                "",
+                json.dumps(body),
+            ]
+        )
+    lines.append(f"--{boundary}--")
+    return "\r\n".join(lines) + "\r\n"
+
+
+def attachment_response(size: int) -> Dict[str, Any]:
+    data = bytes(random.Random(size).getrandbits(8) for _ in range(min(size, 4096)))
+    data = (data * (size // len(data) + 1))[:size] if data else b""
+    return {"size": size, "data": b64url(data)}
@@ -0,0 +1,71 @@
+"""
+Micro-benchmark for the cached-message storage codec: stored size against
+the raw Gmail JSON, encode/decode time, and the cost of reading one body
+part versus rebuilding the whole message. Run from the Backend directory:
+
+    python -m benchmarks.message_codec
+    python -m benchmarks.message_codec --sizes 4000 --codec zlib
+"""
+import argparse
+import json
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+
+from api.v1.services.email_services import message_codec
+from benchmarks.fixtures import make_message
+
+DEFAULT_SIZES = [500, 4000, 40000]
+
+
+def median_ms(func: Callable[[], Any], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def stored_size(stored: Dict[str, Any]) -> int:
+    # JSON of the plain fields plus the compressed blob as raw bytes, as BSON would store it
+    plain = {key: value for key, value in stored.items() if key != "bodies"}
+    return len(json.dumps(plain).encode()) + len(stored["bodies"])
+
+
+def run(sizes: List[int], codec: str, repeat: int) -> List[Dict[str, Any]]:
+    rows = []
+    for size in sizes:
+        message = make_message("msg000001", body_size=size)
+        stored = message_codec.encode_message(message, codec)
+        assert message_codec.decode_message(stored) == message
+        raw_size = len(json.dumps(message).encode())
+        rows.append({
+            "body_size": size,
+            "raw_bytes": raw_size,
+            "stored_bytes": stored_size(stored),
+            "ratio": round(stored_size(stored) / raw_size, 3),
+            "encode_ms": median_ms(lambda: message_codec.encode_message(message, codec), repeat),
+            "decode_ms": median_ms(lambda: message_codec.decode_message(stored), repeat),
+            "html_part_ms": median_ms(lambda: message_codec.find_part_body(stored, "text/html"), repeat),
+            "headers_ms": median_ms(lambda: message_codec.headers(stored), repeat),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--codec", choices=["zstd", "zlib"], default=message_codec.DEFAULT_CODEC)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rows = run(args.sizes, args.codec, args.repeat)
+    columns = list(rows[0])
+    print("".join(f"{c:>14}" for c in columns))
+    for row in rows:
+        print("".join(f"{row[c]:>14.3f}" if isinstance(row[c], float) else f"{row[c]:>14}" for c in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""
+End-to-end benchmark: the real FastAPI app (in a subprocess, under uvicorn)
+against the local fake Google server, with mongomock or a local mongod.
+
+Reports throughput, p50/p99 latency, error count and the app's peak RSS for
+each scenario. Run from the Backend directory:
+
+    python -m benchmarks.run
+    python -m benchmarks.run --requests 500 --concurrency 32 --latency 0.08
+    python -m benchmarks.run --mongo-uri mongodb://localhost:27017 --json results.json
+    python -m benchmarks.run --scenarios fetch attachment --error-rate 0.02
+    python -m benchmarks.run --scenarios fetch --fetch-strategies batch multiplex --message-cache-ttl 0
+
+With several --fetch-strategies the app is started once per strategy
+(GMAIL_FETCH_STRATEGY) and results are labelled `scenario[strategy]`. The
+fake server speaks HTTP/1.1 only, so "multiplex" runs there as concurrent
+keep-alive requests; it measures parallel messages.get against the serial
+batch endpoint, not HTTP/2 framing.
+
+Requires the app's dependencies plus benchmarks/requirements.txt.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+from jose import jwt
+
+from benchmarks.fake_google import FakeGoogleOptions, start_fake_google
+from benchmarks.fixtures import BENCH_GOOGLE_ID, message_id
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+JWT_SECRET = "benchmark-jwt-secret-benchmark-jwt-secret"
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: str
+    body: Optional[Callable[[int], Dict[str, Any]]] = None
+
+
+def send_body(attachment_kb: int) -> Callable[[int], Dict[str, Any]]:
+    attachment = base64.b64encode(os.urandom(attachment_kb * 1024)).decode()
+
+    def build(i: int) -> Dict[str, Any]:
+        return {
+            "to": ["someone@example.com"],
+            "subject": f"Benchmark message {i}",
+            "body_plain": "Hello from the benchmark. " * 40,
+            "body_html": "<p>Hello from the benchmark.</p>" * 40,
+            "attachments": [{"filename": "data.bin", "content": attachment, "mimeType": "application/octet-stream"}],
+        }
+
+    return build
+
+
+def scenarios(page_size: int, attachment_kb: int) -> Dict[str, Scenario]:
+    return {
+        "fetch": Scenario("fetch", "GET", f"/emails/fetch?folder=Inbox:Primary&max_results={page_size}"),
+        "fetch-by-contact": Scenario(
+            "fetch-by-contact",
+            "POST",
+            "/emails/fetch-by-contact",
+            lambda i: {"email_address": f"sender{i % 50}@example.com", "max_results": page_size},
+        ),
+        "send": Scenario("send", "POST", "/emails/send", send_body(attachment_kb)),
+        "attachment": Scenario(
+            "attachment",
+            "GET",
+            f"/emails/attachments/{message_id(1)}/att-{message_id(1)}?file_name=report.pdf&mime_type=application/pdf",
+        ),
+    }
+
+
+@dataclass
+class Result:
+    scenario: str
+    requests: int
+    errors: int
+    seconds: float
+    throughput: float
+    p50_ms: float
+    p99_ms: float
+    peak_rss_mb: Optional[float]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def reset_peak_rss(pid: int) -> None:
+    # Linux: writing 5 resets VmHWM for the process
+    try:
+        Path(f"/proc/{pid}/clear_refs").write_text("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb(pid: int) -> Optional[float]:
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_until_up(client: httpx.AsyncClient, process: subprocess.Popen, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"App exited during startup with code {process.returncode}")
+        try:
+            # /ready turns 200 once startup warm-up is done, so runs start warm
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("App did not start in time")
+
+
+async def run_scenario(
+    client: httpx.AsyncClient, scenario: Scenario, total: int, concurrency: int, warmup: int
+) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(warmup + total))
+
+    async def one(i: int, record: bool) -> None:
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            response = await client.request(
+                scenario.method, scenario.path, json=scenario.body(i) if scenario.body else None
+            )
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        if record:
+            latencies.append(time.perf_counter() - start)
+            errors += 0 if ok else 1
+
+    for i in range(warmup):
+        await one(next(counter), record=False)
+
+    async def worker() -> None:
+        for i in counter:
+            await one(i, record=True)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {"latencies": latencies, "errors": errors, "seconds": elapsed}
+
+
+def app_environment(
+    fake_url: str, mongo_uri: Optional[str], fetch_strategy: str, message_cache_ttl: Optional[float] = None
+) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update(
+        {
+            "SKIP_DOTENV": "1",
+            "GOOGLE_CLIENT_ID": "bench-client-id.apps.googleusercontent.com",
+            "GOOGLE_CLIENT_SECRET": "bench-client-secret",
+            "GOOGLE_REDIRECT_URI": "http://127.0.0.1/auth/google/callback",
+            "FRONTEND_URL": "http://127.0.0.1:5173",
+            "FERNET_KEY": os.urandom(16).hex(),
+            "JWT_SECRET_KEY": JWT_SECRET,
+            "PUBLIC_API_URL": "http://127.0.0.1",
+            "IMAGE_PROXY_SECRET": os.urandom(16).hex(),
+            "MONGO_URI": mongo_uri or "mongodb://unused",
+            "MONGO_DB_NAME": "maileyo_bench",
+            "GOOGLE_API_ROOT": fake_url,
+            "GOOGLE_OAUTH_ROOT": fake_url,
+            "GMAIL_FETCH_STRATEGY": fetch_strategy,
+        }
+    )
+    if message_cache_ttl is not None:
+        env["CACHE_MESSAGE_TTL"] = str(message_cache_ttl)
+    return env
+
+
+async def run_app(
+    args: argparse.Namespace, fake_url: str, fetch_strategy: str, label: str
+) -> List[Result]:
+    app_port = free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.serve_app",
+            "--port", str(app_port),
+            "--mongo", "uri" if args.mongo_uri else "mongomock",
+        ],
+        cwd=BACKEND_DIR,
+        env=app_environment(fake_url, args.mongo_uri, fetch_strategy, args.message_cache_ttl),
+    )
+
+    token = jwt.encode(
+        {"user_id": BENCH_GOOGLE_ID, "exp": int(time.time()) + 3600}, JWT_SECRET, algorithm="HS256"
+    )
+    results: List[Result] = []
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{app_port}",
+            cookies={"token": token},
+            timeout=60,
+            limits=httpx.Limits(max_connections=args.concurrency),
+        ) as client:
+            await wait_until_up(client, process)
+            available = scenarios(args.page_size, args.attachment_kb)
+            for name in args.scenarios:
+                reset_peak_rss(process.pid)
+                raw = await run_scenario(client, available[name], args.requests, args.concurrency, args.warmup)
+                latencies = raw["latencies"]
+                results.append(
+                    Result(
+                        scenario=f"{name}{label}",
+                        requests=len(latencies),
+                        errors=raw["errors"],
+                        seconds=round(raw["seconds"], 3),
+                        throughput=round(len(latencies) / raw["seconds"], 1),
+                        p50_ms=round(statistics.median(latencies) * 1000, 1),
+                        p99_ms=round(percentile(latencies, 99) * 1000, 1),
+                        peak_rss_mb=peak_rss_mb(process.pid),
+                    )
+                )
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+    return results
+
+
+async def main_async(args: argparse.Namespace) -> List[Result]:
+    options = FakeGoogleOptions(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    fake_runner = await start_fake_google(options)
+    host, port = fake_runner.addresses[0][:2]
+    fake_url = f"http://{host}:{port}"
+
+    results: List[Result] = []
+    try:
+        for strategy in args.fetch_strategies:
+            label = f"[{strategy}]" if len(args.fetch_strategies) > 1 else ""
+            results.extend(await run_app(args, fake_url, strategy, label))
+    finally:
+        await fake_runner.cleanup()
+
+    return results
+
+
+def print_table(results: List[Result]) -> None:
+    header = f"{'scenario':<28}{'reqs':>7}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'peak RSS MB':>13}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        rss = f"{r.peak_rss_mb:.1f}" if r.peak_rss_mb is not None else "n/a"
+        print(f"{r.scenario:<28}{r.requests:>7}{r.errors:>8}{r.throughput:>9}{r.p50_ms:>9}{r.p99_ms:>9}{rss:>13}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", default=["fetch", "fetch-by-contact", "send", "attachment"],
+                        choices=["fetch", "fetch-by-contact", "send", "attachment"])
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--attachment-kb", type=int, default=256, help="attachment size for /emails/send")
+    parser.add_argument("--latency", type=float, default=FakeGoogleOptions.latency, help="fake Google base latency (s)")
+    parser.add_argument("--jitter", type=float, default=FakeGoogleOptions.jitter)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of fake Google calls failing with 503")
+    parser.add_argument("--fetch-strategies", nargs="+", default=["batch"], choices=["batch", "multiplex", "auto"],
+                        help="run the scenarios once per GMAIL_FETCH_STRATEGY")
+    parser.add_argument("--message-cache-ttl", type=float,
+                        help="override CACHE_MESSAGE_TTL; 0 makes every fetch go to the fake server")
+    parser.add_argument("--mongo-uri", help="use a local mongod instead of mongomock")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    print_table(results)
+    if args.json:
+        Path(args.json).write_text(json.dumps([asdict(r) for r in results], indent=2))
+
+
+if __name__ == "__main__":
+    main()
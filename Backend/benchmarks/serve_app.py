@@ -0,0 +1,78 @@
+"""
+Run the real FastAPI app for benchmarking, seeded with one user whose
+credentials point at the fake Google server. Started by benchmarks.run with
+a complete environment (SKIP_DOTENV=1); not meant to be run by hand.
+
+    python -m benchmarks.serve_app --port 8900 --mongo mongomock
+"""
+import argparse
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+import uvicorn
+
+from benchmarks.fixtures import BENCH_EMAIL, BENCH_GOOGLE_ID
+
+
+async def seed_user(db) -> None:
+    from api.v1.config import auth_config
+
+    now = datetime.now(timezone.utc)
+    fernet = auth_config.FERNET_KEY
+    await db["users"].update_one(
+        {"google_id": BENCH_GOOGLE_ID},
+        {"$set": {"email": BENCH_EMAIL, "name": "Bench User", "picture": None, "updated_at": now}},
+        upsert=True,
+    )
+    await db["credentials"].update_one(
+        {"google_id": BENCH_GOOGLE_ID, "service": "google"},
+        {
+            "$set": {
+                "access_token": fernet.encrypt(b"ya29.bench-access-token").decode(),
+                "refresh_token": fernet.encrypt(b"1//bench-refresh-token").decode(),
+                "access_token_expiry": now + timedelta(days=1),
+                "refresh_token_expiry": now + timedelta(days=30),
+                "updated_at": now,
+            }
+        },
+        upsert=True,
+    )
+
+
+def use_mongomock() -> None:
+    from mongomock_motor import AsyncMongoMockClient
+    from api.v1.db.session import DatabaseSession
+
+    async def connect(cls, uri: str, db_name: str):
+        cls.client = AsyncMongoMockClient()
+        cls.db = cls.client[db_name]
+
+    DatabaseSession.connect = classmethod(connect)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--mongo", default="mongomock", help="'mongomock' or 'uri' to use MONGO_URI")
+    args = parser.parse_args()
+
+    if args.mongo == "mongomock":
+        use_mongomock()
+
+    from api.v1.db.session import DatabaseSession
+    from main import app
+
+    app_lifespan = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def seeded_lifespan(app):
+        async with app_lifespan(app) as state:
+            await seed_user(DatabaseSession.get_db())
+            yield state
+
+    app.router.lifespan_context = seeded_lifespan
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
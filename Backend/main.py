@@ -1,19 +1,90 @@
+import time
+
+_import_start = time.perf_counter()
+
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from api.v1.routers.auth_routers import google
 from api.v1.routers.email_routers import emails
+from api.v1.routers.debug_routers import diagnostics
+from api.v1.routers.sync_routers import sync
+from api.v1.routers.composite_routers import composite
 from fastapi.middleware.cors import CORSMiddleware
 from api.v1.db.init_db import init_db, close_db
+from api.v1.db.bulk_writer import bulk_writer
+from api.v1.services.email_services.gmail_service import gmail_service
+from api.v1.services.email_services.image_proxy import image_proxy
+from api.v1.utils.process_pool import process_pool
+from api.v1.services.auth_services.oauth_client import google_oauth_client
+from api.v1.db.session import DatabaseSession
+from api.v1.config import admission_config, auth_config, diagnostics_config, server_config, sync_config
+from api.v1.services.sync_services import jobs  # registers sync job handlers
+from api.v1.services.sync_services.scheduler import sync_scheduler
+from api.v1.utils.key_rotation import rotate_once
+from api.v1.utils.admission import AdmissionMiddleware, default_rules
+from api.v1.utils.metrics import MetricsMiddleware, metrics_response, monitor_event_loop_lag
+from api.v1.utils.loop_diagnostics import loop_stall_detector
+from api.v1.utils.startup import startup
+from api.v1.utils.verify_id_token import jwks_cache
 from contextlib import asynccontextmanager
+import asyncio
+import importlib
+
+startup.record("imports", time.perf_counter() - _import_start)
+
+# Modules the pool workers need for their first job (see utils/process_pool.py)
+POOL_PRELOAD = [
+    "api.v1.services.email_services.renderer",
+    "api.v1.services.email_services.images",
+    "PIL.Image",
+]
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await init_db()
+    async with startup.phase("init_db"):
+        await init_db()
+    await google_oauth_client.start()
+    # Runs after startup completes; /ready reports 503 until it is done
+    warm_up = asyncio.create_task(startup.warm_up({
+        "mongo": lambda: DatabaseSession.get_db().command("ping"),
+        "gmail_connection": gmail_service.warm_up,
+        "oauth_connection": google_oauth_client.warm_up,
+        "jwks": jwks_cache.prefetch,
+        "deferred_imports": lambda: asyncio.to_thread(importlib.import_module, "PIL.Image"),
+        "process_pool": lambda: process_pool.warm_up(POOL_PRELOAD),
+    }))
+    loop_lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+    if diagnostics_config.LOOP_DIAGNOSTICS_ENABLED:
+        loop_stall_detector.start()
+    key_rotation = None
+    if auth_config.FERNET_ROTATE_ON_STARTUP:
+        key_rotation = asyncio.create_task(rotate_once(DatabaseSession.get_db()))
+    if sync_config.SYNC_ENABLED:
+        sync_scheduler.start()
     yield
+    warm_up.cancel()
+    if key_rotation is not None:
+        key_rotation.cancel()
+        await asyncio.gather(key_rotation, return_exceptions=True)
+    if sync_config.SYNC_ENABLED:
+        await sync_scheduler.stop()
+    loop_lag_monitor.cancel()
+    if diagnostics_config.LOOP_DIAGNOSTICS_ENABLED:
+        loop_stall_detector.stop()
+    await bulk_writer.close()
+    await gmail_service.close()
+    await image_proxy.close()
+    process_pool.close()
+    await google_oauth_client.close()
     await close_db()
 
 app = FastAPI(lifespan=lifespan)
 
+# Innermost, so its 503s still get CORS headers and are counted in metrics
+if admission_config.ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware, rules=default_rules())
+
 # origins = [
 #     "https://maileyo.in",       
 #     "https://www.maileyo.in",   
@@ -30,9 +101,13 @@ app.add_middleware(
     allow_headers=["*"],
     expose_headers=["*"]  # Add this line
 )
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(google.router, tags=["auth"])
 app.include_router(emails.router, tags=["emails"])
+app.include_router(diagnostics.router, tags=["debug"])
+app.include_router(sync.router, tags=["sync"])
+app.include_router(composite.router, tags=["composite"])
 
 @app.get("/wakeup")
 async def wakeup():
@@ -42,6 +117,18 @@ async def wakeup():
 async def wakeup_head():
     return
 
+@app.get("/ready")
+async def ready():
+    """Readiness: 503 until startup warm-up has finished. Includes phase timings."""
+    status = startup.status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=status, headers={"Retry-After": "1"})
+    return status
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return metrics_response()
+
 # Add explicit OPTIONS handler for preflight requests
 @app.options("/{full_path:path}")
 async def options_handler():
@@ -49,4 +136,13 @@ async def options_handler():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Workers need an import string; SIGHUP restarts them gracefully. Set
+    # CACHE_BACKEND=mongo so they share caches, and PROMETHEUS_MULTIPROC_DIR
+    # so /metrics covers all of them.
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=server_config.PORT,
+        workers=server_config.WEB_CONCURRENCY,
+        timeout_graceful_shutdown=server_config.GRACEFUL_SHUTDOWN_TIMEOUT,
+    )
@@ -0,0 +1,30 @@
+"""
+Build the declared indexes and fail if any hot query shape is answered with a
+collection scan. Run against a local mongod from the Backend directory:
+
+    MONGO_URI=mongodb://localhost:27017 python -m scripts.check_query_plans
+"""
+import asyncio
+import sys
+
+from api.v1.db.init_db import init_db, close_db
+from api.v1.db.indexes import verify_query_plans
+from api.v1.db.session import DatabaseSession
+
+
+async def main() -> int:
+    await init_db()
+    try:
+        offenders = await verify_query_plans(DatabaseSession.get_db())
+    finally:
+        await close_db()
+
+    for offender in offenders:
+        print(f"COLLSCAN: {offender}")
+    if not offenders:
+        print("All query shapes use an index")
+    return 1 if offenders else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,70 @@
+"""
+Move OAuth tokens embedded in `users.oauth` into the `credentials` collection.
+
+Safe to re-run: credentials written by a newer login are never overwritten,
+and the embedded array is only removed if it is unchanged since it was read.
+Run from the Backend directory:
+
+    python -m scripts.migrate_oauth_credentials
+"""
+import asyncio
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+
+from api.v1.db.init_db import init_db, close_db
+from api.v1.db.session import DatabaseSession
+
+BATCH_SIZE = 500
+
+
+async def flush(db, credential_ops, user_ops):
+    if credential_ops:
+        await db["credentials"].bulk_write(credential_ops, ordered=False)
+    if user_ops:
+        await db["users"].bulk_write(user_ops, ordered=False)
+
+
+async def migrate(db) -> int:
+    migrated = 0
+    credential_ops, user_ops = [], []
+    now = datetime.now(timezone.utc)
+
+    cursor = db["users"].find({"oauth": {"$exists": True}}, {"_id": 1, "google_id": 1, "oauth": 1})
+    async for user_doc in cursor:
+        for token in user_doc["oauth"]:
+            credential_ops.append(
+                UpdateOne(
+                    {"google_id": user_doc["google_id"], "service": token["service"]},
+                    {"$setOnInsert": {**token, "google_id": user_doc["google_id"], "updated_at": now}},
+                    upsert=True,
+                )
+            )
+        user_ops.append(
+            UpdateOne(
+                {"_id": user_doc["_id"], "oauth": user_doc["oauth"]},
+                {"$unset": {"oauth": ""}},
+            )
+        )
+        migrated += 1
+
+        if len(user_ops) >= BATCH_SIZE:
+            # Credentials must be written before the embedded copy is removed
+            await flush(db, credential_ops, user_ops)
+            credential_ops, user_ops = [], []
+
+    await flush(db, credential_ops, user_ops)
+    return migrated
+
+
+async def main():
+    await init_db()
+    try:
+        count = await migrate(DatabaseSession.get_db())
+        print(f"Migrated OAuth credentials for {count} users")
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+"""
+Profile the app's import time, the part of a cold start spent before the
+lifespan runs. Imports `main` in a fresh interpreter with `-X importtime` and
+prints the slowest modules by cumulative time. Run from the Backend directory:
+
+    python -m scripts.profile_imports
+    python -m scripts.profile_imports --top 40 --module api.v1.routers.email_routers.emails
+
+The environment must hold a valid configuration (or a .env), since importing
+the app loads it.
+"""
+import argparse
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+# "import time:      self [us] |      cumulative | imported package"
+LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile(module: str) -> List[Tuple[int, int, int, str]]:
+    """(cumulative us, self us, nesting depth, module) for every import."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise SystemExit(f"Importing {module} failed")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((int(cumulative_us), int(self_us), (len(indent) - 1) // 2, name))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+
+    rows = profile(args.module)
+    end = next(i for i, row in enumerate(rows) if row[2] == 0 and row[3] == args.module)
+    print(f"import {args.module}: {rows[end][0] / 1000:.1f} ms")
+
+    # The output is post-order: the module's own imports are listed just before
+    # it. Only direct imports are shown, so parents and children don't double count.
+    direct = []
+    for row in reversed(rows[:end]):
+        if row[2] == 0:
+            break
+        if row[2] == 1:
+            direct.append(row)
+
+    print(f"{'cumulative ms':>14}{'self ms':>10}  module")
+    for cumulative, self_us, _, name in sorted(direct, reverse=True)[:args.top]:
+        print(f"{cumulative / 1000:>14.1f}{self_us / 1000:>10.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
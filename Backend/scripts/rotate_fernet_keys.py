@@ -0,0 +1,29 @@
+"""
+Re-encrypt all stored OAuth tokens with the primary Fernet key.
+
+Rotation procedure (run scripts/migrate_oauth_credentials.py first if users
+still carry embedded `oauth` tokens):
+  1. Prepend the new key to FERNET_KEY (e.g. FERNET_KEY=new,old) and deploy.
+  2. Run `python -m scripts.rotate_fernet_keys` from the Backend directory
+     (or set FERNET_ROTATE_ON_STARTUP=true to run it in the background, once
+     per key across all workers).
+  3. Once it reports completion, remove the old key from FERNET_KEY.
+"""
+import asyncio
+
+from api.v1.db.init_db import init_db, close_db
+from api.v1.db.session import DatabaseSession
+from api.v1.utils.key_rotation import rotate_encrypted_tokens
+
+
+async def main():
+    await init_db()
+    try:
+        count = await rotate_encrypted_tokens(DatabaseSession.get_db())
+        print(f"Re-encrypted {count} credentials")
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())